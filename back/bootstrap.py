@@ -0,0 +1,25 @@
+"""
+Подготовка БД перед запуском приложения (один раз на деплой):
+миграции схемы и начальные данные.
+
+Запуск: python -m bootstrap
+"""
+from db.database import engine, SessionLocal
+from db.init_data import initialize_database
+from db.migrations import migrate
+
+
+def main():
+    with engine.begin() as conn:
+        before, after = migrate(conn)
+    print(f"📦 Схема БД: версия {before} → {after}")
+
+    db = SessionLocal()
+    try:
+        initialize_database(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
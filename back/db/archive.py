@@ -0,0 +1,217 @@
+"""
+Горячие и холодные транзакции
+
+transactions          — горячая таблица: последние ARCHIVE_HOT_MONTHS месяцев
+                        со всеми индексами для API;
+transactions_archive  — закрытые месяцы с одним индексом (client_id, created_at, id).
+                        На Postgres — секции по месяцам (RANGE по created_at),
+                        старые месяцы можно отсоединить или удалить целиком.
+
+Архиватор переносит строки пачками: INSERT в архив и DELETE из горячей таблицы
+в одной транзакции, id сохраняются — курсоры пагинации остаются валидными.
+Агрегаты client_transaction_stats не трогаются: перенос их не меняет.
+
+Чтение:
+  ленты «от новых к старым» берут страницу из горячей таблицы и дочитывают
+  архив, только если горячие строки кончились;
+  запросы за период идут в архив, только если период начинается не позже
+  самой новой архивной строки клиента (archived_until).
+
+Запуск раз в сутки (cron) или фоном в приложении при ARCHIVE_INTERVAL > 0:
+    python -m db.archive [--hot-months 12] [--batch 5000]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, datetime, timezone
+
+from anyio import to_thread
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection
+
+from db import models
+from db.periods import utc_start
+
+load_dotenv()
+
+ARCHIVE_HOT_MONTHS = int(os.getenv("ARCHIVE_HOT_MONTHS", "12"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "5000"))
+# Период фонового архиватора в секундах; 0 — только через python -m db.archive
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))
+
+COLUMNS = [
+    "id", "created_at", "transaction_type", "amount", "description", "status",
+    "from_card_id", "to_card_id", "loan_id", "client_id",
+]
+
+
+def archived_until(client_id: int):
+    """Запрос: created_at самой новой архивной транзакции клиента (None — архив пуст)"""
+    archive = models.TransactionArchive
+    return select(func.max(archive.created_at)).where(archive.client_id == client_id)
+
+
+def needs_archive(until: datetime | None, date_from: date | datetime | None) -> bool:
+    """Нужен ли архив для периода, начинающегося с date_from"""
+    if until is None:
+        return False
+    if date_from is None:
+        return True
+    until = _utc_naive(until)
+    if not isinstance(date_from, datetime):
+        return date_from <= until.date()
+    return _utc_naive(date_from) <= until
+
+
+def _utc_naive(value: datetime) -> datetime:
+    # Postgres отдаёт timestamptz в поясе сессии, SQLite — наивное время UTC
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# ========================================
+# Перенос
+# ========================================
+def month_start(day: date, shift: int = 0) -> date:
+    """Первое число месяца day, сдвинутого на shift месяцев"""
+    index = day.year * 12 + day.month - 1 + shift
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(today: date, hot_months: int = ARCHIVE_HOT_MONTHS) -> date:
+    """Всё раньше этой даты — закрытые месяцы для архива (текущий месяц всегда горячий)"""
+    return month_start(today, -max(hot_months, 1) + 1)
+
+
+def ensure_partitions(conn: Connection, cutoff: datetime):
+    """Postgres: секции архива для всех месяцев, которые будут перенесены"""
+    if conn.dialect.name != "postgresql":
+        return
+    oldest = conn.execute(
+        select(func.min(models.Transaction.created_at))
+        .where(models.Transaction.created_at < cutoff)
+    ).scalar()
+    if oldest is None:
+        return
+    month = month_start(_utc_naive(oldest).date())
+    while month < cutoff.date():
+        following = month_start(month, 1)
+        # Границы секций — полночь UTC, как у cutoff, а не пояса сессии
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS transactions_archive_{month:%Y_%m} "
+            f"PARTITION OF transactions_archive FOR VALUES FROM ('{month} 00:00+00') TO ('{following} 00:00+00')")
+        month = following
+
+
+def move_batch(conn: Connection, cutoff: datetime, batch: int) -> int:
+    """Перенести до batch строк старше cutoff; возвращает число перенесённых"""
+    if conn.dialect.name == "postgresql":
+        # Два архиватора не должны переносить одни и те же строки
+        conn.exec_driver_sql("SELECT pg_advisory_xact_lock(727002)")
+
+    transaction = models.Transaction
+    ids = list(conn.execute(
+        select(transaction.id)
+        .where(transaction.created_at < cutoff)
+        .order_by(transaction.created_at)
+        .limit(batch)
+    ).scalars())
+    if not ids:
+        return 0
+
+    columns = [getattr(transaction, name) for name in COLUMNS]
+    conn.execute(
+        insert(models.TransactionArchive)
+        .from_select(COLUMNS, select(*columns).where(transaction.id.in_(ids)))
+    )
+    conn.execute(delete(transaction).where(transaction.id.in_(ids)))
+    return len(ids)
+
+
+def archive(conn_factory, cutoff: date, batch: int = ARCHIVE_BATCH, verbose: bool = False) -> int:
+    """Перенести все строки старше cutoff; каждая пачка — своя транзакция"""
+    cutoff = utc_start(cutoff)
+    with conn_factory() as conn, conn.begin():
+        ensure_partitions(conn, cutoff)
+
+    moved = 0
+    while True:
+        with conn_factory() as conn, conn.begin():
+            count = move_batch(conn, cutoff, batch)
+        moved += count
+        if verbose and count:
+            print(f"  перенесено {moved}")
+        if count < batch:
+            return moved
+
+
+# ========================================
+# Фоновый архиватор
+# ========================================
+class TransactionArchiver:
+    def __init__(self, interval: float = ARCHIVE_INTERVAL):
+        self.interval = interval
+        self.moved = 0
+        self._task: asyncio.Task | None = None
+
+    def run_once(self) -> int:
+        from db.database import engine
+
+        cutoff = archive_cutoff(datetime.now(timezone.utc).date())
+        moved = archive(engine.connect, cutoff)
+        self.moved += moved
+        return moved
+
+    async def _run(self):
+        while True:
+            try:
+                moved = await to_thread.run_sync(self.run_once)
+                if moved:
+                    print(f"🗄️ Архив транзакций: перенесено {moved}")
+            except Exception as e:
+                print(f"⚠️ Архивация транзакций не удалась: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+archiver = TransactionArchiver()
+
+
+def expose_metrics(lines: list):
+    """Счётчик архиватора для /metrics"""
+    lines += [
+        "# HELP transactions_archived_total Транзакций, перенесённых в архив этим процессом",
+        "# TYPE transactions_archived_total counter",
+        f"transactions_archived_total {archiver.moved}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос закрытых месяцев транзакций в архив")
+    parser.add_argument("--hot-months", type=int, default=ARCHIVE_HOT_MONTHS,
+                        help="сколько месяцев (включая текущий) оставить в горячей таблице")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH, help="строк в одной транзакции")
+    args = parser.parse_args()
+
+    from db.database import engine
+
+    cutoff = archive_cutoff(datetime.now(timezone.utc).date(), args.hot_months)
+    started = time.perf_counter()
+    print(f"🗄️ Архивация транзакций до {cutoff}...")
+    moved = archive(engine.connect, cutoff, args.batch, verbose=True)
+    print(f"✅ Перенесено {moved} транзакций за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,159 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from anyio import to_thread
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
+from .instrumentation import instrument_engine, set_slow_query_log
+from .pool import engine_options
+from .replica import ReplicaRouter
+from .slow_queries import SLOW_QUERY_MS, SlowQueryLog
 
 load_dotenv()
 
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
-def get_db():
+# ========================================
+# Асинхронный движок
+# ========================================
+# Драйверы, через которые SQLAlchemy умеет работать асинхронно
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def make_async_url(url: str) -> str:
+    """Подбирает асинхронный драйвер для того же DATABASE_URL"""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if drivername is None:
+        raise ValueError(
+            f"Нет асинхронного драйвера для БД: {parsed.get_backend_name()}")
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL") or make_async_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+
+# expire_on_commit=False — после commit атрибуты остаются доступны без
+# повторной ленивой загрузки (в async она недоступна)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+
+# ========================================
+# Реплика для чтения (опционально)
+# ========================================
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine)
+
+    ASYNC_REPLICA_URL = make_async_url(DATABASE_REPLICA_URL)
+    async_replica_engine = create_async_engine(
+        ASYNC_REPLICA_URL, **engine_options(ASYNC_REPLICA_URL, is_async=True))
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=async_replica_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+else:
+    replica_engine = ReplicaSessionLocal = None
+    async_replica_engine = AsyncReplicaSessionLocal = None
+
+replica_router = ReplicaRouter(replica_engine)
+
+for _engine in (engine, async_engine, replica_engine, async_replica_engine):
+    if _engine is not None:
+        instrument_engine(getattr(_engine, "sync_engine", _engine))
+
+if SLOW_QUERY_MS > 0:
+    # Запросы с реплики объясняются на реплике — там свои план и статистика
+    explain_urls = {engine: SQLALCHEMY_DATABASE_URL, async_engine.sync_engine: SQLALCHEMY_DATABASE_URL}
+    if DATABASE_REPLICA_URL:
+        explain_urls[replica_engine] = DATABASE_REPLICA_URL
+        explain_urls[async_replica_engine.sync_engine] = DATABASE_REPLICA_URL
+    set_slow_query_log(SlowQueryLog(explain_urls), SLOW_QUERY_MS)
+
+
+def request_principal(request: Request) -> str:
+    """Ключ «кто читает/пишет»: токен, а для анонимов — IP"""
+    auth = request.headers.get("authorization")
+    if auth:
+        return auth
+    return request.client.host if request.client else "anonymous"
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_write(session):
+    # Писатель какое-то время читает из primary, чтобы видеть свои изменения
+    if session.info.pop("wrote", False) and "principal" in session.info:
+        replica_router.mark_write(session.info["principal"])
+
+
+def get_db(request: Request):
     db = SessionLocal()
+    if replica_router.enabled:
+        db.info["principal"] = request_principal(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        if replica_router.enabled:
+            db.sync_session.info["principal"] = request_principal(request)
+        yield db
+
+
+def get_read_db(request: Request):
+    """Сессия только для чтения: реплика, если она не отстаёт, иначе primary"""
+    if replica_router.enabled and replica_router.lag_check_due():
+        replica_router.refresh_lag()
+
+    if replica_router.use_replica(request_principal(request)):
+        db = ReplicaSessionLocal()
+    else:
+        db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def async_read_session_factory(request: Request):
+    """Фабрика async-сессий для чтения: реплика, если она не отстаёт, иначе primary"""
+    if replica_router.enabled and replica_router.lag_check_due():
+        await to_thread.run_sync(replica_router.refresh_lag)
+
+    if replica_router.use_replica(request_principal(request)):
+        return AsyncReplicaSessionLocal
+    return AsyncSessionLocal
+
+
+async def get_async_read_db(request: Request):
+    """Async-вариант get_read_db"""
+    session_factory = await async_read_session_factory(request)
+    async with session_factory() as db:
+        yield db
@@ -1,16 +1,28 @@
 import os
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 from db import models
-from passlib.context import CryptContext
+from utils.passwords import hash_password
 from dotenv import load_dotenv
 
 load_dotenv()
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
+def insert_missing(db: Session, model, key: str, rows: list[dict]) -> set:
+    """
+    Идемпотентная вставка: один SELECT существующих ключей и один
+    bulk INSERT недостающих строк. Возвращает уже существовавшие ключи.
+    """
+    column = getattr(model, key)
+    existing = set(db.scalars(
+        select(column).where(column.in_([row[key] for row in rows]))
+    ))
+
+    missing = [row for row in rows if row[key] not in existing]
+    if missing:
+        db.execute(insert(model), missing)
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+    return existing
 
 
 def init_roles(db: Session):
@@ -23,19 +35,14 @@ def init_roles(db: Session):
         {"name": "Loan_Officer"},    # Кредитный специалист - работа с кредитами
     ]
 
-    for role_data in roles_data:
-        existing_role = db.query(models.Role).filter(
-            models.Role.name == role_data["name"]
-        ).first()
+    existing = insert_missing(db, models.Role, "name", roles_data)
+    db.commit()
 
-        if not existing_role:
-            new_role = models.Role(**role_data)
-            db.add(new_role)
-            print(f"✅ Создана роль: {role_data['name']}")
-        else:
+    for role_data in roles_data:
+        if role_data["name"] in existing:
             print(f"ℹ️  Роль уже существует: {role_data['name']}")
-
-    db.commit()
+        else:
+            print(f"✅ Создана роль: {role_data['name']}")
 
 
 def init_branches(db: Session):
@@ -58,19 +65,14 @@ def init_branches(db: Session):
         }
     ]
 
-    for branch_data in branches_data:
-        existing_branch = db.query(models.Branch).filter(
-            models.Branch.name == branch_data["name"]
-        ).first()
+    existing = insert_missing(db, models.Branch, "name", branches_data)
+    db.commit()
 
-        if not existing_branch:
-            new_branch = models.Branch(**branch_data)
-            db.add(new_branch)
-            print(f"✅ Создано отделение: {branch_data['name']}")
-        else:
+    for branch_data in branches_data:
+        if branch_data["name"] in existing:
             print(f"ℹ️  Отделение уже существует: {branch_data['name']}")
-
-    db.commit()
+        else:
+            print(f"✅ Создано отделение: {branch_data['name']}")
 
 
 def create_superadmin(db: Session):
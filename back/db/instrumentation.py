@@ -0,0 +1,93 @@
+"""
+Учёт SQL-запросов в рамках HTTP-запроса (через события движка)
+"""
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_WHITESPACE = re.compile(r"\s+")
+# Развёрнутые списки параметров IN (?, ?, ?) схлопываются в один
+_PLACEHOLDER_LIST = re.compile(
+    r"(\?|%s|%\(\w+\)s|\$\d+|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|\$\d+|:\w+))+")
+
+
+def statement_shape(statement: str) -> str:
+    """Нормализованный текст запроса: без лишних пробелов и длины IN-списков"""
+    return _PLACEHOLDER_LIST.sub("?", _WHITESPACE.sub(" ", statement)).strip()
+
+
+class QueryStats:
+    """Сколько запросов к БД сделал текущий HTTP-запрос и сколько они заняли"""
+
+    __slots__ = ("count", "duration", "statements", "scope")
+
+    def __init__(self, track_statements: bool = False, scope: dict | None = None):
+        self.count = 0
+        self.duration = 0.0
+        # Счётчик текстов запросов — только в режиме отладки (поиск N+1)
+        self.statements: Counter | None = Counter() if track_statements else None
+        self.scope = scope
+
+    def route(self) -> str | None:
+        """Шаблон маршрута текущего запроса (или путь, если роутинг ещё не прошёл)"""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return route.path if route is not None else self.scope.get("path")
+
+    def repeated_shapes(self, threshold: int) -> list[tuple[str, int]]:
+        """Формы запросов, повторившиеся threshold и более раз (вероятный N+1)"""
+        if not self.statements:
+            return []
+        shapes = Counter()
+        for statement, count in self.statements.items():
+            shapes[statement_shape(statement)] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+
+# Выставляется middleware на время обработки запроса. Sync-эндпоинты
+# выполняются в threadpool с копией контекста, поэтому видят тот же объект.
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+# Журнал медленных запросов (db.slow_queries), подключается в database.py
+_slow_query_log = None
+_slow_query_seconds = float("inf")
+
+
+def set_slow_query_log(log, threshold_ms: float):
+    global _slow_query_log, _slow_query_seconds
+    _slow_query_log = log
+    _slow_query_seconds = threshold_ms / 1000
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время старта — на контексте выполнения: упавший запрос after не получит,
+    # и на соединении из пула ничего не копится
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] += 1
+
+    if elapsed >= _slow_query_seconds:
+        _slow_query_log.submit(
+            conn.engine, statement, parameters, executemany, elapsed, stats.route() if stats is not None else None)
+
+
+def instrument_engine(engine: Engine):
+    """Подключает учёт запросов к движку (для async — к engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
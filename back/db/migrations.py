@@ -0,0 +1,143 @@
+"""
+Миграции схемы БД
+
+Каждая миграция — функция(conn), переводящая схему из версии N в N+1.
+Новая БД создаётся сразу в актуальном виде через create_all и получает
+последнюю версию; существующая — догоняется по списку MIGRATIONS.
+"""
+from sqlalchemy import inspect, select, func, update
+from sqlalchemy.engine import Connection
+
+from db.database import Base
+from db import models
+from utils.validators import normalize_phone
+
+
+def baseline(conn: Connection):
+    """Версия 1: схема, которую раньше создавал create_all при импорте main.py"""
+    Base.metadata.create_all(bind=conn)
+
+
+def employee_permission_version(conn: Connection):
+    """Версия 2: версия прав сотрудника для access-токенов с claims"""
+    conn.exec_driver_sql(
+        "ALTER TABLE employees ADD COLUMN permission_version INTEGER NOT NULL DEFAULT 1")
+
+
+def token_revocations(conn: Connection):
+    """Версия 3: таблица отозванных токенов"""
+    models.TokenRevocation.__table__.create(bind=conn, checkfirst=True)
+
+
+def client_phone_normalized(conn: Connection):
+    """Версия 4: нормализованный телефон клиента с уникальным индексом"""
+    clients = models.Client.__table__
+    conn.exec_driver_sql("ALTER TABLE clients ADD COLUMN phone_normalized VARCHAR(20)")
+
+    # Дубликаты, накопившиеся без ограничения, остаются у самого раннего клиента
+    seen = set()
+    rows = conn.execute(select(clients.c.id, clients.c.phone).order_by(clients.c.id)).all()
+    for row in rows:
+        phone = normalize_phone(row.phone)
+        if phone is None:
+            continue
+        if phone in seen:
+            print(f"⚠️  Телефон клиента {row.id} совпадает с более ранним — нормализованный номер не заполнен")
+            continue
+        seen.add(phone)
+        conn.execute(update(clients).where(clients.c.id == row.id).values(phone_normalized=phone))
+
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX ix_clients_phone_normalized ON clients (phone_normalized)")
+
+
+def transaction_keyset_index(conn: Connection):
+    """Версия 5: id в индексе (client_id, created_at) для курсорной пагинации"""
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_transaction_client_created")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_transaction_client_created ON transactions (client_id, created_at, id)")
+
+
+def transaction_stats_index(conn: Connection):
+    """Версия 6: покрывающий индекс для статистики транзакций клиента"""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_transaction_client_stats "
+        "ON transactions (client_id, status, created_at, transaction_type, amount)")
+
+
+def client_transaction_stats(conn: Connection):
+    """Версия 7: агрегаты транзакций клиента по типу и месяцу"""
+    from db.transaction_stats import fill
+
+    models.ClientTransactionStats.__table__.create(bind=conn, checkfirst=True)
+    fill(conn)
+
+
+def transaction_search_index(conn: Connection):
+    """Версия 8: полнотекстовый индекс описаний и индекс (client_id, amount)"""
+    from db.transaction_search import create_search_index
+
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_transaction_client_amount ON transactions (client_id, amount)")
+    create_search_index(conn)
+
+
+def transaction_archive(conn: Connection):
+    """Версия 9: архив транзакций и лишние индексы горячей таблицы"""
+    models.TransactionArchive.__table__.create(bind=conn, checkfirst=True)
+    for index in ("ix_transactions_transaction_type", "ix_transactions_amount", "ix_transactions_status",
+                  "ix_transactions_client_id", "ix_transaction_status_created"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+
+
+# Порядок важен: индекс + 1 = номер версии после миграции
+MIGRATIONS = [
+    baseline,
+    employee_permission_version,
+    token_revocations,
+    client_phone_normalized,
+    transaction_keyset_index,
+    transaction_stats_index,
+    client_transaction_stats,
+    transaction_search_index,
+    transaction_archive,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: Connection) -> int:
+    """Текущая версия схемы (0 — таблицы версий ещё нет)"""
+    if not inspect(conn).has_table(models.SchemaVersion.__tablename__):
+        return 0
+    return conn.execute(select(func.max(models.SchemaVersion.version))).scalar() or 0
+
+
+def _lock(conn: Connection):
+    # Две параллельные миграции на Postgres не должны пересечься
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SELECT pg_advisory_xact_lock(727001)")
+
+
+def migrate(conn: Connection) -> tuple[int, int]:
+    """Доводит схему до SCHEMA_VERSION, возвращает (было, стало)"""
+    _lock(conn)
+    current = get_schema_version(conn)
+    start = current
+
+    if current == 0:
+        if inspect(conn).has_table(models.Client.__tablename__):
+            # БД создана старым create_all — считаем её базовой версией
+            current = 1
+        else:
+            Base.metadata.create_all(bind=conn)
+            current = SCHEMA_VERSION
+        models.SchemaVersion.__table__.create(bind=conn, checkfirst=True)
+        conn.execute(models.SchemaVersion.__table__.insert().values(version=current))
+
+    for version in range(current + 1, SCHEMA_VERSION + 1):
+        print(f"⬆️  Миграция до версии {version}: {MIGRATIONS[version - 1].__name__}")
+        MIGRATIONS[version - 1](conn)
+        conn.execute(models.SchemaVersion.__table__.insert().values(version=version))
+
+    return start, SCHEMA_VERSION
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, func, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, func, Index, event
+from sqlalchemy.orm import relationship, validates
 from .database import Base
+from utils.validators import normalize_phone
 import random
 
 
@@ -39,6 +40,8 @@ class Employee(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True, index=True)  # ✅ Индекс для фильтрации
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Растёт при смене роли/отделения/активности — старые access-токены отклоняются
+    permission_version = Column(Integer, nullable=False, default=1, server_default='1')
 
     role_id = Column(Integer, ForeignKey('roles.id'), index=True)  # ✅ Индекс FK
     branch_id = Column(Integer, ForeignKey('branches.id'), index=True)  # ✅ Индекс FK
@@ -65,6 +68,8 @@ class Client(Base):
     email = Column(String(100), unique=True, nullable=False, index=True)  # ✅ Индекс для логина
     hashed_password = Column(String, nullable=False)
     phone = Column(String(20), index=True)  # ✅ Индекс для поиска
+    # Цифры телефона: "+7 900 000-00-01" и "79000000001" — один номер
+    phone_normalized = Column(String(20), unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # ✅ Для сортировки
 
     personal_info = relationship('PersonalInfo', back_populates='client', uselist=False)
@@ -79,6 +84,11 @@ class Client(Base):
         Index('ix_client_fullname', 'last_name', 'first_name'),
     )
 
+    @validates('phone')
+    def _sync_phone_normalized(self, key, phone):
+        self.phone_normalized = normalize_phone(phone)
+        return phone
+
 
 # === ПЕРСОНАЛЬНАЯ ИНФОРМАЦИЯ ===
 class PersonalInfo(Base):
@@ -185,16 +195,18 @@ class Transaction(Base):
     __tablename__ = 'transactions'
 
     id = Column(Integer, primary_key=True, index=True)
-    transaction_type = Column(String(50), nullable=False, index=True)  # ✅ Индекс для фильтрации
-    amount = Column(Float, nullable=False, index=True)  # ✅ Индекс для статистики
+    # Одиночные индексы по типу, сумме и статусу убраны: все запросы идут
+    # по клиенту и покрыты составными индексами ниже
+    transaction_type = Column(String(50), nullable=False)
+    amount = Column(Float, nullable=False)
     description = Column(String(255))
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # ✅ Для сортировки
-    status = Column(String(30), default="completed", index=True)  # ✅ Индекс для фильтрации
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # ✅ Архиватор (db/archive.py)
+    status = Column(String(30), default="completed")
 
     from_card_id = Column(Integer, ForeignKey('cards.id'), nullable=True, index=True)  # ✅ Индекс FK
     to_card_id = Column(Integer, ForeignKey('cards.id'), nullable=True, index=True)  # ✅ Индекс FK
     loan_id = Column(Integer, ForeignKey('loans.id'), nullable=True, index=True)  # ✅ Индекс FK
-    client_id = Column(Integer, ForeignKey('clients.id'), index=True)  # ✅ Индекс FK
+    client_id = Column(Integer, ForeignKey('clients.id'))  # ✅ FK покрыт составными индексами
 
     client = relationship('Client', back_populates='transactions')
     from_card = relationship('Card', foreign_keys=[from_card_id], backref='transactions_sent')
@@ -204,6 +216,90 @@ class Transaction(Base):
     # ✅ Составные индексы для частых запросов
     __table_args__ = (
         Index('ix_transaction_client_type', 'client_id', 'transaction_type'),
-        Index('ix_transaction_client_created', 'client_id', 'created_at'),
-        Index('ix_transaction_status_created', 'status', 'created_at'),
-    )
\ No newline at end of file
+        # id в конце — курсорная пагинация по (created_at, id) целиком по индексу
+        Index('ix_transaction_client_created', 'client_id', 'created_at', 'id'),
+        # Покрывающий для /transactions/me/stats: GROUP BY без чтения строк таблицы
+        Index('ix_transaction_client_stats', 'client_id', 'status', 'created_at', 'transaction_type', 'amount'),
+        # Поиск по сумме и диапазону сумм (/transactions/search/)
+        Index('ix_transaction_client_amount', 'client_id', 'amount'),
+    )
+
+
+@event.listens_for(Transaction.__table__, 'after_create')
+def _create_search_index(table, connection, **kw):
+    # FTS5 / pg_trgm по описанию — вне возможностей create_all
+    from db.transaction_search import create_search_index
+    create_search_index(connection)
+
+
+# === АРХИВ ТРАНЗАКЦИЙ ===
+class TransactionArchive(Base):
+    """Транзакции закрытых месяцев (db/archive.py); на Postgres — секции по месяцам"""
+    __tablename__ = 'transactions_archive'
+
+    # Ключ секционирования обязан входить в первичный ключ
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime(timezone=True), primary_key=True)
+    transaction_type = Column(String(50), nullable=False)
+    amount = Column(Float, nullable=False)
+    description = Column(String(255))
+    status = Column(String(30))
+    from_card_id = Column(Integer)
+    to_card_id = Column(Integer)
+    loan_id = Column(Integer)
+    client_id = Column(Integer)
+
+    # Холодные данные читаются только постранично по клиенту — один индекс
+    __table_args__ = (
+        Index('ix_transaction_archive_client_created', 'client_id', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+
+# === АГРЕГАТЫ ТРАНЗАКЦИЙ ===
+class ClientTransactionStats(Base):
+    """Число и сумма завершённых транзакций клиента по типу и месяцу (db/transaction_stats.py)"""
+    __tablename__ = 'client_transaction_stats'
+
+    client_id = Column(Integer, ForeignKey('clients.id'), primary_key=True)
+    transaction_type = Column(String(50), primary_key=True)
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
+
+
+@event.listens_for(Transaction, 'after_insert')
+def _count_transaction(mapper, connection, target):
+    # Тем же соединением, что и INSERT — агрегат в одной транзакции с операцией
+    from db.transaction_stats import record_transaction
+    record_transaction(connection, target.id)
+
+
+@event.listens_for(Transaction, 'after_insert')
+def _invalidate_analytics(mapper, connection, target):
+    # Дата задана явно (не server_default) — период может быть уже закрытым и закешированным
+    created_at = target.__dict__.get('created_at')
+    if created_at is not None:
+        from utils.analytics_cache import analytics_cache
+        analytics_cache.invalidate(target.client_id, created_at)
+
+
+# === ОТЗЫВ ТОКЕНОВ ===
+class TokenRevocation(Base):
+    __tablename__ = 'token_revocations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # ✅ Воркеры дочитывают по id
+    subject_type = Column(String(10), nullable=False)  # client / employee
+    subject_id = Column(Integer, nullable=False)
+    jti = Column(String(32), index=True)  # ✅ Отзыв одного токена
+    not_before = Column(Float)  # Отзыв всех токенов субъекта с iat раньше этой отметки
+    expires_at = Column(Float, nullable=False, index=True)  # ✅ После — запись не нужна (все токены истекли)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# === ВЕРСИЯ СХЕМЫ БД ===
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
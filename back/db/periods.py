@@ -0,0 +1,60 @@
+"""
+Группировка дат на стороне БД
+
+SQLite и Postgres по-разному обрезают дату до периода — здесь одно
+выражение для обоих, возвращающее метку периода строкой: день '2025-03-05',
+неделя — её понедельник '2025-03-03', месяц '2025-03'. Те же метки
+строятся и в Python (period_start / period_label), чтобы перечислить периоды.
+
+Периоды считаются в UTC независимо от часового пояса сессии Postgres:
+границы запросов передаются как aware-datetime (utc_start).
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import func
+
+BUCKETS = ("day", "week", "month")
+
+
+def period_label_sql(column, dialect_name: str, bucket: str):
+    """Метка периода bucket для GROUP BY"""
+    if dialect_name == "postgresql":
+        pattern = "YYYY-MM" if bucket == "month" else "YYYY-MM-DD"
+        # timezone('UTC', timestamptz) — время UTC без пояса: date_trunc не зависит от сессии
+        return func.to_char(func.date_trunc(bucket, func.timezone("UTC", column)), pattern)
+    if bucket == "week":
+        # Ближайшее воскресенье не раньше даты, минус 6 дней — понедельник недели
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m" if bucket == "month" else "%Y-%m-%d", column)
+
+
+def month_label(column, dialect_name: str):
+    """Метка месяца 'YYYY-MM' для GROUP BY"""
+    return period_label_sql(column, dialect_name, "month")
+
+
+def utc_start(day: date) -> datetime:
+    """Полночь UTC дня day — граница периода для сравнения с created_at"""
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def period_start(day: date, bucket: str) -> date:
+    """Первый день периода, в который попадает day"""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: date, bucket: str) -> date:
+    """Первый день следующего периода"""
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def period_label(start: date, bucket: str) -> str:
+    return start.strftime("%Y-%m") if bucket == "month" else start.isoformat()
@@ -0,0 +1,134 @@
+"""
+Пул соединений с БД: настройки из окружения и метрики насыщения
+"""
+import os
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_int(name: str, default: int) -> int:
+    """Целое число из переменной окружения"""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# ========================================
+# Настройки пула
+# ========================================
+POOL_SIZE = env_int("DB_POOL_SIZE", 10)
+MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 30)          # секунды ожидания соединения
+POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800)        # пересоздавать соединение раз в N секунд
+STATEMENT_TIMEOUT_MS = env_int("DB_STATEMENT_TIMEOUT_MS", 15000)  # 0 — без ограничения
+
+# Потоков для sync-эндпоинтов столько же, сколько соединений в пуле:
+# лишние потоки всё равно ждали бы соединение внутри пула
+THREADPOOL_SIZE = env_int("THREADPOOL_SIZE", POOL_SIZE + MAX_OVERFLOW)
+
+
+class PoolStats:
+    """Счётчики ожидания соединения из пула"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Замеряет время получения соединения из пула"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # Пул пересоздаётся при dispose/обрыве — счётчики переносим
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Параметры create_engine для пула и таймаута запросов"""
+    parsed = make_url(url)
+    options = {"pool_pre_ping": True}
+
+    # SQLite в памяти живёт в одном соединении — пул не настраиваем
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+    )
+
+    if parsed.get_backend_name() == "postgresql" and STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+        }
+
+    return options
+
+
+def pool_status(engine) -> dict:
+    """Состояние пула для /health/pool"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **pool.stats.snapshot(),
+    }
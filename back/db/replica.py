@@ -0,0 +1,94 @@
+"""
+Маршрутизация чтения на реплику с учётом отставания
+
+Правила:
+- клиент, который только что писал в primary, ещё STICKY_SECONDS читает
+  из primary (read-your-writes);
+- если реплика отстаёт больше MAX_LAG_SECONDS или недоступна — все
+  чтения идут в primary до следующей проверки.
+"""
+import os
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "5"))
+
+# Максимум запоминаемых «писателей» — старые записи вычищаются
+MAX_TRACKED_WRITERS = 10000
+
+# Отставание реплики Postgres в секундах (0, если реплика догнала primary
+# или это не реплика вовсе)
+PG_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaRouter:
+    """Решает, можно ли отдать чтение реплике"""
+
+    def __init__(self, replica_engine: Engine | None):
+        self.replica_engine = replica_engine
+        self._lock = threading.Lock()
+        self._last_writes: dict[str, float] = {}
+        self._lag = 0.0
+        self._healthy = True
+        self._checked_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica_engine is not None
+
+    def mark_write(self, principal: str):
+        """Запоминает, что principal только что писал в primary"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._last_writes) >= MAX_TRACKED_WRITERS:
+                self._last_writes = {
+                    key: ts for key, ts in self._last_writes.items()
+                    if now - ts < STICKY_SECONDS
+                }
+            self._last_writes[principal] = now
+
+    def lag_check_due(self) -> bool:
+        return time.monotonic() - self._checked_at >= LAG_CHECK_INTERVAL
+
+    def refresh_lag(self):
+        """Обновляет сведения об отставании реплики (блокирующий вызов)"""
+        try:
+            with self.replica_engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = conn.execute(PG_LAG_QUERY).scalar() or 0.0
+                else:
+                    conn.execute(text("SELECT 1"))
+                    lag = 0.0
+            self._lag, self._healthy = float(lag), True
+        except Exception:
+            self._healthy = False
+        self._checked_at = time.monotonic()
+
+    def use_replica(self, principal: str | None) -> bool:
+        if not self.enabled or not self._healthy or self._lag > MAX_LAG_SECONDS:
+            return False
+        if principal is None:
+            return True
+        last_write = self._last_writes.get(principal)
+        return last_write is None or time.monotonic() - last_write >= STICKY_SECONDS
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "healthy": self._healthy,
+            "lag_seconds": round(self._lag, 3),
+            "max_lag_seconds": MAX_LAG_SECONDS,
+            "sticky_seconds": STICKY_SECONDS,
+        }
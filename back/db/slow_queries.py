@@ -0,0 +1,184 @@
+"""
+Журнал медленных SQL-запросов с планом выполнения
+
+Запросы дольше DB_SLOW_QUERY_MS пишутся в ротируемый JSONL-файл
+DB_SLOW_QUERY_LOG: нормализованный SQL, типы параметров, длительность,
+маршрут и EXPLAIN (EXPLAIN QUERY PLAN на SQLite). EXPLAIN выполняется
+в фоновом потоке на отдельном соединении, чтобы не задерживать запрос.
+
+Отчёт по файлу:
+    python -m db.slow_queries --top 20
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+
+from db.instrumentation import statement_shape
+
+load_dotenv()
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))  # 0 — выключено
+# Относительный путь — от папки back, а не от текущего каталога процесса
+SLOW_QUERY_LOG = Path(__file__).resolve().parent.parent / os.getenv(
+    "DB_SLOW_QUERY_LOG", "logs/slow_queries.jsonl")
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+logger = logging.getLogger("nextbank.sql")
+
+
+def parameters_shape(parameters):
+    """Типы параметров без значений (в лог не попадают персональные данные)"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """Очередь медленных запросов + фоновый поток EXPLAIN и записи в файл"""
+
+    def __init__(self, explain_urls: dict, path: str | Path = SLOW_QUERY_LOG):
+        """explain_urls — движок приложения → sync-URL той же БД: EXPLAIN идёт туда, где выполнялся запрос"""
+        self.explain_urls = explain_urls
+        self.path = Path(path)
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, engine, statement: str, parameters, executemany: bool, duration: float, route: str | None):
+        """Вызывается из after_cursor_execute — только кладёт в очередь"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(
+                (self.explain_urls.get(engine), statement, parameters, executemany, duration, route))
+        except queue.Full:
+            pass  # под штормом медленных запросов лучше потерять запись, чем тормозить
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="slow-query-log", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        writer = logging.getLogger("nextbank.slow_queries")
+        writer.propagate = False
+        handler = RotatingFileHandler(
+            self.path, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        writer.addHandler(handler)
+        writer.setLevel(logging.INFO)
+
+        # Отдельные соединения (по одному на БД): EXPLAIN не занимает пулы приложения
+        explain_engines = {}
+
+        while True:
+            url, statement, parameters, executemany, duration, route = self._queue.get()
+            explain_engine = None
+            if url is not None and not executemany:
+                explain_engine = explain_engines.get(url)
+                if explain_engine is None:
+                    explain_engine = explain_engines[url] = create_engine(
+                        url, poolclass=QueuePool, pool_size=1, max_overflow=0)
+            entry = {
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "duration_ms": round(duration * 1000, 2),
+                "route": route,
+                "sql": statement_shape(statement),
+                "params": parameters_shape(parameters[0] if executemany and parameters else parameters),
+                "executemany": executemany,
+                "plan": None if explain_engine is None else self._explain(explain_engine, statement, parameters),
+            }
+            writer.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    @staticmethod
+    def _explain(explain_engine, statement: str, parameters):
+        try:
+            with explain_engine.connect() as conn:
+                if conn.dialect.name == "sqlite":
+                    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                    return [row[-1] for row in rows]
+                if conn.dialect.name == "postgresql":
+                    return conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                return None
+        except Exception as e:
+            logger.warning("Не удалось получить EXPLAIN: %s", e)
+            return {"error": str(e)}
+
+
+# ========================================
+# Отчёт: самые тяжёлые запросы
+# ========================================
+def log_files(path: Path) -> list[Path]:
+    """Текущий файл и ротированные копии (.1, .2, ...)"""
+    files = [path] + sorted(path.parent.glob(f"{path.name}.*"))
+    return [f for f in files if f.exists()]
+
+
+def top_offenders(path: Path, top: int = 20, sort_by: str = "total") -> list[dict]:
+    groups = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set(), "plan": None})
+    for file in log_files(path):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                group = groups[entry["sql"]]
+                group["count"] += 1
+                group["total_ms"] += entry["duration_ms"]
+                if entry["duration_ms"] >= group["max_ms"]:
+                    group["max_ms"] = entry["duration_ms"]
+                    group["plan"] = entry["plan"]
+                if entry["route"]:
+                    group["routes"].add(entry["route"])
+
+    key = {"total": "total_ms", "max": "max_ms", "count": "count"}[sort_by]
+    rows = sorted(groups.items(), key=lambda item: item[1][key], reverse=True)[:top]
+    return [
+        {
+            "sql": sql,
+            "count": g["count"],
+            "total_ms": round(g["total_ms"], 2),
+            "avg_ms": round(g["total_ms"] / g["count"], 2),
+            "max_ms": g["max_ms"],
+            "routes": sorted(g["routes"]),
+            "plan": g["plan"],
+        }
+        for sql, g in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Топ медленных SQL-запросов")
+    parser.add_argument("--file", default=SLOW_QUERY_LOG)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--sort", choices=["total", "max", "count"], default="total")
+    parser.add_argument("--plans", action="store_true", help="Показать планы")
+    args = parser.parse_args()
+
+    for i, row in enumerate(top_offenders(Path(args.file), args.top, args.sort), start=1):
+        print(f"#{i}  total {row['total_ms']} ms  count {row['count']}  "
+              f"avg {row['avg_ms']} ms  max {row['max_ms']} ms")
+        print(f"    routes: {', '.join(row['routes']) or '-'}")
+        print(f"    {row['sql']}")
+        if args.plans and row["plan"] is not None:
+            print("    plan: " + json.dumps(row["plan"], ensure_ascii=False, indent=2).replace("\n", "\n    "))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Генератор синтетических данных для нагрузочных тестов и разбора планов запросов
+
+Создаёт N клиентов, у каждого — персональные данные, счета, карты, кредиты,
+процессы и история транзакций. Всё пишется bulk-вставками пачками, id
+назначаются заранее, чтобы не тратить round trip на RETURNING.
+
+Запуск (после python -m bootstrap):
+    python -m db.synthetic_data --clients 100000 --transactions-per-client 100
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+
+from db import models
+from db.database import engine
+from db.transaction_stats import fill
+from utils.passwords import hash_password
+from utils.encryption import encrypt_cvv
+from utils.validators import normalize_phone
+
+# Пароль всех синтетических клиентов (хэшируется один раз)
+SYNTHETIC_PASSWORD = "Synthetic1!"
+EMAIL_DOMAIN = "synthetic.nextbank.ru"
+
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Алексей", "Елена", "Дмитрий", "Ольга", "Сергей", "Наталья"]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов", "Михайлов", "Новиков"]
+PATRONYMICS = ["Иванович", "Петрович", "Сергеевич", "Алексеевич", "Дмитриевич", None]
+EMPLOYMENT = ["Работает", "Самозанятый", "Студент", "Пенсионер", "ИП"]
+PROCESS_TYPES = ["loan_application", "card_issue", "account_opening"]
+PROCESS_STATUSES = ["in_progress", "approved", "rejected", "completed"]
+
+# Тип транзакции → (вес, медианная сумма)
+TRANSACTION_MIX = {
+    "deposit": (30, 15000),
+    "withdraw": (35, 3000),
+    "transfer": (30, 5000),
+    "loan_payment": (5, 12000),
+}
+
+# Таблицы в порядке вставки (по внешним ключам)
+TABLES = [
+    models.Client, models.PersonalInfo, models.Account, models.Card,
+    models.Loan, models.Process, models.Transaction,
+]
+
+
+def next_ids(conn: Connection) -> dict:
+    """Первый свободный id для каждой таблицы"""
+    return {
+        model: (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+        for model in TABLES
+    }
+
+
+def reset_sequences(conn: Connection):
+    """На Postgres двигаем sequence за вставленные вручную id"""
+    if conn.dialect.name != "postgresql":
+        return
+    for model in TABLES:
+        table = model.__tablename__
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+        ))
+
+
+def copy_rows(conn: Connection, model, rows: list[dict]):
+    """COPY FROM STDIN на Postgres — на порядок быстрее INSERT"""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+
+    sql = (f"COPY {model.__tablename__} ({', '.join(columns)}) "
+           "FROM STDIN WITH (FORMAT csv)")
+    cursor = conn.connection.dbapi_connection.cursor()
+    if conn.dialect.driver == "psycopg2":
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def insert_chunked(conn: Connection, model, rows: list[dict], chunk_size: int):
+    use_copy = conn.dialect.name == "postgresql" and conn.dialect.driver in ("psycopg2", "psycopg")
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if use_copy:
+            copy_rows(conn, model, chunk)
+        else:
+            conn.execute(insert(model), chunk)
+
+
+class SyntheticBatch:
+    """Строки всех таблиц для пачки клиентов"""
+
+    def __init__(self, rng: random.Random, ids: dict, hashed_password: str,
+                 transactions_per_client: int, history_days: int, now: datetime):
+        self.rng = rng
+        self.ids = ids
+        self.hashed_password = hashed_password
+        self.transactions_per_client = transactions_per_client
+        self.history_days = history_days
+        self.now = now
+        self.rows = {model: [] for model in TABLES}
+
+    def take_id(self, model) -> int:
+        value = self.ids[model]
+        self.ids[model] += 1
+        return value
+
+    def random_moment(self, since: datetime) -> datetime:
+        span = (self.now - since).total_seconds()
+        return since + timedelta(seconds=self.rng.random() * span)
+
+    def amount(self, median: float) -> float:
+        return round(self.rng.lognormvariate(0, 0.8) * median, 2)
+
+    def add_client(self):
+        rng = self.rng
+        client_id = self.take_id(models.Client)
+        joined = self.now - timedelta(days=rng.randint(30, self.history_days))
+        phone = f"+7 9{client_id:09d}"[:20]
+
+        self.rows[models.Client].append({
+            "id": client_id,
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "patronymic": rng.choice(PATRONYMICS),
+            "email": f"client{client_id}@{EMAIL_DOMAIN}",
+            "hashed_password": self.hashed_password,
+            "phone": phone,
+            "phone_normalized": normalize_phone(phone),
+            "created_at": joined,
+        })
+
+        if rng.random() < 0.9:
+            self.rows[models.PersonalInfo].append({
+                "id": self.take_id(models.PersonalInfo),
+                "passport_number": f"SYN{client_id:012d}",
+                "address": f"г. Брянск, ул. Синтетическая, д. {rng.randint(1, 200)}",
+                "birth_date": datetime(rng.randint(1950, 2005), rng.randint(1, 12), rng.randint(1, 28)),
+                "employment_status": rng.choice(EMPLOYMENT),
+                "client_id": client_id,
+            })
+
+        cards = []
+        for _ in range(rng.randint(1, 3)):
+            account_id = self.take_id(models.Account)
+            self.rows[models.Account].append({
+                "id": account_id,
+                "account_number": f"40817810{account_id:012d}",
+                "balance": self.amount(50000),
+                "created_at": self.random_moment(joined),
+                "client_id": client_id,
+            })
+            for _ in range(rng.randint(1, 2)):
+                card_id = self.take_id(models.Card)
+                cards.append(card_id)
+                self.rows[models.Card].append({
+                    "id": card_id,
+                    "card_number": f"2200{card_id:012d}",
+                    "card_type": rng.choice(["DEBIT", "DEBIT", "CREDIT"]),
+                    "expiration_date": self.now + timedelta(days=rng.randint(30, 365 * 4)),
+                    "cvv": encrypt_cvv(f"{rng.randint(0, 999):03d}"),
+                    "is_active": rng.random() < 0.95,
+                    "client_id": client_id,
+                    "account_id": account_id,
+                })
+
+        loans = []
+        for _ in range(rng.choices([0, 1, 2], weights=[60, 30, 10])[0]):
+            loan_id = self.take_id(models.Loan)
+            loans.append(loan_id)
+            amount = round(rng.randint(50, 3000) * 1000.0, 2)
+            rate = rng.choice([9.9, 12.5, 15.0, 19.9])
+            is_paid = rng.random() < 0.3
+            self.rows[models.Loan].append({
+                "id": loan_id,
+                "amount": amount,
+                "interest_rate": rate,
+                "term_months": rng.choice([6, 12, 24, 36, 60]),
+                "issued_at": self.random_moment(joined),
+                "is_paid": is_paid,
+                "paid_amount": amount * (1 + rate / 100) if is_paid else round(amount * rng.random() * 0.8, 2),
+                "client_id": client_id,
+            })
+
+        for _ in range(rng.randint(0, 3)):
+            self.rows[models.Process].append({
+                "id": self.take_id(models.Process),
+                "process_type": rng.choice(PROCESS_TYPES),
+                "status": rng.choice(PROCESS_STATUSES),
+                "created_at": self.random_moment(joined),
+                "client_id": client_id,
+                "employee_id": None,
+                "branch_id": None,
+            })
+
+        self.add_transactions(client_id, joined, cards, loans)
+
+    def add_transactions(self, client_id: int, joined: datetime, cards: list, loans: list):
+        rng = self.rng
+        types = [t for t in TRANSACTION_MIX if loans or t != "loan_payment"]
+        weights = [TRANSACTION_MIX[t][0] for t in types]
+        count = max(1, int(rng.gauss(self.transactions_per_client, self.transactions_per_client / 4)))
+
+        for transaction_type in rng.choices(types, weights=weights, k=count):
+            card_id = rng.choice(cards)
+            row = {
+                "id": self.take_id(models.Transaction),
+                "transaction_type": transaction_type,
+                "amount": self.amount(TRANSACTION_MIX[transaction_type][1]),
+                "created_at": self.random_moment(joined),
+                "status": "completed" if rng.random() < 0.98 else "failed",
+                "from_card_id": None,
+                "to_card_id": None,
+                "loan_id": None,
+                "client_id": client_id,
+            }
+            if transaction_type == "deposit":
+                row["to_card_id"] = card_id
+                row["description"] = f"Пополнение карты •••• {card_id % 10000:04d}"
+            elif transaction_type == "withdraw":
+                row["from_card_id"] = card_id
+                row["description"] = f"Снятие с карты •••• {card_id % 10000:04d}"
+            elif transaction_type == "transfer":
+                row["from_card_id"] = card_id
+                row["to_card_id"] = rng.choice(cards)
+                row["description"] = f"Перевод на карту •••• {rng.randint(0, 9999):04d}"
+            else:
+                row["from_card_id"] = card_id
+                row["loan_id"] = rng.choice(loans)
+                row["description"] = f"Оплата кредита #{row['loan_id']}"
+            self.rows[models.Transaction].append(row)
+
+
+def generate(clients: int, transactions_per_client: int = 100, history_days: int = 3 * 365,
+             batch_clients: int = 1000, chunk_size: int = 10000, seed: int | None = None):
+    """Заполняет БД синтетическими клиентами; каждая пачка — отдельная транзакция"""
+    rng = random.Random(seed)
+    hashed_password = hash_password(SYNTHETIC_PASSWORD)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    total_transactions = 0
+
+    with engine.connect() as conn:
+        ids = next_ids(conn)
+
+    for batch_start in range(0, clients, batch_clients):
+        batch = SyntheticBatch(rng, ids, hashed_password, transactions_per_client, history_days, now)
+        for _ in range(min(batch_clients, clients - batch_start)):
+            batch.add_client()
+
+        with engine.begin() as conn:
+            for model in TABLES:
+                insert_chunked(conn, model, batch.rows[model], chunk_size)
+            # Core-вставки минуют listener — агрегаты новых клиентов считаем пачкой
+            client_ids = [row["id"] for row in batch.rows[models.Client]]
+            if client_ids:
+                fill(conn, models.Transaction.client_id.between(min(client_ids), max(client_ids)))
+
+        total_transactions += len(batch.rows[models.Transaction])
+        done = batch_start + len(batch.rows[models.Client])
+        elapsed = time.perf_counter() - started
+        print(f"👥 {done}/{clients} клиентов, 💸 {total_transactions} транзакций, "
+              f"{elapsed:.1f} c ({total_transactions / elapsed:.0f} транзакций/с)")
+
+    with engine.begin() as conn:
+        reset_sequences(conn)
+
+    print(f"✅ Готово за {time.perf_counter() - started:.1f} c. "
+          f"Пароль синтетических клиентов: {SYNTHETIC_PASSWORD}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические данные NextBank")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--transactions-per-client", type=int, default=100)
+    parser.add_argument("--history-days", type=int, default=3 * 365)
+    parser.add_argument("--batch-clients", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    generate(
+        clients=args.clients,
+        transactions_per_client=args.transactions_per_client,
+        history_days=args.history_days,
+        batch_clients=args.batch_clients,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
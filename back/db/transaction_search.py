@@ -0,0 +1,152 @@
+"""
+Поиск транзакций: полнотекстовый индекс по описанию и диапазоны сумм
+
+Индекс описания:
+  SQLite   — FTS5-таблица transactions_fts (токенизатор trigram, поиск
+             подстроки без учёта регистра), синхронизируется триггерами;
+  Postgres — GIN-индекс pg_trgm, его использует обычный ILIKE '%...%'.
+
+Запрос разбирается на слова: суммы (`>5000`, `<=100`, `=1500`, `1000..2000`)
+становятся условиями по индексу (client_id, amount), остальное — текстом
+для описания. Например, "кафе >500" — описание содержит «кафе» и сумма больше 500.
+Число без оператора — точная сумма или цифры в описании (последние цифры карты).
+"""
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import bindparam, literal_column, or_, select, text
+from sqlalchemy.engine import Connection
+
+FTS_TABLE = "transactions_fts"
+# Короче трёх символов триграммного индекса нет — такой текст ищется LIKE
+MIN_INDEXED_LENGTH = 3
+# Точная сумма — с точностью до копейки: amount хранится как float
+AMOUNT_TOLERANCE = 0.005
+
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_RANGE = re.compile(rf"^({_NUMBER})\.\.({_NUMBER})$")
+_COMPARISON = re.compile(rf"^(>=|<=|>|<|=)?({_NUMBER})$")
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "description, content='transactions', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON transactions BEGIN"
+    f" INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON transactions BEGIN"
+    f" INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description ON transactions BEGIN"
+    f" INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);"
+    f" INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    # Заполнить по уже существующим транзакциям
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_transaction_description_trgm "
+    "ON transactions USING gin (description gin_trgm_ops)",
+]
+
+
+def create_search_index(conn: Connection):
+    """Создать индекс описаний для текущей БД (при create_all и в миграции)"""
+    if conn.dialect.name == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            conn.exec_driver_sql(statement)
+    elif conn.dialect.name == "postgresql":
+        # Без прав на расширение поиск работает, но без индекса
+        try:
+            with conn.begin_nested():
+                for statement in POSTGRES_TRGM_DDL:
+                    conn.exec_driver_sql(statement)
+        except Exception as e:
+            print(f"⚠️ Индекс pg_trgm не создан, поиск по описанию без индекса: {e}")
+
+
+# ========================================
+# Разбор запроса
+# ========================================
+@dataclass
+class SearchQuery:
+    text: str = ""
+    amount_min: float | None = None
+    amount_max: float | None = None
+    min_inclusive: bool = True
+    max_inclusive: bool = True
+    # Число без оператора: точная сумма или цифры в описании («•••• 1830»)
+    number: str | None = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.text and self.number is None and self.amount_min is None and self.amount_max is None
+
+
+def _number(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def parse_query(query: str) -> SearchQuery:
+    """"кафе 1000..2000" → текст «кафе», 1000 ≤ сумма ≤ 2000"""
+    parsed = SearchQuery()
+    words = []
+    for word in query.split():
+        match = _RANGE.match(word)
+        if match:
+            low, high = sorted((_number(match[1]), _number(match[2])))
+            parsed.amount_min, parsed.amount_max = low, high
+            continue
+        match = _COMPARISON.match(word)
+        if match:
+            operator, value = match[1], _number(match[2])
+            if operator in (">", ">="):
+                parsed.amount_min, parsed.min_inclusive = value, operator == ">="
+                continue
+            if operator in ("<", "<="):
+                parsed.amount_max, parsed.max_inclusive = value, operator == "<="
+                continue
+            if operator == "=":
+                parsed.amount_min, parsed.amount_max = value - AMOUNT_TOLERANCE, value + AMOUNT_TOLERANCE
+                continue
+            if parsed.number is None:
+                parsed.number = word
+                continue
+        words.append(word)
+    parsed.text = " ".join(words)
+    return parsed
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _text_condition(dialect_name: str, model, value: str):
+    # FTS5 ведётся только для горячей таблицы; архив (db/archive.py) — через LIKE
+    fts = model.__tablename__ == "transactions"
+    if dialect_name == "sqlite" and fts and len(value) >= MIN_INDEXED_LENGTH:
+        # Фраза в кавычках: для trigram — поиск подстроки
+        phrase = '"' + value.replace('"', '""') + '"'
+        matches = (
+            select(literal_column("rowid"))
+            .select_from(text(FTS_TABLE))
+            .where(text(f"{FTS_TABLE} MATCH :phrase").bindparams(bindparam("phrase", phrase, unique=True)))
+        )
+        return model.id.in_(matches)
+    return model.description.ilike(f"%{_escape_like(value)}%", escape="\\")
+
+
+def search_conditions(dialect_name: str, model, parsed: SearchQuery) -> list:
+    """Условия WHERE для разобранного запроса (model — таблица транзакций)"""
+    conditions = []
+    if parsed.amount_min is not None:
+        conditions.append(model.amount >= parsed.amount_min if parsed.min_inclusive
+                          else model.amount > parsed.amount_min)
+    if parsed.amount_max is not None:
+        conditions.append(model.amount <= parsed.amount_max if parsed.max_inclusive
+                          else model.amount < parsed.amount_max)
+    if parsed.number is not None:
+        value = _number(parsed.number)
+        conditions.append(or_(model.amount.between(value - AMOUNT_TOLERANCE, value + AMOUNT_TOLERANCE),
+                              _text_condition(dialect_name, model, parsed.number)))
+    if parsed.text:
+        conditions.append(_text_condition(dialect_name, model, parsed.text))
+    return conditions
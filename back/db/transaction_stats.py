@@ -0,0 +1,192 @@
+"""
+Агрегаты транзакций клиента: client_transaction_stats (клиент, тип, месяц)
+
+Каждая вставка завершённой транзакции в той же БД-транзакции прибавляет
+1 и сумму к строке своего месяца (listener after_insert в db/models.py).
+Статистика клиента читается из агрегатов — O(месяцев), а не O(истории);
+по сырым транзакциям считаются только неполные месяцы на краях периода.
+
+Пересборка (заполнить впервые или починить расхождения), пачками клиентов:
+    python -m db.transaction_stats --rebuild [--chunk 500]
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from db import models
+from db.archive import needs_archive
+from db.periods import month_label, utc_start
+
+COMPLETED = "completed"
+
+
+def _upsert(dialect_name: str, rows_select):
+    """INSERT ... SELECT с прибавлением к существующей строке (клиент, тип, месяц)"""
+    table = models.ClientTransactionStats.__table__
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert(table).from_select(
+        ["client_id", "transaction_type", "month", "count", "amount"], rows_select)
+    return stmt.on_conflict_do_update(
+        index_elements=["client_id", "transaction_type", "month"],
+        set_={
+            "count": table.c.count + stmt.excluded.count,
+            "amount": table.c.amount + stmt.excluded.amount,
+        },
+    )
+
+
+def _aggregate(dialect_name: str, *conditions, transaction=models.Transaction):
+    month = month_label(transaction.created_at, dialect_name)
+    return (
+        select(transaction.client_id, transaction.transaction_type, month,
+               func.count(), func.sum(transaction.amount))
+        .where(transaction.status == COMPLETED, *conditions)
+        .group_by(transaction.client_id, transaction.transaction_type, month)
+    )
+
+
+def fill(conn: Connection, *conditions, transaction=models.Transaction) -> int:
+    """Добавить к агрегатам транзакции, подходящие под conditions; возвращает число строк"""
+    dialect_name = conn.dialect.name
+    return conn.execute(_upsert(
+        dialect_name, _aggregate(dialect_name, *conditions, transaction=transaction))).rowcount
+
+
+def record_transaction(conn: Connection, transaction_id: int):
+    """Учесть только что вставленную транзакцию (в транзакции вставки)"""
+    fill(conn, models.Transaction.id == transaction_id)
+
+
+# ========================================
+# Чтение
+# ========================================
+def split_period(date_from: date | None, date_to: date | None):
+    """
+    Период → (первый полный месяц, последний полный месяц, края, без агрегатов)
+
+    Полные месяцы берутся из агрегатов, края — [начало, конец) по дням,
+    которые нужно досчитать по самим транзакциям. None у месяца — без границы;
+    без агрегатов — в периоде нет ни одного полного месяца.
+    """
+    def month_start(day: date) -> date:
+        return day.replace(day=1)
+
+    def next_month(day: date) -> date:
+        return (month_start(day) + timedelta(days=32)).replace(day=1)
+
+    first = None
+    if date_from is not None:
+        first = date_from if date_from.day == 1 else next_month(date_from)
+    end = None  # конец последнего полного месяца (не включительно)
+    if date_to is not None:
+        after = date_to + timedelta(days=1)
+        end = after if after.day == 1 else month_start(date_to)
+
+    if first is not None and end is not None and first >= end:
+        # Ни одного полного месяца — весь период по транзакциям
+        return None, None, [(date_from, date_to + timedelta(days=1))], True
+
+    edges = []
+    if date_from is not None and date_from < first:
+        edges.append((date_from, first))
+    if date_to is not None and end <= date_to:
+        edges.append((end, date_to + timedelta(days=1)))
+
+    first_month = first.strftime("%Y-%m") if first is not None else None
+    last_month = (end - timedelta(days=1)).strftime("%Y-%m") if end is not None else None
+    return first_month, last_month, edges, False
+
+
+def stats_queries(dialect_name: str, client_id: int, date_from: date | None, date_to: date | None,
+                  archived_until: datetime | None = None):
+    """
+    Запросы (month, transaction_type, count, amount) для статистики клиента за период
+
+    archived_until — самая новая архивная транзакция клиента: края периода не
+    позже неё досчитываются и по архиву.
+    """
+    first_month, last_month, edges, raw_only = split_period(date_from, date_to)
+    queries = []
+
+    if not raw_only:
+        stats = models.ClientTransactionStats
+        query = (
+            select(stats.month, stats.transaction_type,
+                   stats.count.label("count"), stats.amount.label("amount"))
+            .where(stats.client_id == client_id)
+        )
+        if first_month:
+            query = query.where(stats.month >= first_month)
+        if last_month:
+            query = query.where(stats.month <= last_month)
+        queries.append(query)
+
+    for start, end in edges:
+        sources = [models.Transaction]
+        if needs_archive(archived_until, start):
+            sources.append(models.TransactionArchive)
+        for transaction in sources:
+            month = month_label(transaction.created_at, dialect_name).label("month")
+            queries.append(
+                select(month, transaction.transaction_type,
+                       func.count().label("count"), func.sum(transaction.amount).label("amount"))
+                .where(
+                    transaction.client_id == client_id,
+                    transaction.status == COMPLETED,
+                    transaction.created_at >= utc_start(start),
+                    transaction.created_at < utc_start(end),
+                )
+                .group_by(month, transaction.transaction_type)
+            )
+    return queries
+
+
+# ========================================
+# Пересборка
+# ========================================
+def rebuild(conn_factory, chunk: int = 500) -> int:
+    """
+    Пересчитать агрегаты пачками по chunk клиентов
+
+    Каждая пачка — своя транзакция: строки клиентов удаляются и считаются
+    заново, так что чинятся и пропуски, и лишние суммы. Повторный запуск безопасен.
+    """
+    stats = models.ClientTransactionStats.__table__
+    with conn_factory() as conn:
+        max_id = conn.execute(select(func.max(models.Client.id))).scalar() or 0
+
+    rows = 0
+    for start in range(1, max_id + 1, chunk):
+        end = start + chunk - 1
+        with conn_factory() as conn, conn.begin():
+            conn.execute(delete(stats).where(stats.c.client_id.between(start, end)))
+            # Горячая таблица и архив (db/archive.py) — суммы складываются
+            for transaction in (models.Transaction, models.TransactionArchive):
+                rows += fill(conn, transaction.client_id.between(start, end), transaction=transaction)
+        print(f"  клиенты {start}–{min(end, max_id)}: готово")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агрегаты транзакций клиентов (client_transaction_stats)")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать агрегаты по транзакциям")
+    parser.add_argument("--chunk", type=int, default=500, help="клиентов в одной транзакции")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    from db.database import engine
+
+    started = time.perf_counter()
+    print("📊 Пересборка client_transaction_stats...")
+    rows = rebuild(engine.connect, args.chunk)
+    print(f"✅ Строк агрегатов: {rows}, за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Нагрузочное тестирование NextBank API
+
+    python -m loadtest run --seed-clients 1000 --concurrency 50 --duration 60
+    python -m loadtest compare results/old.json results/new.json
+"""
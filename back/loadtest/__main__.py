@@ -0,0 +1,203 @@
+"""
+CLI нагрузочного теста: готовит БД, поднимает uvicorn с main:app,
+гоняет смешанную нагрузку и сохраняет отчёт в JSON
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+BACK_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACK_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(seed_clients: int, transactions_per_client: int) -> list[int]:
+    """Миграции, сидинг и добивка синтетических клиентов до seed_clients"""
+    import bootstrap
+    from sqlalchemy import select
+    from db import models
+    from db.database import SessionLocal
+    from db.synthetic_data import EMAIL_DOMAIN, generate
+
+    bootstrap.main()
+
+    def synthetic_ids() -> list[int]:
+        with SessionLocal() as db:
+            return list(db.scalars(
+                select(models.Client.id).where(models.Client.email.like(f"%@{EMAIL_DOMAIN}"))
+            ))
+
+    client_ids = synthetic_ids()
+    if len(client_ids) < seed_clients:
+        generate(clients=seed_clients - len(client_ids), transactions_per_client=transactions_per_client)
+        client_ids = synthetic_ids()
+    return client_ids
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACK_DIR, env=env,
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Сервер не поднялся за {timeout} c")
+
+
+async def admin_login(http: httpx.AsyncClient) -> dict | None:
+    password = os.getenv("SUPERADMIN_PASSWORD")
+    if not password:
+        return None
+    response = await http.post("/admin/auth/login", json={
+        "email": os.getenv("SUPERADMIN_EMAIL", "superadmin@nextbank.ru"),
+        "password": password,
+    })
+    if response.status_code != 200:
+        return None
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def drive(base_url: str, client_ids: list[int], concurrency: int,
+                duration: float, warmup: float, seed: int | None) -> dict:
+    from loadtest.scenarios import VirtualUser
+    from loadtest.stats import LatencyStats
+
+    stats = LatencyStats()
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+        admin_headers = await admin_login(http)
+        users = [
+            VirtualUser(http, stats, rng.choice(client_ids), admin_headers, random.Random(rng.random()))
+            for _ in range(concurrency)
+        ]
+        await asyncio.gather(*(user.setup() for user in users))
+
+        record_from = time.perf_counter() + warmup
+        end = record_from + duration
+        for user in users:
+            user.record_from = record_from
+
+        async def loop(user):
+            while time.perf_counter() < end:
+                await user.run_one()
+
+        await asyncio.gather(*(loop(user) for user in users))
+
+    return stats.report(duration)
+
+
+def run(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{BACK_DIR / 'loadtest.db'}")
+    sys.path.insert(0, str(BACK_DIR))
+
+    from loadtest.stats import print_report
+
+    client_ids = prepare_database(args.seed_clients, args.transactions_per_client)
+    if not client_ids:
+        raise SystemExit("Нет синтетических клиентов — укажите --seed-clients")
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(port, args.workers)
+    try:
+        wait_ready(base_url)
+        result = asyncio.run(drive(
+            base_url, client_ids, args.concurrency, args.duration, args.warmup, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result["meta"] = {
+        "git_commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "base_url": base_url,
+        "database": os.environ["DATABASE_URL"].split("@")[-1],
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "workers": args.workers,
+        "clients": len(client_ids),
+    }
+
+    print_report(result)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now():%Y%m%d-%H%M%S}-{result['meta']['git_commit'] or 'nogit'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"💾 Результат: {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Нагрузочный тест NextBank API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Прогнать нагрузку")
+    run_parser.add_argument("--concurrency", type=int, default=20)
+    run_parser.add_argument("--duration", type=float, default=30, help="Секунды замера")
+    run_parser.add_argument("--warmup", type=float, default=5, help="Секунды прогрева без замера")
+    run_parser.add_argument("--seed-clients", type=int, default=200)
+    run_parser.add_argument("--transactions-per-client", type=int, default=100)
+    run_parser.add_argument("--workers", type=int, default=1, help="Воркеры uvicorn")
+    run_parser.add_argument("--database-url", default=None, help="По умолчанию sqlite:///loadtest.db")
+    run_parser.add_argument("--base-url", default=None, help="Не поднимать сервер, бить в готовый")
+    run_parser.add_argument("--seed", type=int, default=None)
+    run_parser.add_argument("--output", default=None)
+
+    compare_parser = sub.add_parser("compare", help="Сравнить два отчёта")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        from loadtest.stats import compare
+        compare(args.baseline, args.candidate)
+
+
+if __name__ == "__main__":
+    main()
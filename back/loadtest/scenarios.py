@@ -0,0 +1,105 @@
+"""
+Сценарии виртуальных пользователей
+
+Каждый пользователь логинится синтетическим клиентом и в цикле выполняет
+случайный сценарий согласно весам SCENARIO_WEIGHTS.
+"""
+import random
+import time
+
+import httpx
+
+from db.synthetic_data import EMAIL_DOMAIN, SYNTHETIC_PASSWORD
+from loadtest.stats import LatencyStats
+
+# Сценарий → вес в общей смеси
+SCENARIO_WEIGHTS = {
+    "login": 2,
+    "cards": 30,
+    "transactions": 30,
+    "transfer": 15,
+    "loan_pay": 5,
+    "admin_stats": 3,
+}
+
+
+class VirtualUser:
+    def __init__(self, http: httpx.AsyncClient, stats: LatencyStats, client_id: int,
+                 admin_headers: dict | None, rng: random.Random):
+        self.http = http
+        self.stats = stats
+        self.email = f"client{client_id}@{EMAIL_DOMAIN}"
+        self.admin_headers = admin_headers
+        self.rng = rng
+        self.headers = {}
+        self.cards = []
+        self.loans = []
+        # Замеры пишутся только после прогрева (выставляет раннер)
+        self.record_from = float("inf")
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        """Запрос с замером; endpoint — шаблон маршрута для отчёта"""
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        if started >= self.record_from:
+            self.stats.record(endpoint, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    async def login(self):
+        response = await self.call(
+            "POST /auth/login", "POST", "/auth/login",
+            json={"email": self.email, "password": SYNTHETIC_PASSWORD})
+        if response is not None:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def setup(self):
+        await self.login()
+        await self.refresh_cards()
+        response = await self.call("GET /loans/me", "GET", "/loans/me", headers=self.headers)
+        if response is not None:
+            self.loans = [loan["id"] for loan in response.json() if not loan["is_paid"]]
+
+    async def refresh_cards(self):
+        response = await self.call("GET /cards/me", "GET", "/cards/me", headers=self.headers)
+        if response is not None:
+            self.cards = [card for card in response.json() if card["is_active"]]
+
+    async def transactions(self):
+        await self.call("GET /transactions/me", "GET", "/transactions/me",
+                        params={"limit": 50}, headers=self.headers)
+
+    async def transfer(self):
+        if not self.cards:
+            return await self.refresh_cards()
+        from_card = self.rng.choice(self.cards)
+        to_card = self.rng.choice(self.cards)
+        await self.call("POST /cards/transfer", "POST", "/cards/transfer", headers=self.headers, params={
+            "from_card_id": from_card["id"],
+            "to_card_number": to_card["card_number"],
+            "amount": 1.0,
+        })
+
+    async def loan_pay(self):
+        if not self.loans or not self.cards:
+            return await self.refresh_cards()
+        loan_id = self.rng.choice(self.loans)
+        await self.call("POST /loans/{loan_id}/pay", "POST", f"/loans/{loan_id}/pay", headers=self.headers,
+                        json={"card_id": self.rng.choice(self.cards)["id"], "payment_amount": 1.0})
+
+    async def admin_stats(self):
+        if self.admin_headers is None:
+            return await self.refresh_cards()
+        await self.call("GET /admin/clients/stats/overview", "GET", "/admin/clients/stats/overview",
+                        headers=self.admin_headers)
+
+    async def run_one(self):
+        scenario = self.rng.choices(
+            list(SCENARIO_WEIGHTS), weights=list(SCENARIO_WEIGHTS.values()))[0]
+        if scenario == "cards":
+            await self.refresh_cards()
+        else:
+            await getattr(self, scenario)()
@@ -0,0 +1,89 @@
+"""
+Сбор задержек по эндпоинтам и отчёт p50/p95/p99
+"""
+import json
+import math
+from collections import defaultdict
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Перцентиль методом nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyStats:
+    """Задержки (в секундах) и ошибки по каждому эндпоинту"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    @staticmethod
+    def _summary(values: list[float], errors: int, duration: float) -> dict:
+        values = sorted(values)
+        count = len(values)
+        return {
+            "count": count,
+            "errors": errors,
+            "rps": round(count / duration, 2) if duration else 0.0,
+            "mean_ms": round(sum(values) / count * 1000, 2) if count else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if count else 0.0,
+        }
+
+    def report(self, duration: float) -> dict:
+        endpoints = {
+            endpoint: self._summary(values, self.errors[endpoint], duration)
+            for endpoint, values in sorted(self.latencies.items())
+        }
+        all_values = [v for values in self.latencies.values() for v in values]
+        return {
+            "endpoints": endpoints,
+            "total": self._summary(all_values, sum(self.errors.values()), duration),
+        }
+
+
+def print_report(result: dict):
+    header = f"{'endpoint':<36} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for endpoint, s in rows:
+        print(f"{endpoint:<36} {s['count']:>7} {s['errors']:>5} {s['rps']:>8} "
+              f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}")
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Сравнение двух прогонов: изменение rps и p95/p99 в процентах"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def delta(old: float, new: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"baseline:  {baseline['meta'].get('git_commit')}  ({baseline_path})")
+    print(f"candidate: {candidate['meta'].get('git_commit')}  ({candidate_path})")
+    print(f"{'endpoint':<36} {'rps':>10} {'p95':>10} {'p99':>10}")
+    endpoints = dict(candidate["endpoints"], TOTAL=candidate["total"])
+    old_endpoints = dict(baseline["endpoints"], TOTAL=baseline["total"])
+    for endpoint, new in endpoints.items():
+        old = old_endpoints.get(endpoint)
+        if old is None:
+            print(f"{endpoint:<36} {'new':>10}")
+            continue
+        print(f"{endpoint:<36} {delta(old['rps'], new['rps']):>10} "
+              f"{delta(old['p95_ms'], new['p95_ms']):>10} {delta(old['p99_ms'], new['p99_ms']):>10}")
@@ -1,10 +1,18 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from anyio import to_thread
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # 🔒 Rate Limiting 
-from rate_limit import limiter, rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
+from rate_limit import (
+    RATE_LIMIT,
+    RateLimitMiddleware,
+    expose_metrics as expose_rate_limit_metrics,
+    limiter,
+    warn_unknown_roles,
+)
 
 # Роутеры для клиентов
 from routers import auth as auth_router
@@ -23,30 +31,58 @@ from routers import branches as branches_router
 from routers import employees as employees_router
 from routers import admin_processes as admin_processes_router
 from routers import admin_clients as admin_clients_router
+from routers import admin_profiles as admin_profiles_router
+
+from db.archive import archiver, expose_metrics as expose_archive_metrics
+from db.database import engine, async_engine, replica_engine, replica_router
+from db.migrations import SCHEMA_VERSION, get_schema_version
+from db.pool import THREADPOOL_SIZE, pool_status
+from utils.metrics import MetricsMiddleware, registry as metrics_registry
+from utils.analytics_cache import expose_metrics as expose_analytics_cache_metrics
+from utils.login_throttle import expose_metrics as expose_login_throttle_metrics
+from utils.principal_cache import expose_metrics as expose_principal_cache_metrics
+from utils.profiling import ProfilingMiddleware
+from utils.revocation import expose_metrics as expose_revocation_metrics, revocations
+from utils.sql_debug import DB_DEBUG, QueryDebugMiddleware
+
+
+def check_schema_version():
+    """Схему создаёт и мигрирует `python -m bootstrap`, воркер только сверяет версию"""
+    with engine.connect() as conn:
+        version = get_schema_version(conn)
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Версия схемы БД {version}, ожидается {SCHEMA_VERSION}. "
+            "Выполните: python -m bootstrap"
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync-эндпоинты выполняются в threadpool anyio — подгоняем его под пул БД
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await to_thread.run_sync(check_schema_version)
+    # Список отозванных токенов: загрузка и фоновая синхронизация с БД
+    await revocations.start()
+    await warn_unknown_roles(app)
+    # Перенос закрытых месяцев в архив (только при ARCHIVE_INTERVAL > 0)
+    await archiver.start()
+    yield
+    await archiver.stop()
+    await revocations.stop()
+    await limiter.storage.close()
+    await async_engine.dispose()
 
-from db.database import engine, Base, SessionLocal
-from db.init_data import initialize_database
 
 app = FastAPI(
     title="NextBank API",
     description="API для банковского приложения NextBank с административной панелью",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
-# Создание таблиц
-Base.metadata.create_all(bind=engine)
-
-# Инициализация начальных данных
-db = SessionLocal()
-try:
-    initialize_database(db)
-finally:
-    db.close()
-
-# 🔒 Rate Limiter 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+# 🔒 Rate Limiter (token bucket в общем хранилище)
+app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,9 +93,27 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=['*'],
-    allow_headers=['*']
+    allow_headers=['*'],
+    # Курсор следующей страницы и имя файла выгрузки должны быть видны фронтенду
+    expose_headers=['X-Next-Cursor', 'Content-Disposition']
 )
 
+# 🐞 Заголовки X-DB-* и поиск N+1 (только при DB_DEBUG=true)
+if DB_DEBUG:
+    app.add_middleware(QueryDebugMiddleware)
+
+# 🔬 Профилирование запроса по X-Profile: 1 (только SuperAdmin)
+app.add_middleware(ProfilingMiddleware)
+
+# 📈 Метрики (внешний слой — учитывает и время rate limiter)
+app.add_middleware(MetricsMiddleware)
+metrics_registry.collectors.append(expose_principal_cache_metrics)
+metrics_registry.collectors.append(expose_revocation_metrics)
+metrics_registry.collectors.append(expose_login_throttle_metrics)
+metrics_registry.collectors.append(expose_rate_limit_metrics)
+metrics_registry.collectors.append(expose_archive_metrics)
+metrics_registry.collectors.append(expose_analytics_cache_metrics)
+
 # === КЛИЕНТСКИЕ РОУТЕРЫ ===
 app.include_router(auth_router.router)
 app.include_router(pers_inf_router.router)
@@ -77,6 +131,7 @@ app.include_router(branches_router.router)
 app.include_router(employees_router.router)
 app.include_router(admin_processes_router.router)
 app.include_router(admin_clients_router.router)
+app.include_router(admin_profiles_router.router)
 
 
 @app.get("/", tags=["Главная"])
@@ -86,11 +141,37 @@ def root():
         "version": "2.0.0",
         "docs": "/docs",
         "client_endpoints": "/auth, /accounts, /cards, /loans, /processes, /transactions, /profile",
-        "admin_endpoints": "/admin/auth, /roles, /branches, /employees, /admin/processes, /admin/clients",
-        "rate_limiting": "Enabled (100 req/min global)"
+        "admin_endpoints": "/admin/auth, /roles, /branches, /employees, /admin/processes, /admin/clients, /admin/profiles",
+        "rate_limiting": f"Token bucket {RATE_LIMIT} per client, role quotas for employees"
     }
 
 @app.get("/health", tags=["Health"])
 @app.head("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/health/pool", tags=["Health"])
+async def health_pool():
+    """Насыщение пулов соединений и threadpool"""
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        "sync": pool_status(engine),
+        "async": pool_status(async_engine.sync_engine),
+        "replica": {
+            **replica_router.status(),
+            **(pool_status(replica_engine) if replica_engine else {}),
+        },
+        "threadpool": {
+            "total": limiter.total_tokens,
+            "borrowed": limiter.borrowed_tokens,
+        }
+    }
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+@limiter.exempt
+async def metrics(request: Request):
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(
+        metrics_registry.expose(), media_type="text/plain; version=0.0.4")
@@ -1,28 +1,321 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from fastapi import Request
-from fastapi.responses import JSONResponse
-
-# ========================================
-# Настройка Rate Limiter
-# ========================================
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["60/minute"]
-)
-
-
-# ========================================
-# Обработчик ошибок Rate Limit
-# ========================================
-async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
-    """Кастомный обработчик для превышения лимита"""
-    return JSONResponse(
+"""
+Rate limiting: token bucket с весами маршрутов и квотами по ролям
+
+Корзина заводится на субъекта запроса: клиента или сотрудника из bearer-токена
+(подпись проверяется, БД не нужна), а для анонимных запросов — на IP.
+Ёмкость — квота в формате "60/minute": 60 токенов, пополнение 1 токен в секунду.
+
+Квоты:
+  RATE_LIMIT        — клиенты, анонимные запросы и роли без своей квоты;
+  RATE_LIMIT_ROLES  — квоты ролей сотрудников (имена из таблицы roles),
+                      например "Manager=300/minute,Support=300/minute".
+
+Обычный запрос стоит 1 токен, тяжёлые маршруты дороже. Маршрут может иметь
+и собственную квоту (отдельная корзина поверх общей, проверяется первой):
+
+    @router.get("/search")
+    @limiter.limit("30/minute", roles={"Manager": "300/minute"})
+    @limiter.cost(2)
+    def search(...): ...
+
+`@limiter.exempt` снимает ограничение с маршрута. Ответы получают заголовки
+X-RateLimit-Limit/Remaining/Reset по самой исчерпанной корзине, 429 — ещё и
+Retry-After. Счётчики лежат в общем хранилище (utils.rate_limit_storage),
+поэтому лимит один на все воркеры.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+from jose import jwt
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from utils.rate_limit_storage import BucketResult, create_storage
+
+load_dotenv()
+
+RATE_LIMIT = os.getenv("RATE_LIMIT", "60/minute")
+RATE_LIMIT_ROLES = os.getenv("RATE_LIMIT_ROLES", "SuperAdmin=300/minute,Manager=300/minute,Support=300/minute")
+# RATE_LIMIT_ENABLED=false — только для нагрузочных тестов
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = "HS256"
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+DEFAULT_COST = 1.0
+# Сколько проверенных токенов помнить (подпись не проверяется на каждый запрос)
+PRINCIPAL_CACHE_SIZE = 10000
+# Сколько путей помнить с найденным маршрутом (пути с id — каждый свой)
+ROUTE_CACHE_SIZE = 10000
+
+
+@dataclass(frozen=True)
+class Quota:
+    limit: str
+    capacity: float
+    rate: float  # токенов в секунду
+
+    @classmethod
+    def parse(cls, limit: str) -> "Quota":
+        """"60/minute" → ёмкость 60, пополнение 1 токен/с"""
+        count, _, period = limit.partition("/")
+        seconds = PERIODS.get(period.strip().rstrip("s"))
+        if seconds is None or not count.strip().isdigit():
+            raise ValueError(f"Неверный формат лимита: {limit!r} (ожидается, например, 60/minute)")
+        capacity = float(count)
+        return cls(limit, capacity, capacity / seconds)
+
+
+def parse_role_quotas(value: str) -> dict[str, Quota]:
+    """"Manager=300/minute,Support=300/minute" → {роль: квота}"""
+    quotas = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        role, _, limit = item.partition("=")
+        quotas[role.strip()] = Quota.parse(limit.strip())
+    return quotas
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """Собственная квота маршрута с переопределениями для ролей"""
+    default: Quota
+    roles: dict[str, Quota] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Principal:
+    key: str                 # "client:1", "employee:2" или "ip:10.0.0.1"
+    role: str | None = None  # роль сотрудника из access-токена
+    expires_at: float = math.inf
+
+
+class Limiter:
+    def __init__(self, storage, limit: str, role_limits: str = "", enabled: bool = True):
+        self.storage = storage
+        self.default = Quota.parse(limit)
+        self.roles = parse_role_quotas(role_limits)
+        self.enabled = enabled
+        self.rejected = 0
+        self.storage_errors = 0
+        self._principals: dict[str, Principal] = {}
+        self._routes: OrderedDict[tuple[str, str], tuple] = OrderedDict()
+
+    # ---------- настройка маршрутов ----------
+    def cost(self, cost: float):
+        """Вес маршрута в токенах"""
+        def decorator(func):
+            func._rate_limit_cost = float(cost)
+            return func
+        return decorator
+
+    def limit(self, limit: str, roles: dict[str, str] | None = None):
+        """Собственная квота маршрута (списывается вместе с общей)"""
+        route_limit = RouteLimit(
+            Quota.parse(limit), {role: Quota.parse(value) for role, value in (roles or {}).items()})
+
+        def decorator(func):
+            func._rate_limit_route = route_limit
+            return func
+        return decorator
+
+    def exempt(self, func):
+        func._rate_limit_cost = 0.0
+        return func
+
+    def resolve(self, scope):
+        """(endpoint, шаблон пути) маршрута, который обработает запрос — как роутер Starlette"""
+        key = (scope["method"], scope["path"])
+        resolved = self._routes.get(key)
+        if resolved is not None:
+            self._routes.move_to_end(key)
+            return resolved
+
+        resolved = None, None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                resolved = getattr(route, "endpoint", None), route.path
+                break
+        self._routes[key] = resolved
+        if len(self._routes) > ROUTE_CACHE_SIZE:
+            self._routes.popitem(last=False)
+        return resolved
+
+    # ---------- субъект запроса ----------
+    def principal(self, scope, now: float) -> Principal:
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer":
+                    token = None
+                break
+
+        if token:
+            principal = self._principals.get(token)
+            if principal is None:
+                principal = self._decode(token)
+                if principal is not None:
+                    if len(self._principals) >= PRINCIPAL_CACHE_SIZE:
+                        # Самый старый токен уходит первым (dict хранит порядок вставки)
+                        del self._principals[next(iter(self._principals))]
+                    self._principals[token] = principal
+            if principal is not None and principal.expires_at > now:
+                return principal
+
+        client = scope.get("client")
+        return Principal(f"ip:{client[0] if client else 'unknown'}")
+
+    @staticmethod
+    def _decode(token: str) -> Principal | None:
+        """Субъект access-токена; подпись проверяется — чужую корзину подделкой sub не исчерпать"""
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except Exception:
+            return None
+        subject = payload.get("sub")
+        token_type = payload.get("type")
+        if subject is None:
+            return None
+        if token_type is None:
+            return Principal(f"client:{subject}", None, float(payload["exp"]))
+        if token_type == "employee":
+            return Principal(f"employee:{subject}", payload.get("role"), float(payload["exp"]))
+        # refresh-токен не даёт доступа к API — считаем запрос анонимным
+        return None
+
+    def quota(self, principal: Principal, route_limit: RouteLimit | None = None) -> Quota:
+        if route_limit is not None:
+            return route_limit.roles.get(principal.role, route_limit.default)
+        return self.roles.get(principal.role, self.default)
+
+    # ---------- проверка ----------
+    async def hit(self, key: str, quota: Quota, cost: float) -> BucketResult | None:
+        """Списать cost токенов; None — хранилище недоступно, запрос пропускается"""
+        # Вес больше ёмкости не должен навсегда закрывать маршрут
+        cost = min(cost, quota.capacity)
+        try:
+            result = await self.storage.consume(key, quota.capacity, quota.rate, cost)
+        except Exception as e:
+            self.storage_errors += 1
+            print(f"⚠️ Rate limiter: хранилище недоступно, запрос пропущен: {e}")
+            return None
+        if not result.allowed:
+            self.rejected += 1
+        return result
+
+
+limiter = Limiter(create_storage(), RATE_LIMIT, RATE_LIMIT_ROLES, enabled=RATE_LIMIT_ENABLED)
+
+
+async def warn_unknown_roles(app):
+    """Квоты для ролей, которых нет в таблице roles, никогда не сработают"""
+    from sqlalchemy import select
+
+    from db import models
+    from db.database import async_engine
+
+    configured = set(limiter.roles)
+    for route in app.router.routes:
+        route_limit = getattr(getattr(route, "endpoint", None), "_rate_limit_route", None)
+        if route_limit is not None:
+            configured |= set(route_limit.roles)
+    if not configured:
+        return
+    async with async_engine.connect() as conn:
+        existing = set((await conn.execute(select(models.Role.name))).scalars())
+    for role in sorted(configured - existing):
+        print(f"⚠️ Rate limiter: квота задана для неизвестной роли {role!r}")
+
+
+def rate_limit_headers(quota: Quota, result: BucketResult) -> list[tuple[bytes, bytes]]:
+    remaining = max(0, math.floor(result.remaining))
+    # Через сколько секунд корзина снова полна
+    reset = math.ceil((quota.capacity - result.remaining) / quota.rate)
+    return [
+        (b"x-ratelimit-limit", str(int(quota.capacity)).encode()),
+        (b"x-ratelimit-remaining", str(remaining).encode()),
+        (b"x-ratelimit-reset", str(reset).encode()),
+    ]
+
+
+def rate_limit_exceeded_response(quota: Quota, result: BucketResult) -> JSONResponse:
+    retry_after = math.ceil(result.retry_after)
+    response = JSONResponse(
         status_code=429,
         content={
             "detail": "Слишком много запросов. Пожалуйста, подождите и попробуйте снова.",
-            "retry_after": exc.detail,
+            "retry_after": retry_after,
             "type": "rate_limit_exceeded"
-        }
+        },
+        headers={"Retry-After": str(retry_after)}
     )
+    response.raw_headers.extend(rate_limit_headers(quota, result))
+    return response
+
+
+class RateLimitMiddleware:
+    """Списывает вес маршрута из корзин субъекта, при нехватке отвечает 429"""
+
+    def __init__(self, app, limiter: Limiter = limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            return await self.app(scope, receive, send)
+
+        endpoint, path = self.limiter.resolve(scope)
+        cost = getattr(endpoint, "_rate_limit_cost", DEFAULT_COST)
+        if cost <= 0:
+            return await self.app(scope, receive, send)
+
+        principal = self.limiter.principal(scope, time.time())
+        # Сначала корзина маршрута: отказ по квоте маршрута не должен
+        # расходовать общую квоту субъекта на остальные эндпоинты
+        buckets = []
+        route_limit = getattr(endpoint, "_rate_limit_route", None)
+        if route_limit is not None:
+            buckets.append((f"{principal.key}:{scope['method']} {path}",
+                            self.limiter.quota(principal, route_limit)))
+        buckets.append((principal.key, self.limiter.quota(principal)))
+
+        tightest = None
+        for key, quota in buckets:
+            result = await self.limiter.hit(key, quota, cost)
+            if result is None:
+                continue
+            if not result.allowed:
+                response = rate_limit_exceeded_response(quota, result)
+                return await response(scope, receive, send)
+            if tightest is None or result.remaining / quota.capacity < tightest[1].remaining / tightest[0].capacity:
+                tightest = (quota, result)
+
+        if tightest is None:
+            return await self.app(scope, receive, send)
+
+        headers = rate_limit_headers(*tightest)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def expose_metrics(lines: list):
+    """Счётчики rate limiter для /metrics"""
+    lines += [
+        "# HELP rate_limit_rejected_total Запросов, отклонённых rate limiter",
+        "# TYPE rate_limit_rejected_total counter",
+        f"rate_limit_rejected_total {limiter.rejected}",
+        "# HELP rate_limit_storage_errors_total Ошибок хранилища rate limiter (запрос пропущен)",
+        "# TYPE rate_limit_storage_errors_total counter",
+        f"rate_limit_storage_errors_total {limiter.storage_errors}",
+    ]
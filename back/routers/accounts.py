@@ -1,9 +1,11 @@
 # routers/accounts.py
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas.account import AccountResponse
-from routers.auth import get_current_user  # твой авторизационный dependency
+from routers.auth import get_current_user, get_current_user_async  # твой авторизационный dependency
 
 router = APIRouter(
     prefix="/accounts",
@@ -33,14 +35,16 @@ def create_account(
 # 📜 Получить все счета текущего пользователя
 # ==============================
 @router.get("/me", response_model=list[AccountResponse], summary="Получить все счета текущего пользователя")
-def get_my_accounts(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(get_current_user)
+async def get_my_accounts(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(get_current_user_async)
 ):
-    accounts = db.query(models.Account).filter(
-        models.Account.client_id == current_user.id
-    ).all()
-    return accounts
+    result = await db.execute(
+        select(models.Account).where(
+            models.Account.client_id == current_user.id
+        )
+    )
+    return result.scalars().all()
 
 
 # ==============================
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from db.database import get_read_db
 from db import models
-from routers.employee_auth import get_current_employee, check_permission
+from routers.employee_auth import EmployeeClaims, get_current_employee, check_permission
+from rate_limit import limiter
+from utils.pagination import MAX_PAGE_SIZE
 
 router = APIRouter(
     prefix="/admin/clients",
@@ -14,8 +17,8 @@ router = APIRouter(
 def get_all_clients(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить список всех клиентов с пагинацией"""
     # 🆕 Доступ для SuperAdmin, Manager и Support
@@ -33,10 +36,12 @@ def get_all_clients(
 
 
 @router.get("/search", summary="Поиск клиентов")
+# Поиск по ILIKE тяжёлый; Manager и Support работают через него постоянно
+@limiter.limit("30/minute", roles={"Manager": "120/minute", "Support": "120/minute"})
 def search_clients(
     query: str,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Поиск клиентов по имени, email или телефону"""
     check_permission(current_employee, ["SuperAdmin", "Manager", "Support"])
@@ -59,19 +64,21 @@ def search_clients(
 @router.get("/{client_id}", summary="Получить клиента по ID")
 def get_client_by_id(
     client_id: int,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить детальную информацию о клиенте"""
     check_permission(current_employee, ["SuperAdmin", "Manager", "Support"])
 
+    # Коллекции грузим selectin-ом: три joinedload перемножали строки
+    # (счета × карты × кредиты)
     client = (
         db.query(models.Client)
         .options(
             joinedload(models.Client.personal_info),
-            joinedload(models.Client.accounts),
-            joinedload(models.Client.cards),
-            joinedload(models.Client.loans)
+            selectinload(models.Client.accounts),
+            selectinload(models.Client.cards),
+            selectinload(models.Client.loans)
         )
         .filter(models.Client.id == client_id)
         .first()
@@ -83,6 +90,11 @@ def get_client_by_id(
     # Подсчёт статистики клиента
     total_balance = sum(account.balance for account in client.accounts)
     total_loans = sum(loan.amount for loan in client.loans if not loan.is_paid)
+    # Из агрегатов: строка на тип и месяц вместо всей истории транзакций
+    stats = models.ClientTransactionStats
+    total_transactions, transactions_amount = db.query(
+        func.coalesce(func.sum(stats.count), 0), func.coalesce(func.sum(stats.amount), 0.0)
+    ).filter(stats.client_id == client_id).one()
 
     return {
         "client": client,
@@ -91,7 +103,9 @@ def get_client_by_id(
             "total_cards": len(client.cards),
             "total_balance": total_balance,
             "active_loans": len([l for l in client.loans if not l.is_paid]),
-            "total_loan_debt": total_loans
+            "total_loan_debt": total_loans,
+            "total_transactions": total_transactions,
+            "transactions_amount": transactions_amount
         }
     }
 
@@ -99,8 +113,8 @@ def get_client_by_id(
 @router.get("/{client_id}/accounts", summary="Получить счета клиента")
 def get_client_accounts(
     client_id: int,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить все счета конкретного клиента"""
     check_permission(current_employee, [
@@ -121,9 +135,9 @@ def get_client_accounts(
 @router.get("/{client_id}/transactions", summary="Получить транзакции клиента")
 def get_client_transactions(
     client_id: int,
-    limit: int = 50,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить последние транзакции клиента"""
     check_permission(current_employee, ["SuperAdmin", "Manager", "Support"])
@@ -133,21 +147,26 @@ def get_client_transactions(
     if not client:
         raise HTTPException(status_code=404, detail="Клиент не найден")
 
-    transactions = (
-        db.query(models.Transaction)
-        .filter(models.Transaction.client_id == client_id)
-        .order_by(models.Transaction.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+    transactions = []
+    # Сначала горячая таблица, архив — только если её не хватило на limit
+    for model in (models.Transaction, models.TransactionArchive):
+        transactions += (
+            db.query(model)
+            .filter(model.client_id == client_id)
+            .order_by(model.created_at.desc(), model.id.desc())
+            .limit(limit - len(transactions))
+            .all()
+        )
+        if len(transactions) >= limit:
+            break
 
     return transactions
 
 
 @router.get("/stats/overview", summary="Статистика по клиентам")
 def get_clients_stats(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить общую статистику по клиентам"""
     check_permission(current_employee, ["SuperAdmin", "Manager"])
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
-from db.database import get_db
+from db.database import get_db, get_read_db
 from db import models
 from schemas.process import ProcessResponse
-from routers.employee_auth import get_current_employee, check_permission
+from routers.employee_auth import EmployeeClaims, get_current_employee, check_permission
 
 router = APIRouter(
     prefix="/admin/processes",
@@ -15,8 +15,8 @@ router = APIRouter(
 def get_all_processes(
     status: str = None,
     process_type: str = None,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить список всех процессов с фильтрацией"""
     # 🆕 Теперь доступ есть у SuperAdmin и Manager
@@ -35,8 +35,8 @@ def get_all_processes(
 
 @router.get("/pending", response_model=list[ProcessResponse], summary="Получить ожидающие процессы")
 def get_pending_processes(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить все процессы ожидающие обработки"""
     check_permission(current_employee, ["SuperAdmin", "Manager", "Support"])
@@ -51,8 +51,8 @@ def get_pending_processes(
 @router.get("/{process_id}", response_model=ProcessResponse, summary="Получить процесс по ID")
 def get_process_by_id(
     process_id: int,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить детали конкретного процесса"""
     check_permission(current_employee, ["SuperAdmin", "Manager", "Support"])
@@ -71,7 +71,7 @@ def get_process_by_id(
 def approve_process(
     process_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Одобрить процесс (изменить статус на approved)"""
     check_permission(current_employee, ["SuperAdmin", "Manager"])
@@ -103,7 +103,7 @@ def approve_process(
 def reject_process(
     process_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Отклонить процесс (изменить статус на rejected)"""
     check_permission(current_employee, ["SuperAdmin", "Manager"])
@@ -135,7 +135,7 @@ def reject_process(
 def complete_process(
     process_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Завершить процесс (изменить статус на completed)"""
     check_permission(current_employee, ["SuperAdmin", "Manager"])
@@ -166,8 +166,8 @@ def complete_process(
 
 @router.get("/stats/overview", summary="Статистика по процессам")
 def get_processes_stats(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить статистику по процессам"""
     check_permission(current_employee, ["SuperAdmin", "Manager"])
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from routers.employee_auth import EmployeeClaims, get_current_employee, check_superadmin
+from utils.profiling import list_profiles, load_profile
+
+router = APIRouter(
+    prefix="/admin/profiles",
+    tags=["Профилирование (Admin)"]
+)
+
+
+@router.get("/", summary="Последние профили запросов")
+def get_profiles(current_employee: EmployeeClaims = Depends(get_current_employee)):
+    """Список сохранённых профилей (только SuperAdmin)"""
+    check_superadmin(current_employee)
+    return list_profiles()
+
+
+@router.get("/{profile_id}", summary="Профиль запроса")
+def get_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|collapsed)$",
+                        description="collapsed — стеки для flamegraph.pl / speedscope"),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
+):
+    """
+    Профиль запроса, выполненного с заголовком `X-Profile: 1` (только SuperAdmin)
+
+    Id профиля приходит в заголовке ответа X-Profile-Id.
+    """
+    check_superadmin(current_employee)
+
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
@@ -1,13 +1,24 @@
 from dotenv import load_dotenv
 import os
-from passlib.context import CryptContext
+import time
+import uuid
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from anyio import to_thread
 from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from schemas.client import ClientCreateSchema, ClientLoginSchema
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from db import models, database
+from rate_limit import limiter
+from utils.principal_cache import client_cache, restore, snapshot
+from utils.passwords import hash_password_async, verify_and_update_async
+from utils.integrity import raise_unique_violation
+from utils.login_throttle import login_throttle
+from utils.revocation import revocations
 
 load_dotenv()
 
@@ -16,44 +27,52 @@ if not SECRET_KEY:
     raise ValueError('SECRET_KEY не найден')
 
 ALGORITHM = 'HS256'
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+ACCESS_TOKEN_MINUTES = 60
 
 security = HTTPBearer()
 
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
-
 router = APIRouter(
     prefix='/auth',
     tags=['Аунтентификация']
 )
 
 
-def verify_password(plain_pass, hashed_pass):
-    return pwd_context.verify(plain_pass, hashed_pass)
-
-
-def create_access_token(data: dict, expires_minutes: int = 60):
+def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_MINUTES):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
-    to_encode.update({'exp': expire})
+    # jti — для отзыва одного токена, iat — для отзыва всех выданных до отметки
+    to_encode.update({'exp': expire, 'iat': time.time(), 'jti': uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def decode_client_token(token: str) -> dict:
+    """Проверяет JWT клиента и возвращает его claims"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except Exception:
+        raise HTTPException(status_code=401, detail='Невалидный токен')
+
+    if payload.get('sub') is None or 'type' in payload:
+        raise HTTPException(status_code=401, detail='Невалидный токен')
+    return payload
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(database.get_db)
 ):
     token = credentials.credentials  # тут токен из Swagger автоматически
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get('sub')
-        if user_id is None:
-            raise HTTPException(status_code=401, detail='Невалидный токен')
-    except Exception:
-        raise HTTPException(status_code=401, detail='Невалидный токен')
+
+    # Подпись токена уже проверялась при попадании в кеш — ни JWT, ни SELECT не нужны
+    snap = client_cache.get(token) if client_cache.enabled else None
+    if snap is not None:
+        revocations.ensure_valid(db, jwt.get_unverified_claims(token), 'client')
+        return db.merge(restore(snap), load=False)
+
+    payload = decode_client_token(token)
+    revocations.ensure_valid(db, payload, 'client')
+    user_id = int(payload['sub'])
 
     user = (
         db.query(models.Client)
@@ -65,6 +84,41 @@ def get_current_user(
     if user is None:
         raise HTTPException(status_code=401, detail='Пользователь не найден')
 
+    if client_cache.enabled:
+        client_cache.put(token, user.id, snapshot(user, 'personal_info'), payload['exp'])
+
+    return user
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """Async-вариант get_current_user для эндпоинтов на AsyncSession"""
+    token = credentials.credentials
+
+    snap = client_cache.get(token) if client_cache.enabled else None
+    if snap is not None:
+        await revocations.ensure_valid_async(jwt.get_unverified_claims(token), 'client')
+        return await db.merge(restore(snap), load=False)
+
+    payload = decode_client_token(token)
+    await revocations.ensure_valid_async(payload, 'client')
+    user_id = int(payload['sub'])
+
+    result = await db.execute(
+        select(models.Client)
+        .options(joinedload(models.Client.personal_info))
+        .where(models.Client.id == user_id)
+    )
+    user = result.scalars().first()
+
+    if user is None:
+        raise HTTPException(status_code=401, detail='Пользователь не найден')
+
+    if client_cache.enabled:
+        client_cache.put(token, user.id, snapshot(user, 'personal_info'), payload['exp'])
+
     return user
 
 
@@ -87,20 +141,51 @@ def read_users_me(current_user: models.Client = Depends(get_current_user)):
     }
 
 
+@router.post('/logout', summary='Выход (отзыв токена)')
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    payload = decode_client_token(credentials.credentials)
+    revocations.revoke_token(db, payload, 'client')
+    await db.commit()
+    return {'message': 'Вы вышли из аккаунта'}
+
+
 @router.post('/login', summary='Логин')
-def login(data: ClientLoginSchema, db: Session = Depends(database.get_db)):
+@limiter.cost(5)
+async def login(data: ClientLoginSchema, db: AsyncSession = Depends(database.get_async_db)):
+    # Заблокированный email отклоняем до запроса к БД и bcrypt
+    throttle_key = login_throttle.key('client', data.email)
+    await to_thread.run_sync(login_throttle.ensure_allowed, throttle_key)
+
+    result = await db.execute(
+        select(models.Client)
+        .options(joinedload(models.Client.personal_info))
+        .where(models.Client.email == data.email)
+    )
+    client = result.scalars().first()
 
-    client = (db.query(models.Client)
-              .options(joinedload(models.Client.personal_info))
-              .filter(models.Client.email == data.email)
-              .first()
-              )
+    if not client:
+        await to_thread.run_sync(login_throttle.record_failure, throttle_key)
+        raise HTTPException(
+            status_code=401, detail='Неверная почта или пароль'
+        )
 
-    if not client or not verify_password(data.password, client.hashed_password):
+    valid, new_hash = await verify_and_update_async(data.password, client.hashed_password)
+    if not valid:
+        await to_thread.run_sync(login_throttle.record_failure, throttle_key)
         raise HTTPException(
             status_code=401, detail='Неверная почта или пароль'
         )
 
+    await to_thread.run_sync(login_throttle.record_success, throttle_key)
+
+    # Хеш со старой стоимостью bcrypt — пересчитываем, пока знаем пароль
+    if new_hash:
+        client.hashed_password = new_hash
+        await db.commit()
+
     token = create_access_token({'sub': str(client.id)})
 
     return {
@@ -123,15 +208,8 @@ def login(data: ClientLoginSchema, db: Session = Depends(database.get_db)):
 
 
 @router.post('/register', summary='Регистрация')
-def create_client(data: ClientCreateSchema, db: Session = Depends(database.get_db)):
-
-    if db.query(models.Client).filter(models.Client.email == data.email).first():
-        raise HTTPException(
-            status_code=400, detail='Email уже зарегистрирован')
-
-    if db.query(models.Client).filter(models.Client.phone == data.phone).first():
-        raise HTTPException(
-            status_code=400, detail='Телефон уже зарегистрирован')
+@limiter.cost(5)
+async def create_client(data: ClientCreateSchema, db: AsyncSession = Depends(database.get_async_db)):
 
     db_client = models.Client(
         first_name=data.first_name,
@@ -139,12 +217,19 @@ def create_client(data: ClientCreateSchema, db: Session = Depends(database.get_d
         patronymic=data.patronymic,
         email=data.email,
         phone=data.phone,
-        hashed_password=hash_password(data.password)
+        hashed_password=await hash_password_async(data.password)
     )
 
     db.add(db_client)
-    db.commit()
-    db.refresh(db_client)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise_unique_violation(e, {
+            'email': 'Email уже зарегистрирован',
+            'phone_normalized': 'Телефон уже зарегистрирован',
+        })
+    await db.refresh(db_client)
 
     token = create_access_token({'sub': str(db_client.id)})
 
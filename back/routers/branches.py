@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from db.database import get_db
+from db.database import get_db, get_read_db
 from db import models
 from schemas.branch import BranchCreate, BranchResponse, BranchUpdate
-from routers.employee_auth import get_current_employee, check_superadmin
+from routers.employee_auth import EmployeeClaims, get_current_employee, check_superadmin
 
 router = APIRouter(
     prefix="/branches",
@@ -13,8 +13,8 @@ router = APIRouter(
 
 @router.get("/", response_model=list[BranchResponse], summary="Получить все отделения")
 def get_all_branches(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить список всех отделений (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -26,8 +26,8 @@ def get_all_branches(
 @router.get("/{branch_id}", response_model=BranchResponse, summary="Получить отделение по ID")
 def get_branch_by_id(
     branch_id: int,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить информацию о конкретном отделении"""
     check_superadmin(current_employee)
@@ -44,7 +44,7 @@ def get_branch_by_id(
 def create_branch(
     branch_data: BranchCreate,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Создать новое отделение (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -77,7 +77,7 @@ def update_branch(
     branch_id: int,
     branch_data: BranchUpdate,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Обновить информацию об отделении (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -115,7 +115,7 @@ def update_branch(
 def delete_branch(
     branch_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Удалить отделение (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -144,8 +144,8 @@ def delete_branch(
 
 @router.get("/stats/overview", summary="Статистика по отделениям")
 def get_branches_stats(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить общую статистику по отделениям (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, timedelta
 import random
 
-from db.database import get_db
+from db.database import get_db, get_async_db
 from schemas import card as card_schemas
 from db import models
-from routers.auth import get_current_user
+from routers.auth import get_current_user, get_current_user_async
+from rate_limit import limiter
 from utils.encryption import encrypt_cvv, decrypt_cvv
 from utils.transactions import safe_create_transaction, safe_transfer
 
@@ -31,6 +34,16 @@ def generate_expiration_date():
     return datetime.utcnow() + timedelta(days=365 * 4)
 
 
+async def get_active_card_async(db: AsyncSession, *conditions):
+    """Активная карта вместе со счётом (в async нет ленивой загрузки)"""
+    result = await db.execute(
+        select(models.Card)
+        .options(selectinload(models.Card.account))
+        .where(models.Card.is_active == True, *conditions)
+    )
+    return result.scalars().first()
+
+
 @router.post("/", response_model=card_schemas.CardResponse, summary="Выпустить новую карту")
 def create_card(
     card_data: card_schemas.CardCreate,
@@ -86,34 +99,37 @@ def create_card(
 
 
 @router.get("/me", response_model=list[card_schemas.CardResponse], summary="Получить все мои карты")
-def get_my_cards(
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+async def get_my_cards(
+    db: AsyncSession = Depends(get_async_db),
+    current_client=Depends(get_current_user_async)
 ):
     """Получение карт БЕЗ CVV (CVV не показываем в списках)"""
-    cards = db.query(models.Card).filter(
-        models.Card.client_id == current_client.id
-    ).all()
-    return cards
+    result = await db.execute(
+        select(models.Card)
+        .options(selectinload(models.Card.account))
+        .where(models.Card.client_id == current_client.id)
+    )
+    return result.scalars().all()
 
 
 @router.post("/{card_id}/deposit", summary="Пополнить карту")
-def deposit_to_card(
+@limiter.cost(3)
+async def deposit_to_card(
     card_id: int,
     amount: float,
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_client=Depends(get_current_user_async)
 ):
     """Пополнение карты с безопасной транзакцией"""
     if amount <= 0:
         raise HTTPException(
             status_code=400, detail="Сумма должна быть положительной")
 
-    card = db.query(models.Card).filter(
+    card = await get_active_card_async(
+        db,
         models.Card.id == card_id,
-        models.Card.client_id == current_client.id,
-        models.Card.is_active == True
-    ).first()
+        models.Card.client_id == current_client.id
+    )
 
     if not card:
         raise HTTPException(
@@ -131,13 +147,13 @@ def deposit_to_card(
             to_card_id=card.id
         )
 
-        db.commit()
+        await db.commit()
         return {
             "message": f"Баланс карты пополнен на {amount} ₽",
             "new_balance": card.account.balance
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при пополнении: {str(e)}"
@@ -145,22 +161,23 @@ def deposit_to_card(
 
 
 @router.post("/{card_id}/withdraw", summary="Снять деньги с карты")
-def withdraw_from_card(
+@limiter.cost(3)
+async def withdraw_from_card(
     card_id: int,
     amount: float,
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_client=Depends(get_current_user_async)
 ):
     """Снятие денег с безопасной транзакцией"""
     if amount <= 0:
         raise HTTPException(
             status_code=400, detail="Сумма должна быть положительной")
 
-    card = db.query(models.Card).filter(
+    card = await get_active_card_async(
+        db,
         models.Card.id == card_id,
-        models.Card.client_id == current_client.id,
-        models.Card.is_active == True
-    ).first()
+        models.Card.client_id == current_client.id
+    )
 
     if not card:
         raise HTTPException(
@@ -181,13 +198,13 @@ def withdraw_from_card(
             from_card_id=card.id
         )
 
-        db.commit()
+        await db.commit()
         return {
             "message": f"С карты списано {amount} ₽",
             "new_balance": card.account.balance
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при снятии: {str(e)}"
@@ -195,32 +212,33 @@ def withdraw_from_card(
 
 
 @router.post("/transfer", summary="Перевести с одной карты на другую")
-def transfer_between_cards(
+@limiter.cost(5)
+async def transfer_between_cards(
     from_card_id: int,
     to_card_number: str,
     amount: float,
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_client=Depends(get_current_user_async)
 ):
     """Перевод между картами с безопасной транзакцией и rollback"""
     if amount <= 0:
         raise HTTPException(
             status_code=400, detail="Сумма должна быть положительной")
 
-    from_card = db.query(models.Card).filter(
+    from_card = await get_active_card_async(
+        db,
         models.Card.id == from_card_id,
-        models.Card.client_id == current_client.id,
-        models.Card.is_active == True
-    ).first()
+        models.Card.client_id == current_client.id
+    )
 
     if not from_card:
         raise HTTPException(
             status_code=404, detail="Карта отправителя не найдена или неактивна")
 
-    to_card = db.query(models.Card).filter(
-        models.Card.card_number == to_card_number,
-        models.Card.is_active == True
-    ).first()
+    to_card = await get_active_card_async(
+        db,
+        models.Card.card_number == to_card_number
+    )
 
     if not to_card:
         raise HTTPException(
@@ -230,7 +248,7 @@ def transfer_between_cards(
         raise HTTPException(status_code=400, detail="Недостаточно средств")
 
     # ✅ Используем безопасную функцию перевода
-    result = safe_transfer(
+    result = await safe_transfer(
         db=db,
         from_card=from_card,
         to_card=to_card,
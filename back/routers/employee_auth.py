@@ -1,13 +1,30 @@
 from dotenv import load_dotenv
 import os
-from passlib.context import CryptContext
+import time
+import uuid
+from dataclasses import dataclass
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from anyio import to_thread
 from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, timedelta, timezone
 from jose import jwt
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.employee import EmployeeCreateSchema, EmployeeLoginSchema
 from sqlalchemy.orm import Session, joinedload
 from db import models, database
+from rate_limit import limiter
+from utils.permission_versions import permission_versions
+from utils.principal_cache import employee_cache, restore, snapshot
+from utils.integrity import raise_unique_violation
+from utils.login_throttle import login_throttle
+from utils.revocation import revocations
+from utils.passwords import (
+    hash_password_async,
+    verify_and_update_async,
+    verify_password_async,
+)
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -18,47 +35,115 @@ if not SECRET_KEY:
     raise ValueError('SECRET_KEY не найден')
 
 ALGORITHM = 'HS256'
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+ACCESS_TOKEN_MINUTES = int(os.getenv('EMPLOYEE_ACCESS_TOKEN_MINUTES', '15'))
+REFRESH_TOKEN_MINUTES = int(os.getenv('EMPLOYEE_REFRESH_TOKEN_MINUTES', '480'))
 
 security = HTTPBearer()
 
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
-
-
 router = APIRouter(
     prefix='/admin/auth',
     tags=['Аутентификация сотрудников']
 )
 
 
-def verify_password(plain_pass, hashed_pass):
-    return pwd_context.verify(plain_pass, hashed_pass)
-
-
-def create_access_token(data: dict, expires_minutes: int = 480):
+def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_MINUTES, token_type: str = 'employee'):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
-    to_encode.update({'exp': expire, 'type': 'employee'})
+    # jti — для отзыва одного токена, iat — для отзыва всех выданных до отметки
+    to_encode.update({'exp': expire, 'type': token_type, 'iat': time.time(), 'jti': uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_employee(
+def issue_tokens(employee: models.Employee) -> dict:
+    """Короткий access-токен с правами в claims и refresh-токен для его обновления"""
+    access_token = create_access_token({
+        'sub': str(employee.id),
+        'role': employee.role.name if employee.role else None,
+        'branch_id': employee.branch_id,
+        'pv': employee.permission_version,
+    })
+    refresh_token = create_access_token(
+        {'sub': str(employee.id)}, REFRESH_TOKEN_MINUTES, token_type='employee_refresh')
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'expires_in': ACCESS_TOKEN_MINUTES * 60,
+    }
+
+
+@dataclass(frozen=True)
+class EmployeeClaims:
+    """Сотрудник, как его описывает access-токен (без обращения к БД)"""
+    id: int
+    role_name: str | None
+    branch_id: int | None
+    permission_version: int
+    expires_at: float
+
+
+def decode_employee_token(token: str, token_type: str = 'employee') -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except Exception:
+        raise HTTPException(status_code=401, detail='Невалидный токен')
+
+    if payload.get('sub') is None or payload.get('type') != token_type:
+        raise HTTPException(status_code=401, detail='Невалидный токен')
+    return payload
+
+
+def employee_claims(payload: dict) -> EmployeeClaims:
+    # Токены старого формата (без pv) не содержат прав — нужен повторный вход
+    if 'pv' not in payload:
+        raise HTTPException(status_code=401, detail='Невалидный токен')
+    return EmployeeClaims(
+        id=int(payload['sub']),
+        role_name=payload.get('role'),
+        branch_id=payload.get('branch_id'),
+        permission_version=payload['pv'],
+        expires_at=payload['exp'],
+    )
+
+
+async def get_current_employee(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> EmployeeClaims:
+    """Текущий сотрудник из claims access-токена: роль и отделение без запроса к БД"""
+    payload = decode_employee_token(credentials.credentials)
+    claims = employee_claims(payload)
+    await revocations.ensure_valid_async(payload, 'employee')
+
+    current = await permission_versions.get(claims.id, claims.permission_version)
+    if current is None:
+        raise HTTPException(status_code=401, detail='Сотрудник не найден')
+
+    version, is_active = current
+    if not is_active:
+        raise HTTPException(
+            status_code=403, detail='Аккаунт сотрудника деактивирован')
+
+    if claims.permission_version < version:
+        raise HTTPException(
+            status_code=401,
+            detail='Права сотрудника изменились, обновите токен',
+            headers={'WWW-Authenticate': 'Bearer error="invalid_token"'}
+        )
+
+    return claims
+
+
+def get_current_employee_record(
     credentials: HTTPAuthorizationCredentials = Depends(security),
+    claims: EmployeeClaims = Depends(get_current_employee),
     db: Session = Depends(database.get_db)
 ):
-    """Получить текущего авторизованного сотрудника"""
+    """Полная запись текущего сотрудника (для эндпоинтов, которым нужен профиль)"""
     token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        employee_id: str = payload.get('sub')
-        token_type: str = payload.get('type')
 
-        if employee_id is None or token_type != 'employee':
-            raise HTTPException(status_code=401, detail='Невалидный токен')
-    except Exception:
-        raise HTTPException(status_code=401, detail='Невалидный токен')
+    snap = employee_cache.get(token) if employee_cache.enabled else None
+    if snap is not None:
+        return db.merge(restore(snap), load=False)
 
     employee = (
         db.query(models.Employee)
@@ -66,23 +151,53 @@ def get_current_employee(
             joinedload(models.Employee.role),
             joinedload(models.Employee.branch)
         )
-        .filter(models.Employee.id == employee_id)
+        .filter(models.Employee.id == claims.id)
         .first()
     )
 
     if employee is None:
         raise HTTPException(status_code=401, detail='Сотрудник не найден')
 
-    if not employee.is_active:
-        raise HTTPException(
-            status_code=403, detail='Аккаунт сотрудника деактивирован')
+    if employee_cache.enabled:
+        employee_cache.put(token, employee.id, snapshot(employee, 'role', 'branch'), claims.expires_at)
 
     return employee
 
 
-def check_permission(employee: models.Employee, allowed_roles: list[str]):
+async def get_current_employee_record_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    claims: EmployeeClaims = Depends(get_current_employee),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """Async-вариант get_current_employee_record: запись грузится в сессию эндпоинта"""
+    token = credentials.credentials
+
+    snap = employee_cache.get(token) if employee_cache.enabled else None
+    if snap is not None:
+        return await db.merge(restore(snap), load=False)
+
+    result = await db.execute(
+        select(models.Employee)
+        .options(
+            joinedload(models.Employee.role),
+            joinedload(models.Employee.branch)
+        )
+        .where(models.Employee.id == claims.id)
+    )
+    employee = result.scalars().first()
+
+    if employee is None:
+        raise HTTPException(status_code=401, detail='Сотрудник не найден')
+
+    if employee_cache.enabled:
+        employee_cache.put(token, employee.id, snapshot(employee, 'role', 'branch'), claims.expires_at)
+
+    return employee
+
+
+def check_permission(employee: EmployeeClaims, allowed_roles: list[str]):
     """Проверка прав доступа"""
-    if employee.role.name not in allowed_roles:
+    if employee.role_name not in allowed_roles:
         raise HTTPException(
             status_code=403,
             detail=f'Недостаточно прав. Требуется роль: {", ".join(allowed_roles)}'
@@ -90,9 +205,9 @@ def check_permission(employee: models.Employee, allowed_roles: list[str]):
 
 
 # 🆕 Проверка, что пользователь - SuperAdmin
-def check_superadmin(employee: models.Employee):
+def check_superadmin(employee: EmployeeClaims):
     """Проверка, что пользователь является SuperAdmin"""
-    if employee.role.name != "SuperAdmin":
+    if employee.role_name != "SuperAdmin":
         raise HTTPException(
             status_code=403,
             detail='Доступ запрещён. Требуются права SuperAdmin.'
@@ -100,7 +215,7 @@ def check_superadmin(employee: models.Employee):
 
 
 @router.get('/me', summary='Автологин сотрудника (токен)')
-def read_employee_me(current_employee: models.Employee = Depends(get_current_employee)):
+def read_employee_me(current_employee: models.Employee = Depends(get_current_employee_record)):
     return {
         'id': current_employee.id,
         'first_name': current_employee.first_name,
@@ -122,30 +237,49 @@ def read_employee_me(current_employee: models.Employee = Depends(get_current_emp
 
 
 @router.post('/login', summary='Логин сотрудника')
-def login(data: EmployeeLoginSchema, db: Session = Depends(database.get_db)):
-    employee = (db.query(models.Employee)
-                .options(
-                    joinedload(models.Employee.role),
-                    joinedload(models.Employee.branch)
-    )
-        .filter(models.Employee.email == data.email)
-        .first()
+@limiter.cost(5)
+async def login(data: EmployeeLoginSchema, db: AsyncSession = Depends(database.get_async_db)):
+    # Заблокированный email отклоняем до запроса к БД и bcrypt
+    throttle_key = login_throttle.key('employee', data.email)
+    await to_thread.run_sync(login_throttle.ensure_allowed, throttle_key)
+
+    result = await db.execute(
+        select(models.Employee)
+        .options(
+            joinedload(models.Employee.role),
+            joinedload(models.Employee.branch)
+        )
+        .where(models.Employee.email == data.email)
     )
+    employee = result.scalars().first()
 
-    if not employee or not verify_password(data.password, employee.hashed_password):
+    if not employee:
+        await to_thread.run_sync(login_throttle.record_failure, throttle_key)
         raise HTTPException(
             status_code=401, detail='Неверная почта или пароль'
         )
 
+    valid, new_hash = await verify_and_update_async(data.password, employee.hashed_password)
+    if not valid:
+        await to_thread.run_sync(login_throttle.record_failure, throttle_key)
+        raise HTTPException(
+            status_code=401, detail='Неверная почта или пароль'
+        )
+
+    await to_thread.run_sync(login_throttle.record_success, throttle_key)
+
     if not employee.is_active:
         raise HTTPException(
             status_code=403, detail='Аккаунт деактивирован. Обратитесь к администратору'
         )
 
-    token = create_access_token({'sub': str(employee.id)})
+    # Хеш со старой стоимостью bcrypt — пересчитываем, пока знаем пароль
+    if new_hash:
+        employee.hashed_password = new_hash
+        await db.commit()
 
     return {
-        'access_token': token,
+        **issue_tokens(employee),
         'employee_id': employee.id,
         'first_name': employee.first_name,
         'last_name': employee.last_name,
@@ -166,11 +300,68 @@ def login(data: EmployeeLoginSchema, db: Session = Depends(database.get_db)):
     }
 
 
+class RefreshTokenSchema(BaseModel):
+    """Схема обновления токенов"""
+    refresh_token: str
+
+
+@router.post('/refresh', summary='Обновить токены сотрудника')
+async def refresh_tokens(data: RefreshTokenSchema, db: AsyncSession = Depends(database.get_async_db)):
+    """
+    Выдать новую пару токенов по refresh-токену
+
+    Роль, отделение и версия прав перечитываются из БД — так access-токен
+    получает актуальные права после их изменения.
+    """
+    payload = decode_employee_token(data.refresh_token, token_type='employee_refresh')
+    await revocations.ensure_valid_async(payload, 'employee')
+
+    result = await db.execute(
+        select(models.Employee)
+        .options(joinedload(models.Employee.role))
+        .where(models.Employee.id == int(payload['sub']))
+    )
+    employee = result.scalars().first()
+
+    if employee is None:
+        raise HTTPException(status_code=401, detail='Сотрудник не найден')
+
+    if not employee.is_active:
+        raise HTTPException(
+            status_code=403, detail='Аккаунт деактивирован. Обратитесь к администратору'
+        )
+
+    # Refresh-токен одноразовый: использованный отзываем
+    revocations.revoke_token(db, payload, 'employee')
+    await db.commit()
+
+    return {**issue_tokens(employee), 'token_type': 'bearer'}
+
+
+class LogoutSchema(BaseModel):
+    """Схема выхода: refresh-токен отзывается вместе с access-токеном"""
+    refresh_token: Optional[str] = None
+
+
+@router.post('/logout', summary='Выход сотрудника (отзыв токенов)')
+async def logout(
+    data: Optional[LogoutSchema] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    revocations.revoke_token(db, decode_employee_token(credentials.credentials), 'employee')
+    if data and data.refresh_token:
+        revocations.revoke_token(
+            db, decode_employee_token(data.refresh_token, token_type='employee_refresh'), 'employee')
+    await db.commit()
+    return {'message': 'Вы вышли из аккаунта'}
+
+
 @router.post('/register', summary='Регистрация сотрудника (только SuperAdmin)')
-def create_employee(
+async def create_employee(
     data: EmployeeCreateSchema,
-    db: Session = Depends(database.get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     🆕 Создание нового сотрудника (только для SuperAdmin)
@@ -181,9 +372,9 @@ def create_employee(
     check_superadmin(current_employee)
 
     # 🆕 Запрет на создание второго SuperAdmin
-    superadmin_role = db.query(models.Role).filter(
-        models.Role.name == "SuperAdmin"
-    ).first()
+    superadmin_role = (await db.execute(
+        select(models.Role).where(models.Role.name == "SuperAdmin")
+    )).scalars().first()
 
     if superadmin_role and data.role_id == superadmin_role.id:
         raise HTTPException(
@@ -191,18 +382,13 @@ def create_employee(
             detail='Нельзя создать второго SuperAdmin! В системе может быть только один SuperAdmin.'
         )
 
-    if db.query(models.Employee).filter(models.Employee.email == data.email).first():
-        raise HTTPException(
-            status_code=400, detail='Email уже зарегистрирован')
-
     # Проверка существования роли
-    role = db.query(models.Role).filter(models.Role.id == data.role_id).first()
+    role = await db.get(models.Role, data.role_id)
     if not role:
         raise HTTPException(status_code=404, detail='Роль не найдена')
 
     # Проверка существования отделения
-    branch = db.query(models.Branch).filter(
-        models.Branch.id == data.branch_id).first()
+    branch = await db.get(models.Branch, data.branch_id)
     if not branch:
         raise HTTPException(status_code=404, detail='Отделение не найдено')
 
@@ -211,15 +397,19 @@ def create_employee(
         last_name=data.last_name,
         patronymic=data.patronymic,
         email=data.email,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hash_password_async(data.password),
         role_id=data.role_id,
         branch_id=data.branch_id,
         is_active=True
     )
 
     db.add(db_employee)
-    db.commit()
-    db.refresh(db_employee)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise_unique_violation(e, {'email': 'Email уже зарегистрирован'})
+    await db.refresh(db_employee)
 
     return {
         'employee_id': db_employee.id,
@@ -241,35 +431,43 @@ class ChangePasswordSchema(BaseModel):
 
 
 @router.patch('/change-password', summary='Изменить пароль')
-def change_employee_password(
+async def change_employee_password(
     data: ChangePasswordSchema,
-    db: Session = Depends(database.get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_employee: models.Employee = Depends(get_current_employee_record_async)
 ):
     """
     Изменить пароль текущего сотрудника
     """
     # Проверяем текущий пароль
-    if not verify_password(data.current_password, current_employee.hashed_password):
+    if not await verify_password_async(data.current_password, current_employee.hashed_password):
         raise HTTPException(
             status_code=400,
             detail='Неверный текущий пароль'
         )
 
-    # Проверяем, что новый пароль отличается от старого
-    if verify_password(data.new_password, current_employee.hashed_password):
+    # Текущий пароль совпал с хешем — второй bcrypt для сравнения не нужен
+    if data.new_password == data.current_password:
         raise HTTPException(
             status_code=400,
             detail='Новый пароль должен отличаться от текущего'
         )
 
     # Обновляем пароль
-    current_employee.hashed_password = hash_password(data.new_password)
-    db.commit()
+    await db.execute(
+        update(models.Employee)
+        .where(models.Employee.id == current_employee.id)
+        .values(hashed_password=await hash_password_async(data.new_password))
+    )
+    # Все ранее выданные токены (в том числе refresh) больше не действуют
+    revocations.revoke_subject(db, 'employee', current_employee.id, REFRESH_TOKEN_MINUTES)
+    await db.commit()
+    employee_cache.invalidate(current_employee.id)
 
     return {
         "message": "Пароль успешно изменен",
-        "employee_id": current_employee.id
+        "employee_id": current_employee.id,
+        **issue_tokens(current_employee),
     }
 
 
@@ -285,7 +483,7 @@ class UpdateProfileSchema(BaseModel):
 def update_my_profile(
     data: UpdateProfileSchema,
     db: Session = Depends(database.get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: models.Employee = Depends(get_current_employee_record)
 ):
     """
     Обновить свой профиль (имя, фамилия, отчество, email)
@@ -306,23 +504,17 @@ def update_my_profile(
     if data.patronymic is not None:
         current_employee.patronymic = data.patronymic
 
-    # Обновляем email (с проверкой уникальности)
+    # Обновляем email (занятый email отклонит уникальный индекс)
     if data.email is not None:
-        # Проверка уникальности email
-        existing = db.query(models.Employee).filter(
-            models.Employee.email == data.email,
-            models.Employee.id != current_employee.id
-        ).first()
-
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail='Этот email уже используется другим сотрудником'
-            )
-
         current_employee.email = data.email
 
-    db.commit()
+    revocations.announce_change(db, 'employee', current_employee.id)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise_unique_violation(e, {'email': 'Этот email уже используется другим сотрудником'})
+    employee_cache.invalidate(current_employee.id)
     db.refresh(current_employee)
 
     # Загружаем связи для полного ответа
@@ -1,9 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from db.database import get_db
+from db.database import get_db, get_read_db
 from db import models
 from schemas.employee import EmployeeResponse, EmployeeUpdateSchema
-from routers.employee_auth import get_current_employee, check_superadmin, hash_password
+from routers.employee_auth import (
+    REFRESH_TOKEN_MINUTES,
+    EmployeeClaims,
+    check_superadmin,
+    get_current_employee,
+)
+from utils.integrity import raise_unique_violation
+from utils.permission_versions import permission_versions
+from utils.principal_cache import employee_cache
+from utils.revocation import revocations
 
 router = APIRouter(
     prefix="/employees",
@@ -13,8 +23,8 @@ router = APIRouter(
 
 @router.get("/", response_model=list[EmployeeResponse], summary="Получить всех сотрудников")
 def get_all_employees(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить список всех сотрудников (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -33,8 +43,8 @@ def get_all_employees(
 @router.get("/{employee_id}", response_model=EmployeeResponse, summary="Получить сотрудника по ID")
 def get_employee_by_id(
     employee_id: int,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить информацию о конкретном сотруднике (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -60,7 +70,7 @@ def update_employee(
     employee_id: int,
     employee_data: EmployeeUpdateSchema,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     Обновить информацию о сотруднике (только SuperAdmin)
@@ -76,6 +86,8 @@ def update_employee(
     if not employee:
         raise HTTPException(status_code=404, detail="Сотрудник не найден")
 
+    permissions_before = (employee.role_id, employee.branch_id, employee.is_active)
+
     # 🆕 Защита от изменения роли на SuperAdmin
     if employee_data.role_id is not None:
         superadmin_role = db.query(models.Role).filter(
@@ -104,14 +116,7 @@ def update_employee(
     if employee_data.patronymic is not None:
         employee.patronymic = employee_data.patronymic
     if employee_data.email is not None:
-        # Проверка уникальности email
-        existing = db.query(models.Employee).filter(
-            models.Employee.email == employee_data.email,
-            models.Employee.id != employee_id
-        ).first()
-        if existing:
-            raise HTTPException(
-                status_code=400, detail="Email уже используется")
+        # Уникальность проверит индекс при коммите
         employee.email = employee_data.email
 
     if employee_data.branch_id is not None:
@@ -124,7 +129,18 @@ def update_employee(
     if employee_data.is_active is not None:
         employee.is_active = employee_data.is_active
 
-    db.commit()
+    # Роль, отделение или активность изменились — выданные access-токены устарели
+    if (employee.role_id, employee.branch_id, employee.is_active) != permissions_before:
+        employee.permission_version = models.Employee.permission_version + 1
+
+    revocations.announce_change(db, 'employee', employee_id)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise_unique_violation(e, {'email': "Email уже используется"})
+    employee_cache.invalidate(employee_id)
+    permission_versions.invalidate()
     db.refresh(employee)
 
     # Загружаем связи
@@ -145,7 +161,7 @@ def update_employee(
 def delete_employee(
     employee_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     Удалить сотрудника (только SuperAdmin)
@@ -175,7 +191,10 @@ def delete_employee(
         )
 
     db.delete(employee)
+    revocations.announce_change(db, 'employee', employee_id)
     db.commit()
+    employee_cache.invalidate(employee_id)
+    permission_versions.invalidate()
 
     return {"message": "Сотрудник успешно удалён", "deleted_employee_id": employee_id}
 
@@ -184,7 +203,7 @@ def delete_employee(
 def toggle_employee_active(
     employee_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     Изменить статус активности сотрудника (только SuperAdmin)
@@ -214,7 +233,15 @@ def toggle_employee_active(
         )
 
     employee.is_active = not employee.is_active
+    employee.permission_version = models.Employee.permission_version + 1
+    if not employee.is_active:
+        # Деактивированный сотрудник теряет и access-, и refresh-токены
+        revocations.revoke_subject(db, 'employee', employee_id, REFRESH_TOKEN_MINUTES)
+    else:
+        revocations.announce_change(db, 'employee', employee_id)
     db.commit()
+    employee_cache.invalidate(employee_id)
+    permission_versions.invalidate()
 
     status = "активирован" if employee.is_active else "деактивирован"
     return {
@@ -226,8 +253,8 @@ def toggle_employee_active(
 
 @router.get("/stats/overview", summary="Статистика по сотрудникам")
 def get_employees_stats(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить общую статистику по сотрудникам (только SuperAdmin)"""
     check_superadmin(current_employee)
@@ -11,6 +11,7 @@ from schemas.loan import (
     LoanScheduleItem
 )
 from routers.auth import get_current_user
+from rate_limit import limiter
 
 router = APIRouter(
     prefix="/loans",
@@ -22,6 +23,7 @@ router = APIRouter(
 # 🆕 Подать заявку на кредит
 # ==============================
 @router.post("/apply", response_model=LoanResponse, summary="Подать заявку на кредит")
+@limiter.cost(3)
 def apply_for_loan(
     loan_data: LoanApplicationSchema,
     db: Session = Depends(get_db),
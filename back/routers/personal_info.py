@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from db import database, models
 from schemas.personal_info import PersonalInfoCreateSchema
 from routers.auth import get_current_user
+from utils.principal_cache import client_cache
+from utils.revocation import revocations
 
 router = APIRouter(
     prefix='/personal_info',
@@ -35,7 +37,9 @@ def fill_personal_info(
         )
         db.add(pers_info)
 
+    revocations.announce_change(db, 'client', current_user.id)
     db.commit()
+    client_cache.invalidate(current_user.id)
     db.refresh(pers_info)
 
     return {
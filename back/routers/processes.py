@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from db.database import get_db
+from db.database import get_db, get_read_db
 from db import models
 from schemas.process import (
     ProcessCreateSchema,
@@ -64,7 +64,7 @@ def create_process(
 # ==============================
 @router.get("/me", response_model=list[ProcessResponse], summary="Получить все мои процессы")
 def get_my_processes(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_client=Depends(get_current_user)
 ):
     """
@@ -83,7 +83,7 @@ def get_my_processes(
 @router.get("/{process_id}", response_model=ProcessResponse, summary="Получить детали процесса")
 def get_process_details(
     process_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_client=Depends(get_current_user)
 ):
     """
@@ -172,7 +172,7 @@ def delete_process(
 # ==============================
 @router.get("/me/stats", summary="Статистика по моим процессам")
 def get_my_processes_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_client=Depends(get_current_user)
 ):
     """
@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db import models, database
 from schemas.profile import (
@@ -8,7 +10,11 @@ from schemas.profile import (
     ChangePhoneSchema,
     ProfileResponse
 )
-from routers.auth import get_current_user, hash_password, verify_password
+from routers.auth import ACCESS_TOKEN_MINUTES, create_access_token, get_current_user, get_current_user_async
+from utils.integrity import raise_unique_violation
+from utils.passwords import hash_password_async, verify_password, verify_password_async
+from utils.principal_cache import client_cache
+from utils.revocation import revocations
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -64,7 +70,9 @@ def update_profile(
     if data.patronymic is not None:
         current_user.patronymic = data.patronymic
 
+    revocations.announce_change(db, 'client', current_user.id)
     db.commit()
+    client_cache.invalidate(current_user.id)
     db.refresh(current_user)
 
     return {
@@ -88,34 +96,39 @@ def update_profile(
 # 🔐 Изменить пароль
 # ==============================
 @router.post('/change-password', summary='Изменить пароль')
-def change_password(
+async def change_password(
     data: ChangePasswordSchema,
-    current_user: models.Client = Depends(get_current_user),
-    db: Session = Depends(database.get_db)
+    current_user: models.Client = Depends(get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Изменить пароль пользователя"""
 
     # Проверяем текущий пароль
-    if not verify_password(data.current_password, current_user.hashed_password):
+    if not await verify_password_async(data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=400,
             detail='Неверный текущий пароль'
         )
 
-    # Проверяем, что новый пароль отличается от старого
-    if verify_password(data.new_password, current_user.hashed_password):
+    # Текущий пароль совпал с хешем — второй bcrypt для сравнения не нужен
+    if data.new_password == data.current_password:
         raise HTTPException(
             status_code=400,
             detail='Новый пароль должен отличаться от текущего'
         )
 
     # Обновляем пароль
-    current_user.hashed_password = hash_password(data.new_password)
-    db.commit()
+    current_user.hashed_password = await hash_password_async(data.new_password)
+    # Все ранее выданные токены больше не действуют — текущая сессия получает новый
+    revocations.revoke_subject(db, 'client', current_user.id, ACCESS_TOKEN_MINUTES)
+    await db.commit()
+    client_cache.invalidate(current_user.id)
 
     return {
         'message': 'Пароль успешно изменен',
-        'success': True
+        'success': True,
+        'access_token': create_access_token({'sub': str(current_user.id)}),
+        'token_type': 'bearer'
     }
 
 
@@ -144,21 +157,15 @@ def change_email(
             detail='Новый email совпадает с текущим'
         )
 
-    # Проверяем, не занят ли новый email
-    existing_user = db.query(models.Client).filter(
-        models.Client.email == data.new_email,
-        models.Client.id != current_user.id
-    ).first()
-
-    if existing_user:
-        raise HTTPException(
-            status_code=400,
-            detail='Этот email уже используется другим пользователем'
-        )
-
-    # Обновляем email
+    # Обновляем email (занятый email отклонит уникальный индекс)
     current_user.email = data.new_email
-    db.commit()
+    revocations.announce_change(db, 'client', current_user.id)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise_unique_violation(e, {'email': 'Этот email уже используется другим пользователем'})
+    client_cache.invalidate(current_user.id)
     db.refresh(current_user)
 
     return {
@@ -207,21 +214,15 @@ def change_phone(
             detail='Новый номер телефона совпадает с текущим'
         )
 
-    # Проверяем, не занят ли новый номер
-    existing_user = db.query(models.Client).filter(
-        models.Client.phone == data.new_phone,
-        models.Client.id != current_user.id
-    ).first()
-
-    if existing_user:
-        raise HTTPException(
-            status_code=400,
-            detail='Этот номер телефона уже используется другим пользователем'
-        )
-
-    # Обновляем телефон
+    # Обновляем телефон (занятый номер отклонит уникальный индекс по цифрам)
     current_user.phone = data.new_phone
-    db.commit()
+    revocations.announce_change(db, 'client', current_user.id)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise_unique_violation(e, {'phone_normalized': 'Этот номер телефона уже используется другим пользователем'})
+    client_cache.invalidate(current_user.id)
     db.refresh(current_user)
 
     return {
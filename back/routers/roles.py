@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from db.database import get_db
+from db.database import get_db, get_read_db
 from db import models
 from schemas.role import RoleCreate, RoleResponse, RoleUpdate
-from routers.employee_auth import get_current_employee, check_superadmin
+from routers.employee_auth import EmployeeClaims, get_current_employee, check_superadmin
 
 router = APIRouter(
     prefix="/roles",
@@ -13,8 +13,8 @@ router = APIRouter(
 
 @router.get("/", response_model=list[RoleResponse], summary="Получить все роли")
 def get_all_roles(
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить список всех ролей (только для SuperAdmin)"""
     check_superadmin(current_employee)
@@ -26,8 +26,8 @@ def get_all_roles(
 @router.get("/{role_id}", response_model=RoleResponse, summary="Получить роль по ID")
 def get_role_by_id(
     role_id: int,
-    db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    db: Session = Depends(get_read_db),
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """Получить информацию о конкретной роли"""
     check_superadmin(current_employee)
@@ -43,7 +43,7 @@ def get_role_by_id(
 def create_role(
     role_data: RoleCreate,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     Создать новую роль (только SuperAdmin)
@@ -81,7 +81,7 @@ def update_role(
     role_id: int,
     role_data: RoleUpdate,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     Обновить информацию о роли
@@ -129,7 +129,7 @@ def update_role(
 def delete_role(
     role_id: int,
     db: Session = Depends(get_db),
-    current_employee: models.Employee = Depends(get_current_employee)
+    current_employee: EmployeeClaims = Depends(get_current_employee)
 ):
     """
     Удалить роль (только SuperAdmin)
@@ -1,44 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
-from db.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, select
+from db.database import async_read_session_factory, get_read_db, get_async_read_db
 from db import models
-from schemas.transaction import TransactionResponse, TransactionStatsResponse
-from routers.auth import get_current_user
-from typing import Optional
+from db.archive import archived_until, needs_archive
+from db.periods import next_period, period_label, period_label_sql, period_start, utc_start
+from db.transaction_search import parse_query, search_conditions
+from db.transaction_stats import stats_queries
+from schemas.transaction import TransactionAnalyticsResponse, TransactionResponse, TransactionStatsResponse
+from routers.auth import get_current_user, get_current_user_async
+from rate_limit import limiter
+from utils.analytics_cache import ANALYTICS_CLOSE_GRACE, analytics_cache
+from utils.export import EXPORT_FORMATS, accepts_gzip, encode_rows, gzip_stream
+from utils.pagination import MAX_PAGE_SIZE, keyset_after, next_cursor
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal, Optional
 
 router = APIRouter(
     prefix="/transactions",
     tags=["Транзакции"]
 )
 
+# Больше строк поиск за один запрос не отдаёт
+SEARCH_MAX_LIMIT = 100
+# Строк в одной пачке выгрузки (server-side cursor)
+EXPORT_CHUNK_SIZE = 1000
+
 
 # ==============================
 # 📜 Получить все транзакции клиента
 # ==============================
 @router.get("/me", response_model=list[TransactionResponse], summary="Получить все мои транзакции")
-def get_my_transactions(
-    limit: Optional[int] = Query(50, description="Количество транзакций"),
-    offset: Optional[int] = Query(0, description="Смещение"),
+async def get_my_transactions(
+    response: Response,
+    limit: Optional[int] = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Количество транзакций"),
+    cursor: Optional[str] = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    offset: Optional[int] = Query(
+        0, ge=0, deprecated=True, description="Смещение (устарело, используйте cursor)"),
     transaction_type: Optional[str] = Query(
         None, description="Фильтр по типу: deposit, withdraw, transfer, loan_payment"),
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_client=Depends(get_current_user_async)
 ):
     """
     Возвращает список всех транзакций текущего клиента.
     Можно фильтровать по типу и использовать пагинацию.
+
+    Пагинация курсором: следующая страница запрашивается с cursor из
+    заголовка X-Next-Cursor (заголовка нет — страниц больше нет).
     """
-    query = db.query(models.Transaction).filter(
-        models.Transaction.client_id == current_client.id
-    )
+    def filters(model):
+        conditions = [model.client_id == current_client.id]
+        if transaction_type:
+            conditions.append(model.transaction_type == transaction_type)
+        return conditions
 
-    if transaction_type:
-        query = query.filter(
-            models.Transaction.transaction_type == transaction_type)
+    def page(model, skip: int, size: int):
+        query = select(model).where(*filters(model))
+        if cursor:
+            query = query.where(keyset_after(model, cursor, model.client_id == current_client.id))
+        return query.order_by(desc(model.created_at), desc(model.id)).offset(skip).limit(size)
 
-    transactions = query.order_by(desc(models.Transaction.created_at)).limit(
-        limit).offset(offset).all()
+    skip = 0 if cursor else offset
+    # Одна лишняя строка — узнать, есть ли следующая страница
+    result = await db.execute(page(models.Transaction, skip, limit + 1))
+    transactions = list(result.scalars().all())
+
+    if len(transactions) <= limit:
+        # Горячие строки кончились — дочитываем архив (он целиком старше)
+        if skip and not transactions:
+            hot = await db.scalar(select(func.count()).where(*filters(models.Transaction)))
+            skip = max(skip - hot, 0)
+        else:
+            skip = 0
+        result = await db.execute(page(models.TransactionArchive, skip, limit + 1 - len(transactions)))
+        transactions += result.scalars().all()
+
+    next_page = next_cursor(transactions, limit)
+    if next_page:
+        response.headers["X-Next-Cursor"] = next_page
 
     return transactions
 
@@ -47,18 +90,26 @@ def get_my_transactions(
 # 🔍 Получить детали конкретной транзакции
 # ==============================
 @router.get("/{transaction_id}", response_model=TransactionResponse, summary="Получить детали транзакции")
-def get_transaction_details(
+async def get_transaction_details(
     transaction_id: int,
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_client=Depends(get_current_user_async)
 ):
     """
     Возвращает детальную информацию о конкретной транзакции.
     """
-    transaction = db.query(models.Transaction).filter(
-        models.Transaction.id == transaction_id,
-        models.Transaction.client_id == current_client.id
-    ).first()
+    result = await db.execute(
+        select(models.Transaction).where(
+            models.Transaction.id == transaction_id,
+            models.Transaction.client_id == current_client.id
+        )
+    )
+    transaction = result.scalars().first()
+
+    if not transaction:
+        archive = models.TransactionArchive
+        transaction = await db.scalar(
+            select(archive).where(archive.id == transaction_id, archive.client_id == current_client.id))
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Транзакция не найдена")
@@ -69,28 +120,251 @@ def get_transaction_details(
 # ==============================
 # 📊 Статистика по транзакциям
 # ==============================
+# Поле ответа для суммы каждого типа транзакции
+STATS_FIELDS = {
+    "deposit": "total_deposits",
+    "withdraw": "total_withdrawals",
+    "transfer": "total_transfers",
+    "loan_payment": "total_loan_payments",
+}
+
+
+def empty_totals() -> dict:
+    return {"total_transactions": 0, **{field: 0.0 for field in STATS_FIELDS.values()}}
+
+
+def add_to_totals(totals: dict, transaction_type: str, count: int, amount: float | None):
+    totals["total_transactions"] += count
+    field = STATS_FIELDS.get(transaction_type)
+    if field:
+        totals[field] += amount or 0.0
+
+
 @router.get("/me/stats", response_model=TransactionStatsResponse, summary="Статистика по моим транзакциям")
-def get_my_transactions_stats(
-    db: Session = Depends(get_db),
-    current_client=Depends(get_current_user)
+async def get_my_transactions_stats(
+    date_from: Optional[date] = Query(None, description="Начало периода (включительно)"),
+    date_to: Optional[date] = Query(None, description="Конец периода (включительно)"),
+    by_month: bool = Query(False, description="Добавить разбивку по месяцам"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_client=Depends(get_current_user_async)
 ):
     """
     Возвращает статистику по транзакциям клиента.
+
+    Полные месяцы периода читаются из агрегатов client_transaction_stats
+    (строка на тип и месяц), неполные месяцы на краях периода досчитываются
+    GROUP BY по индексу ix_transaction_client_stats.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from не может быть позже date_to")
+
+    until = await db.scalar(archived_until(current_client.id)) if date_from or date_to else None
+    rows = []
+    for query in stats_queries(db.bind.dialect.name, current_client.id, date_from, date_to, until):
+        rows += (await db.execute(query)).all()
+
+    totals = empty_totals()
+    months: dict[str, dict] = {}
+    for row in rows:
+        add_to_totals(totals, row.transaction_type, row.count, row.amount)
+        if by_month:
+            month = months.setdefault(row.month, {"month": row.month, **empty_totals()})
+            add_to_totals(month, row.transaction_type, row.count, row.amount)
+
+    return {
+        **totals,
+        "date_from": date_from,
+        "date_to": date_to,
+        "months": [months[key] for key in sorted(months)] if by_month else None,
+    }
+
+
+# ==============================
+# 📈 Аналитика по периодам
+# ==============================
+# Куда относится сумма транзакции каждого типа
+FLOWS = {
+    "deposit": "inflow",
+    "withdraw": "outflow",
+    "transfer": "outflow",
+    "loan_payment": "outflow",
+}
+# Периодов по умолчанию (без date_from) и максимум за запрос
+ANALYTICS_DEFAULT_PERIODS = {"day": 30, "week": 12, "month": 12}
+ANALYTICS_MAX_BUCKETS = 400
+
+
+@router.get("/me/analytics", response_model=TransactionAnalyticsResponse,
+            summary="Аналитика моих транзакций по периодам")
+async def get_my_transactions_analytics(
+    bucket: Literal["day", "week", "month"] = Query("month", description="Период: день, неделя или месяц"),
+    date_from: Optional[date] = Query(None, description="Начало (сдвигается на начало периода)"),
+    date_to: Optional[date] = Query(None, description="Конец, по умолчанию сегодня (до конца периода)"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_client=Depends(get_current_user_async)
+):
+    """
+    Поступления и списания клиента по дням, неделям (с понедельника) или месяцам.
+
+    Границы расширяются до целых периодов, пустые периоды возвращаются
+    с нулями. Считается GROUP BY по периоду и типу в БД; итоги закрытых
+    периодов берутся из кеша, заново считаются только открытый период
+    и те, которых в кеше ещё нет.
     """
-    transactions = db.query(models.Transaction).filter(
-        models.Transaction.client_id == current_client.id,
-        models.Transaction.status == "completed"
-    ).all()
-
-    stats = {
-        "total_transactions": len(transactions),
-        "total_deposits": sum(t.amount for t in transactions if t.transaction_type == "deposit"),
-        "total_withdrawals": sum(t.amount for t in transactions if t.transaction_type == "withdraw"),
-        "total_transfers": sum(t.amount for t in transactions if t.transaction_type == "transfer"),
-        "total_loan_payments": sum(t.amount for t in transactions if t.transaction_type == "loan_payment")
+    date_to = date_to or datetime.now(timezone.utc).date()
+    if date_from and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from не может быть позже date_to")
+
+    last = period_start(date_to, bucket)
+    if date_from:
+        first = period_start(date_from, bucket)
+    else:
+        first = last
+        for _ in range(ANALYTICS_DEFAULT_PERIODS[bucket] - 1):
+            first = period_start(first - timedelta(days=1), bucket)
+
+    starts = []
+    start = first
+    while start <= last:
+        if len(starts) == ANALYTICS_MAX_BUCKETS:
+            raise HTTPException(
+                status_code=400, detail=f"Слишком длинный период: больше {ANALYTICS_MAX_BUCKETS} интервалов")
+        starts.append(start)
+        start = next_period(start, bucket)
+    labels = [period_label(start, bucket) for start in starts]
+
+    periods = analytics_cache.get(current_client.id, bucket, labels)
+    missing = [start for start, label in zip(starts, labels) if label not in periods]
+    if missing:
+        range_start = utc_start(missing[0])
+        range_end = utc_start(next_period(missing[-1], bucket))
+        computed = {period_label(start, bucket): {"inflow": 0.0, "outflow": 0.0, "by_type": {}}
+                    for start in missing}
+
+        sources = [models.Transaction]
+        if needs_archive(await db.scalar(archived_until(current_client.id)), range_start):
+            sources.append(models.TransactionArchive)
+        for transaction in sources:
+            period = period_label_sql(transaction.created_at, db.bind.dialect.name, bucket).label("period")
+            query = (
+                select(period, transaction.transaction_type,
+                       func.count().label("count"), func.sum(transaction.amount).label("amount"))
+                .where(
+                    transaction.client_id == current_client.id,
+                    transaction.status == "completed",
+                    transaction.created_at >= range_start,
+                    transaction.created_at < range_end,
+                )
+                .group_by(period, transaction.transaction_type)
+            )
+            for row in await db.execute(query):
+                totals = computed.get(row.period)
+                if totals is None:
+                    continue  # период между недостающими, уже есть в кеше
+                flow = FLOWS.get(row.transaction_type)
+                if flow:
+                    totals[flow] += row.amount or 0.0
+                by_type = totals["by_type"].setdefault(row.transaction_type, {"count": 0, "amount": 0.0})
+                by_type["count"] += row.count
+                by_type["amount"] += row.amount or 0.0
+
+        # Кешируются только периоды, закрытые дольше ANALYTICS_CLOSE_GRACE
+        # (границы и метки периодов — в UTC, см. db/periods.py)
+        closed_before = datetime.now(timezone.utc) - timedelta(seconds=ANALYTICS_CLOSE_GRACE)
+        analytics_cache.put(current_client.id, bucket, {
+            period_label(start, bucket): computed[period_label(start, bucket)]
+            for start in missing
+            if utc_start(next_period(start, bucket)) <= closed_before
+        })
+        periods.update(computed)
+
+    return {
+        "bucket": bucket,
+        "date_from": first,
+        "date_to": next_period(last, bucket) - timedelta(days=1),
+        "buckets": [
+            {
+                "period": label,
+                "start": start,
+                "inflow": periods[label]["inflow"],
+                "outflow": periods[label]["outflow"],
+                "net": periods[label]["inflow"] - periods[label]["outflow"],
+                "by_type": periods[label]["by_type"],
+            }
+            for start, label in zip(starts, labels)
+        ],
     }
 
-    return stats
+
+# ==============================
+# 📤 Выгрузка выписки
+# ==============================
+@router.get("/me/export", summary="Выгрузка моих транзакций (CSV / NDJSON)",
+            response_class=StreamingResponse)
+@limiter.cost(5)
+async def export_my_transactions(
+    request: Request,
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format", description="Формат выгрузки"),
+    date_from: Optional[date] = Query(None, alias="from", description="Начало периода (включительно)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Конец периода (включительно)"),
+    current_client=Depends(get_current_user_async)
+):
+    """
+    Выгружает всю историю транзакций за период потоком.
+
+    Строки читаются пачками по EXPORT_CHUNK_SIZE (server-side cursor) и
+    сразу отдаются клиенту, так что память не растёт с длиной истории.
+    Поля — как в TransactionResponse, порядок — от старых к новым.
+    При Accept-Encoding: gzip поток сжимается.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="from не может быть позже to")
+
+    fields = list(TransactionResponse.model_fields)
+
+    def export_query(transaction):
+        query = (
+            select(*(getattr(transaction, field) for field in fields))
+            .where(transaction.client_id == current_client.id)
+            .order_by(transaction.created_at, transaction.id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        if date_from:
+            query = query.where(transaction.created_at >= utc_start(date_from))
+        if date_to:
+            query = query.where(transaction.created_at < utc_start(date_to + timedelta(days=1)))
+        return query
+
+    # Сессия зависимости закрывается до отправки тела — у потока своя
+    session_factory = await async_read_session_factory(request)
+
+    async def rows():
+        header = True
+        async with session_factory() as db:
+            # Архив целиком старше горячей таблицы — выгружается первым
+            sources = [models.Transaction]
+            if needs_archive(await db.scalar(archived_until(current_client.id)), date_from):
+                sources.insert(0, models.TransactionArchive)
+            for transaction in sources:
+                result = await db.stream(export_query(transaction))
+                async for partition in result.partitions():
+                    yield encode_rows(export_format, fields, partition, header)
+                    header = False
+        if header:
+            # Пустой период: у CSV остаётся строка заголовков
+            yield encode_rows(export_format, fields, [], header)
+
+    filename = "transactions-{}-{}-{}.{}".format(
+        current_client.id, date_from or "start", date_to or date.today(), export_format)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Vary": "Accept-Encoding",
+    }
+    body = rows()
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_stream(body)
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[export_format], headers=headers)
 
 
 # ==============================
@@ -98,19 +372,45 @@ def get_my_transactions_stats(
 # ==============================
 @router.get("/search/", response_model=list[TransactionResponse], summary="Поиск транзакций")
 def search_transactions(
-    query: str = Query(..., description="Поисковый запрос (сумма, описание)"),
-    db: Session = Depends(get_db),
+    response: Response,
+    query: str = Query(..., min_length=1, max_length=200,
+                       description="Поисковый запрос: текст описания и/или сумма (5000, >5000, 1000..2000)"),
+    limit: int = Query(50, ge=1, le=SEARCH_MAX_LIMIT, description="Количество транзакций"),
+    cursor: Optional[str] = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    db: Session = Depends(get_read_db),
     current_client=Depends(get_current_user)
 ):
     """
     Поиск транзакций по описанию или сумме.
+
+    Текст ищется по индексу описаний (FTS5 / pg_trgm), суммы — по индексу
+    (client_id, amount): точная `1500`, сравнение `>5000`, `<=100`,
+    диапазон `1000..2000`. Можно сочетать: "кафе >500".
+    Страница — не больше 100 строк, следующие — по cursor.
     """
-    transactions = db.query(models.Transaction).filter(
-        models.Transaction.client_id == current_client.id,
-        or_(
-            models.Transaction.description.ilike(f"%{query}%"),
-            models.Transaction.amount.cast(models.String).ilike(f"%{query}%")
+    parsed = parse_query(query)
+    if parsed.is_empty:
+        raise HTTPException(status_code=400, detail="Пустой поисковый запрос")
+
+    dialect_name = db.bind.dialect.name
+
+    def page(transaction, size: int):
+        query = select(transaction).where(
+            transaction.client_id == current_client.id,
+            *search_conditions(dialect_name, transaction, parsed)
         )
-    ).order_by(desc(models.Transaction.created_at)).all()
+        if cursor:
+            query = query.where(keyset_after(transaction, cursor, transaction.client_id == current_client.id))
+        return query.order_by(desc(transaction.created_at), desc(transaction.id)).limit(size)
+
+    transactions = list(db.scalars(page(models.Transaction, limit + 1)))
+    if len(transactions) <= limit:
+        # Горячие строки кончились — ищем и в архиве
+        transactions += db.scalars(page(models.TransactionArchive, limit + 1 - len(transactions)))
+
+    next_page = next_cursor(transactions, limit)
+    if next_page:
+        response.headers["X-Next-Cursor"] = next_page
 
     return transactions
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -20,10 +20,45 @@ class TransactionResponse(BaseModel):
         from_attributes = True
 
 
-class TransactionStatsResponse(BaseModel):
-    """Статистика по транзакциям"""
+class TransactionTotals(BaseModel):
+    """Суммы завершённых транзакций по типам"""
     total_transactions: int
     total_deposits: float
     total_withdrawals: float
     total_transfers: float
-    total_loan_payments: float
\ No newline at end of file
+    total_loan_payments: float
+
+
+class TransactionMonthStats(TransactionTotals):
+    """Статистика за месяц"""
+    month: str  # 'YYYY-MM'
+
+
+class TransactionStatsResponse(TransactionTotals):
+    """Статистика по транзакциям"""
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    months: Optional[list[TransactionMonthStats]] = None
+
+class AnalyticsTypeTotals(BaseModel):
+    """Число и сумма транзакций одного типа за период"""
+    count: int
+    amount: float
+
+
+class AnalyticsBucket(BaseModel):
+    """Период аналитики: поступления, списания и разбивка по типам"""
+    period: str  # 'YYYY-MM-DD' (день, понедельник недели) или 'YYYY-MM'
+    start: date
+    inflow: float
+    outflow: float
+    net: float
+    by_type: dict[str, AnalyticsTypeTotals]
+
+
+class TransactionAnalyticsResponse(BaseModel):
+    """Временной ряд по транзакциям"""
+    bucket: str
+    date_from: date
+    date_to: date
+    buckets: list[AnalyticsBucket]
@@ -0,0 +1,65 @@
+"""
+Общие фикстуры: приложение на временной SQLite-базе
+
+Переменные окружения задаются до импорта модулей приложения — настройки
+читаются при импорте. Rate limiter в приложении выключен; его проверяют
+отдельно, на собственном приложении (test_rate_limit.py).
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="nextbank-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_REPLICA_URL", None)
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["RATE_LIMIT_STORAGE"] = "memory"
+os.environ["LOGIN_THROTTLE_BACKEND"] = "memory"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("SUPERADMIN_PASSWORD", "Admin123")
+if not os.getenv("ENCRYPTION_KEY"):
+    from cryptography.fernet import Fernet
+
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    import bootstrap
+    import main
+    from fastapi.testclient import TestClient
+
+    bootstrap.main()
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def client_auth(client):
+    """Заголовок клиента с одним счётом и двумя картами"""
+    client.post("/auth/register", json={
+        "first_name": "Иван", "last_name": "Петров", "email": "ivan@example.com",
+        "phone": "+7 900 000-00-01", "password": "Passw0rd!",
+    })
+    token = client.post("/auth/login", json={
+        "email": "ivan@example.com", "password": "Passw0rd!",
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    account = client.post("/accounts/", headers=headers).json()
+    for _ in range(2):
+        client.post("/cards/", headers=headers, json={"card_type": "debit", "account_id": account["id"]})
+    return headers
+
+
+@pytest.fixture(scope="session")
+def admin_auth(client):
+    token = client.post("/admin/auth/login", json={
+        "email": "superadmin@nextbank.ru", "password": os.environ["SUPERADMIN_PASSWORD"],
+    }).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,25 @@
+"""Смена пароля сотрудника"""
+from db.database import engine
+from utils.sql_debug import query_budget
+
+
+def test_change_password_uses_only_the_async_session(client, admin_auth):
+    employee = {
+        "first_name": "Анна", "last_name": "Смирнова", "email": "anna@nextbank.ru",
+        "password": "Secret123", "role_id": 2, "branch_id": 1,
+    }
+    assert client.post("/admin/auth/register", headers=admin_auth, json=employee).status_code == 200
+    token = client.post("/admin/auth/login", json={
+        "email": employee["email"], "password": employee["password"],
+    }).json()["access_token"]
+
+    # Запись сотрудника читается той же AsyncSession, что и обновляет пароль
+    with query_budget(0, engines=[engine]):
+        response = client.patch("/admin/auth/change-password", headers={"Authorization": f"Bearer {token}"},
+                                json={"current_password": "Secret123", "new_password": "Secret456"})
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+
+    assert client.post("/admin/auth/login", json={
+        "email": employee["email"], "password": "Secret456",
+    }).status_code == 200
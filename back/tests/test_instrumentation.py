@@ -0,0 +1,15 @@
+"""Учёт SQL-запросов на движке приложения"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from db.database import engine
+
+
+def test_failed_statement_leaves_no_state_on_connection(client):
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        assert "query_started" not in conn.info
@@ -0,0 +1,60 @@
+"""Блокировка email после серии неудачных входов"""
+import pytest
+
+from utils.login_throttle import (
+    LOGIN_FAILURE_WINDOW, LOGIN_LOCKOUT_RESET, LOGIN_MAX_FAILURES, PRUNE_EVERY,
+    MemoryThrottleStore, SQLiteThrottleStore,
+)
+
+
+def test_lockout_after_failures(client):
+    credentials = {"email": "nobody@example.com", "password": "Wrong1234"}
+    for _ in range(LOGIN_MAX_FAILURES):
+        assert client.post("/auth/login", json=credentials).status_code == 401
+
+    # Тот же email в другом регистре — та же блокировка
+    response = client.post("/auth/login", json={**credentials, "email": "NoBody@Example.com"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
+
+    # Вход сотрудника считается отдельно
+    assert client.post("/admin/auth/login", json=credentials).status_code == 401
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryThrottleStore()
+    return SQLiteThrottleStore(str(tmp_path / "throttle.sqlite3"))
+
+
+def stored_keys(store) -> set:
+    if isinstance(store, MemoryThrottleStore):
+        return set(store._states)
+    return {row[0] for row in store._conn().execute("SELECT key FROM login_failures")}
+
+
+def test_stale_entries_are_pruned(store):
+    now = 1_000_000.0
+    # Заблокированный email: уровень помнится до LOGIN_LOCKOUT_RESET
+    for _ in range(LOGIN_MAX_FAILURES):
+        store.record_failure("client:locked@example.com", now)
+    store.record_failure("client:old@example.com", now)
+
+    # Перебор случайных email после того, как окно неудач прошло
+    later = now + LOGIN_FAILURE_WINDOW
+    for i in range(PRUNE_EVERY - LOGIN_MAX_FAILURES - 1):
+        store.record_failure(f"client:spray{i}@example.com", later)
+
+    keys = stored_keys(store)
+    assert "client:old@example.com" not in keys
+    assert "client:locked@example.com" in keys
+    assert store.locked_until("client:locked@example.com") > now
+
+    # Через LOGIN_LOCKOUT_RESET забывается и уровень блокировки
+    much_later = now + LOGIN_LOCKOUT_RESET + 1
+    for i in range(PRUNE_EVERY):
+        store.record_failure(f"client:late{i}@example.com", much_later)
+    keys = stored_keys(store)
+    assert "client:locked@example.com" not in keys
+    assert not any(key.startswith("client:spray") for key in keys)
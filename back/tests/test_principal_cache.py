@@ -0,0 +1,18 @@
+"""Кеш пользователей сбрасывается и в других воркерах — через опрос token_revocations"""
+from jose import jwt
+
+from db import models
+from utils.principal_cache import client_cache
+from utils.revocation import revocations
+
+
+def test_profile_change_evicts_other_workers(client, client_auth):
+    client_id = int(jwt.get_unverified_claims(client_auth["Authorization"].split()[1])["sub"])
+    response = client.patch("/profile/update", headers=client_auth, json={"first_name": "Пётр"})
+    assert response.status_code == 200
+
+    # Запись соседнего воркера: локальный invalidate() до неё не дотягивается
+    client_cache.put("other-worker-token", client_id, (models.Client, {"id": client_id}, {}))
+
+    client.portal.call(revocations.refresh)
+    assert client_cache.get("other-worker-token") is None
@@ -0,0 +1,35 @@
+"""Число SQL-запросов горячих эндпоинтов не должно расти с числом строк (N+1)"""
+import pytest
+from jose import jwt
+
+from utils.sql_debug import QueryBudgetExceeded, assert_query_budget, query_budget
+
+
+def _client_id(headers) -> int:
+    token = headers["Authorization"].split()[1]
+    return int(jwt.get_unverified_claims(token)["sub"])
+
+
+def test_my_cards_budget(client, client_auth):
+    # Первый запрос по токену кладёт клиента в кеш пользователей — не в счёт
+    client.get("/cards/me", headers=client_auth)
+    response = assert_query_budget(client, "GET", "/cards/me", 2, headers=client_auth)
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert all(card["account"] for card in response.json())
+
+
+def test_admin_client_card_budget(client, client_auth, admin_auth):
+    url = f"/admin/clients/{_client_id(client_auth)}"
+    # Первый запрос сотрудника ещё загружает карту версий прав — тоже не в счёт
+    client.get(url, headers=admin_auth)
+    response = assert_query_budget(client, "GET", url, 5, headers=admin_auth)
+    assert response.status_code == 200
+    assert response.json()["statistics"]["total_cards"] == 2
+
+
+def test_budget_exceeded_lists_query_shapes(client, client_auth):
+    with pytest.raises(QueryBudgetExceeded) as exc:
+        with query_budget(0):
+            client.get("/cards/me", headers=client_auth)
+    assert "SQL-запросов при бюджете 0" in str(exc.value)
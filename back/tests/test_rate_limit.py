@@ -0,0 +1,295 @@
+"""Token bucket: расчёт корзины, хранилища и заголовки middleware"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rate_limit import Limiter, RateLimitMiddleware
+from utils.rate_limit_storage import MemoryBucketStorage, RedisBucketStorage, SQLiteBucketStorage, take
+
+
+# ========================================
+# take()
+# ========================================
+def test_take_new_bucket_starts_full():
+    tokens, result = take(None, None, 100.0, capacity=10, rate=1, cost=3)
+    assert result.allowed
+    assert tokens == result.remaining == 7
+
+
+def test_take_refills_by_elapsed_time_up_to_capacity():
+    tokens, _ = take(2.0, 100.0, 103.0, capacity=10, rate=1, cost=1)
+    assert tokens == 4
+    tokens, _ = take(2.0, 100.0, 1000.0, capacity=10, rate=1, cost=1)
+    assert tokens == 9
+
+
+def test_take_rejects_and_reports_retry_after():
+    tokens, result = take(0.5, 100.0, 100.0, capacity=10, rate=0.5, cost=2)
+    assert not result.allowed
+    assert tokens == 0.5
+    assert result.retry_after == 3
+
+
+def test_take_ignores_clock_going_backwards():
+    tokens, _ = take(5.0, 100.0, 90.0, capacity=10, rate=1, cost=1)
+    assert tokens == 4
+
+
+# ========================================
+# Хранилища
+# ========================================
+async def _drain(storage, key: str, capacity: float) -> list[bool]:
+    return [(await storage.consume(key, capacity, 0.001, 1)).allowed for _ in range(int(capacity) + 1)]
+
+
+def test_memory_storage_limits_each_key_separately():
+    storage = MemoryBucketStorage()
+    assert asyncio.run(_drain(storage, "a", 3)) == [True, True, True, False]
+    assert asyncio.run(_drain(storage, "b", 3)) == [True, True, True, False]
+
+
+def test_sqlite_storage_shares_buckets_between_instances(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+
+    async def scenario():
+        first, second = SQLiteBucketStorage(path), SQLiteBucketStorage(path)
+        try:
+            results = [(await first.consume("k", 3, 0.001, 1)).allowed for _ in range(2)]
+            results += [(await second.consume("k", 3, 0.001, 1)).allowed for _ in range(2)]
+            return results
+        finally:
+            await first.close()
+            await second.close()
+
+    assert asyncio.run(scenario()) == [True, True, True, False]
+
+
+def test_sqlite_storage_concurrent_writers_share_one_bucket(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    writers, attempts, capacity = 6, 40, 100
+
+    async def scenario():
+        # У каждого хранилища свой поток и соединение — как у отдельных воркеров
+        storages = [SQLiteBucketStorage(path) for _ in range(writers)]
+        try:
+            results = await asyncio.gather(*[
+                storage.consume("k", capacity, 0.001, 1)
+                for storage in storages for _ in range(attempts)])
+        finally:
+            for storage in storages:
+                await storage.close()
+        return [result.allowed for result in results]
+
+    allowed = asyncio.run(scenario())
+    assert allowed.count(True) == capacity
+    assert len(allowed) == writers * attempts
+
+
+def test_sqlite_storage_waits_out_lock_contention(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    storage = SQLiteBucketStorage(path, timeout=0.1, retries=3)
+
+    async def scenario():
+        await storage.consume("k", 3, 0.001, 1)
+        # Другой воркер держит файл дольше busy timeout
+        holder = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        holder.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.2, holder.execute, ("COMMIT",)).start()
+        try:
+            return await storage.consume("k", 3, 0.001, 1)
+        finally:
+            await storage.close()
+
+    assert asyncio.run(scenario()).allowed
+
+
+# ========================================
+# Redis: RESP-сервер в процессе теста
+# ========================================
+class FakeRedis:
+    """SCRIPT LOAD / EVALSHA / EVAL: корзина считается take(), как Lua-скрипт"""
+
+    def __init__(self):
+        self.buckets: dict[bytes, tuple[float, float]] = {}
+        self.scripts: set[str] = set()
+        self.connections = 0
+        self.in_flight = self.max_in_flight = 0
+        self.delay = 0.0
+        self._writers: list[asyncio.StreamWriter] = []
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"redis://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/0"
+
+    def drop_connections(self):
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+
+    async def stop(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        try:
+            while line := await reader.readline():
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(await self._reply(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    async def _reply(self, args: list[bytes]) -> bytes:
+        command = args[0].upper()
+        if command == b"SCRIPT":
+            sha = hashlib.sha1(args[2]).hexdigest()
+            self.scripts.add(sha)
+            return b"$40\r\n%s\r\n" % sha.encode()
+        if command == b"EVALSHA" and args[1].decode() not in self.scripts:
+            return b"-NOSCRIPT No matching script\r\n"
+        if command in (b"EVALSHA", b"EVAL"):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(self.delay)
+            self.in_flight -= 1
+            key = args[3]
+            capacity, rate, cost, now = (float(arg) for arg in args[4:8])
+            tokens, updated_at = self.buckets.get(key, (None, None))
+            tokens, result = take(tokens, updated_at, now, capacity, rate, cost)
+            self.buckets[key] = (tokens, now)
+            value = repr(tokens).encode()
+            return b"*2\r\n:%d\r\n$%d\r\n%s\r\n" % (result.allowed, len(value), value)
+        return b"-ERR unknown command\r\n"
+
+
+def run_with_redis(scenario, **storage_options):
+    async def main():
+        server = FakeRedis()
+        storage = RedisBucketStorage(await server.start(), **storage_options)
+        try:
+            return await scenario(server, storage)
+        finally:
+            await storage.close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_redis_storage_consumes_and_refills():
+    async def scenario(server, storage):
+        drained = await _drain(storage, "a", 3)
+        other = (await storage.consume("b", 3, 0.001, 1)).allowed
+        refilling = await storage.consume("c", 1, 20, 1), await storage.consume("c", 1, 20, 1)
+        await asyncio.sleep(0.1)
+        refilled = await storage.consume("c", 1, 20, 1)
+        return drained, other, refilling, refilled
+
+    drained, other, (first, second), refilled = run_with_redis(scenario)
+    assert drained == [True, True, True, False]
+    assert other
+    assert first.allowed and not second.allowed
+    assert 0 < second.retry_after <= 0.05
+    assert refilled.allowed
+
+
+def test_redis_storage_reconnects_and_reloads_script():
+    async def scenario(server, storage):
+        await storage.consume("k", 3, 0.001, 1)
+        # Перезапуск Redis: соединения разорваны, кэш скриптов пуст
+        server.drop_connections()
+        server.scripts.clear()
+        result = await storage.consume("k", 3, 0.001, 1)
+        return result, server.connections
+
+    result, connections = run_with_redis(scenario)
+    assert result.allowed and result.remaining == pytest.approx(1, abs=0.01)
+    assert connections == 2
+
+
+def test_redis_storage_pools_connections():
+    async def scenario(server, storage):
+        server.delay = 0.02
+        await asyncio.gather(*[storage.consume(f"k{i}", 3, 0.001, 1) for i in range(10)])
+        return server.connections, server.max_in_flight
+
+    connections, max_in_flight = run_with_redis(scenario, pool_size=4)
+    assert connections <= 4
+    assert max_in_flight > 1
+
+
+# ========================================
+# Middleware
+# ========================================
+@pytest.fixture
+def limited_app():
+    limiter = Limiter(MemoryBucketStorage(), "3/minute")
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.get("/heavy")
+    @limiter.cost(2)
+    def heavy():
+        return {"ok": True}
+
+    @app.get("/search")
+    @limiter.limit("1/minute")
+    def search():
+        return {"ok": True}
+
+    @app.get("/free")
+    @limiter.exempt
+    def free():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return TestClient(app)
+
+
+def test_middleware_sets_rate_limit_headers(limited_app):
+    response = limited_app.get("/ping")
+    assert response.status_code == 200
+    assert response.headers["x-ratelimit-limit"] == "3"
+    assert response.headers["x-ratelimit-remaining"] == "2"
+    assert response.headers["x-ratelimit-reset"] == "20"
+
+
+def test_middleware_rejects_with_retry_after(limited_app):
+    assert limited_app.get("/heavy").status_code == 200
+    assert limited_app.get("/ping").status_code == 200
+
+    response = limited_app.get("/ping")
+    assert response.status_code == 429
+    assert response.json()["type"] == "rate_limit_exceeded"
+    assert response.headers["retry-after"] == "20"
+    assert response.headers["x-ratelimit-remaining"] == "0"
+
+
+def test_middleware_skips_exempt_routes(limited_app):
+    for _ in range(5):
+        response = limited_app.get("/free")
+        assert response.status_code == 200
+        assert "x-ratelimit-limit" not in response.headers
+
+
+def test_route_quota_rejection_keeps_global_quota(limited_app):
+    assert limited_app.get("/search").status_code == 200
+    for _ in range(3):
+        assert limited_app.get("/search").status_code == 429
+
+    # Общая корзина (3/minute) потратила только один успешный /search
+    response = limited_app.get("/ping")
+    assert response.status_code == 200
+    assert response.headers["x-ratelimit-remaining"] == "1"
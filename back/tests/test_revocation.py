@@ -0,0 +1,33 @@
+"""Отзыв токенов попадает в память воркера только после commit"""
+import time
+import uuid
+
+from db.database import SessionLocal
+from utils.revocation import revocations
+
+
+def _claims(subject: int) -> dict:
+    now = time.time()
+    return {"sub": str(subject), "jti": uuid.uuid4().hex, "iat": now - 1, "exp": now + 600}
+
+
+def test_revocation_applies_after_commit(client):
+    claims = _claims(900001)
+    with SessionLocal() as db:
+        revocations.revoke_token(db, claims, "client")
+        revocations.revoke_subject(db, "client", 900001, 10)
+        assert revocations.state(claims, "client") is False
+        db.commit()
+    assert revocations.state(claims, "client") is True
+
+
+def test_rolled_back_revocation_is_forgotten(client):
+    claims = _claims(900002)
+    with SessionLocal() as db:
+        revocations.revoke_token(db, claims, "client")
+        revocations.revoke_subject(db, "client", 900002, 10)
+        db.flush()
+        db.rollback()
+        db.commit()
+    assert revocations.state(claims, "client") is False
+    assert claims["jti"] not in revocations.bloom
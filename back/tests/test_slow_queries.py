@@ -0,0 +1,40 @@
+"""Журнал медленных запросов: EXPLAIN на той БД, где выполнялся запрос"""
+import json
+import time
+
+from sqlalchemy import create_engine, text
+
+from db.slow_queries import SLOW_QUERY_LOG, SlowQueryLog
+
+
+def _read_entries(path, count: int, timeout: float = 5.0) -> list[dict]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists():
+            lines = path.read_text(encoding="utf-8").splitlines()
+            if len(lines) >= count:
+                return [json.loads(line) for line in lines]
+        time.sleep(0.05)
+    raise AssertionError(f"в {path} нет {count} записей")
+
+
+def test_explain_uses_the_engine_that_ran_the_statement(tmp_path):
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    primary, replica = create_engine(primary_url), create_engine(replica_url)
+    with replica.begin() as conn:
+        conn.execute(text("CREATE TABLE replica_only (id INTEGER PRIMARY KEY)"))
+
+    log = SlowQueryLog({primary: primary_url, replica: replica_url}, path=tmp_path / "slow.jsonl")
+    log.submit(replica, "SELECT * FROM replica_only WHERE id = ?", (1,), False, 0.8, "GET /x")
+    log.submit(primary, "SELECT * FROM replica_only WHERE id = ?", (1,), False, 0.9, "GET /y")
+
+    from_replica, from_primary = _read_entries(tmp_path / "slow.jsonl", 2)
+    assert from_replica["route"] == "GET /x"
+    assert isinstance(from_replica["plan"], list)
+    assert "error" in from_primary["plan"]
+
+
+def test_default_log_path_does_not_depend_on_cwd():
+    assert SLOW_QUERY_LOG.is_absolute()
+    assert SLOW_QUERY_LOG.parent.name == "logs"
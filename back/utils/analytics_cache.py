@@ -0,0 +1,99 @@
+"""
+Кеш аналитики транзакций по закрытым периодам
+
+Итоги периода, закончившегося больше ANALYTICS_CLOSE_GRACE секунд назад
+(периоды — в UTC, см. db/periods.py), уже не меняются: новые транзакции
+получают created_at = now() и попадают в открытый период, который всегда
+пересчитывается. Закрытые периоды хранятся LRU по (клиент, гранулярность).
+
+Вставка транзакции с явной датой в прошлом сбрасывает периоды клиента,
+в которые она попала (listener after_insert в db/models.py), — но только в
+своём воркере. В остальных такие периоды живут до ANALYTICS_CACHE_TTL
+секунд; запоздавшие коммиты покрывает задержка ANALYTICS_CLOSE_GRACE.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+from db.periods import BUCKETS, period_label, period_start
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "10000"))  # 0 — выключено
+ANALYTICS_CLOSE_GRACE = float(os.getenv("ANALYTICS_CLOSE_GRACE", "300"))
+# Сколько живёт период в кеше: предел устаревания в других воркерах
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "600"))
+
+
+class AnalyticsCache:
+    def __init__(self, maxsize: int = ANALYTICS_CACHE_SIZE, ttl: float = ANALYTICS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # (клиент, гранулярность) → метка периода → (истекает, итоги)
+        self._entries: OrderedDict[tuple[int, str], dict[str, tuple[float, dict]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, client_id: int, bucket: str, labels: list[str]) -> dict[str, dict]:
+        """Закешированные итоги из labels (отсутствующие не возвращаются)"""
+        now = time.monotonic()
+        with self._lock:
+            periods = self._entries.get((client_id, bucket))
+            found = {}
+            if periods is not None:
+                self._entries.move_to_end((client_id, bucket))
+                for label in labels:
+                    entry = periods.get(label)
+                    if entry is None:
+                        continue
+                    if entry[0] <= now:
+                        del periods[label]
+                        continue
+                    found[label] = entry[1]
+            self.hits += len(found)
+            self.misses += len(labels) - len(found)
+            return found
+
+    def put(self, client_id: int, bucket: str, closed: dict[str, dict]):
+        """Запомнить итоги закрытых периодов"""
+        if self.maxsize <= 0 or self.ttl <= 0 or not closed:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries.setdefault((client_id, bucket), {}).update(
+                (label, (expires_at, totals)) for label, totals in closed.items())
+            self._entries.move_to_end((client_id, bucket))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, client_id: int, created_at: datetime | date | None = None):
+        """Сбросить периоды клиента с датой created_at (None — все периоды клиента)"""
+        day = created_at
+        if isinstance(created_at, datetime):
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(timezone.utc)
+            day = created_at.date()
+        with self._lock:
+            for bucket in BUCKETS:
+                if day is None:
+                    self._entries.pop((client_id, bucket), None)
+                    continue
+                periods = self._entries.get((client_id, bucket))
+                if periods:
+                    periods.pop(period_label(period_start(day, bucket), bucket), None)
+
+
+analytics_cache = AnalyticsCache()
+
+
+def expose_metrics(lines: list):
+    """Попадания кеша аналитики для /metrics"""
+    lines += [
+        "# HELP analytics_cache_hits_total Периодов аналитики, взятых из кеша",
+        "# TYPE analytics_cache_hits_total counter",
+        f"analytics_cache_hits_total {analytics_cache.hits}",
+        "# HELP analytics_cache_misses_total Периодов аналитики, посчитанных в БД",
+        "# TYPE analytics_cache_misses_total counter",
+        f"analytics_cache_misses_total {analytics_cache.misses}",
+    ]
@@ -0,0 +1,63 @@
+"""
+Потоковая выгрузка строк в CSV / NDJSON со сжатием gzip
+
+Строки приходят пачками (yield_per), каждая пачка кодируется и сразу
+отдаётся клиенту: память не зависит от длины выгрузки, ответ идёт
+chunked-кодированием без Content-Length.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Не сериализуется в JSON: {type(value).__name__}")
+
+
+def encode_rows(export_format: str, fields: list[str], rows, header: bool = False) -> bytes:
+    """Пачка строк-кортежей (в порядке fields) → байты выбранного формата"""
+    if export_format == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+        buffer.write("\ufeff")
+        writer.writerow(fields)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, (date, datetime)) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """Клиент принимает gzip (и не запретил его через q=0)"""
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+async def gzip_stream(chunks):
+    """Сжимает поток байтов на лету; пустые промежуточные блоки не отправляются"""
+    compressor = zlib.compressobj(wbits=31)  # 31 — формат gzip
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,31 @@
+"""
+Нарушения уникальности → понятные ошибки API
+
+Уникальность email/телефона проверяет сама БД: эндпоинт делает одну вставку
+или обновление и разбирает IntegrityError, вместо SELECT-проверки перед
+записью (лишний запрос и гонка между проверкой и записью).
+"""
+import re
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+# SQLite: "UNIQUE constraint failed: clients.email"
+SQLITE_UNIQUE = re.compile(r"UNIQUE constraint failed: \w+\.(\w+)")
+# Postgres: "DETAIL:  Key (email)=(a@b.ru) already exists."
+POSTGRES_UNIQUE = re.compile(r"Key \((\w+)\)=")
+
+
+def unique_violation(error: IntegrityError) -> str | None:
+    """Колонка, уникальность которой нарушена, или None"""
+    message = str(error.orig)
+    match = SQLITE_UNIQUE.search(message) or POSTGRES_UNIQUE.search(message)
+    return match.group(1) if match else None
+
+
+def raise_unique_violation(error: IntegrityError, messages: dict[str, str]):
+    """400 с сообщением для нарушенной колонки; прочие ошибки пробрасываются как есть"""
+    column = unique_violation(error)
+    if column not in messages:
+        raise error
+    raise HTTPException(status_code=400, detail=messages[column]) from None
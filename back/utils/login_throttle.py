@@ -0,0 +1,202 @@
+"""
+Ограничение неудачных входов по email (до поиска пользователя и bcrypt)
+
+Скользящее окно: LOGIN_MAX_FAILURES неудач за LOGIN_FAILURE_WINDOW секунд
+блокируют email на LOGIN_LOCKOUT_BASE секунд, каждая следующая блокировка
+вдвое дольше (до LOGIN_LOCKOUT_MAX). Успешный вход сбрасывает счётчик,
+уровень блокировки забывается через LOGIN_LOCKOUT_RESET секунд без неудач.
+
+Проверка блокировки — одно чтение по первичному ключу, так что отклонённая
+попытка стоит микросекунды, а не ~250 мс bcrypt. Все обращения к хранилищу
+роутеры делают через to_thread: файл SQLite не должен блокировать event loop.
+
+Хранилище (LOGIN_THROTTLE_BACKEND):
+  sqlite — файл LOGIN_THROTTLE_PATH в WAL-режиме, общий для всех воркеров хоста;
+  memory — словарь в процессе (один воркер, тесты).
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "900"))
+LOGIN_LOCKOUT_BASE = float(os.getenv("LOGIN_LOCKOUT_BASE", "30"))
+LOGIN_LOCKOUT_MAX = float(os.getenv("LOGIN_LOCKOUT_MAX", "3600"))
+LOGIN_LOCKOUT_RESET = float(os.getenv("LOGIN_LOCKOUT_RESET", "86400"))
+
+# Раз в столько неудач удаляются записи, которые уже ничего не блокируют
+PRUNE_EVERY = 1000
+
+LOGIN_THROTTLE_BACKEND = os.getenv("LOGIN_THROTTLE_BACKEND", "sqlite")
+LOGIN_THROTTLE_PATH = os.getenv(
+    "LOGIN_THROTTLE_PATH", os.path.join(tempfile.gettempdir(), "nextbank-login-throttle.sqlite3"))
+
+
+def next_state(state: dict | None, now: float) -> dict:
+    """Состояние после ещё одной неудачи: окно неудач, уровень и срок блокировки"""
+    if state is None or now - state["updated_at"] > LOGIN_LOCKOUT_RESET:
+        state = {"failures": [], "level": 0, "locked_until": 0.0}
+
+    failures = [t for t in state["failures"] if now - t < LOGIN_FAILURE_WINDOW]
+    failures.append(now)
+    level = state["level"]
+    locked_until = state["locked_until"]
+
+    if len(failures) >= LOGIN_MAX_FAILURES:
+        locked_until = now + min(LOGIN_LOCKOUT_BASE * 2 ** level, LOGIN_LOCKOUT_MAX)
+        level += 1
+        failures = []
+
+    return {"failures": failures, "level": level, "locked_until": locked_until, "updated_at": now}
+
+
+def is_stale(level: int, updated_at: float, now: float) -> bool:
+    """Запись равна отсутствующей: неудачи вне окна и без блокировок или уровень забыт"""
+    if now - updated_at > LOGIN_LOCKOUT_RESET:
+        return True
+    return level == 0 and now - updated_at >= LOGIN_FAILURE_WINDOW
+
+
+class MemoryThrottleStore:
+    def __init__(self):
+        self._states: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._operations = 0
+
+    def locked_until(self, key: str) -> float:
+        state = self._states.get(key)
+        return state["locked_until"] if state else 0.0
+
+    def record_failure(self, key: str, now: float) -> dict:
+        with self._lock:
+            state = self._states[key] = next_state(self._states.get(key), now)
+            self._operations += 1
+            if self._operations % PRUNE_EVERY == 0:
+                # Перебор случайных email не должен копить записи навсегда
+                self._states = {k: v for k, v in self._states.items()
+                                if not is_stale(v["level"], v["updated_at"], now)}
+            return state
+
+    def reset(self, key: str):
+        with self._lock:
+            self._states.pop(key, None)
+
+
+class SQLiteThrottleStore:
+    """Счётчики в отдельном файле SQLite: общие для воркеров, без сетевых запросов"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._operations = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS login_failures ("
+                " key TEXT PRIMARY KEY, failures TEXT NOT NULL, level INTEGER NOT NULL,"
+                " locked_until REAL NOT NULL, updated_at REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def locked_until(self, key: str) -> float:
+        row = self._conn().execute(
+            "SELECT locked_until FROM login_failures WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def record_failure(self, key: str, now: float) -> dict:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT failures, level, locked_until, updated_at FROM login_failures WHERE key = ?",
+                (key,)).fetchone()
+            previous = None
+            if row:
+                previous = {"failures": json.loads(row[0]), "level": row[1],
+                            "locked_until": row[2], "updated_at": row[3]}
+            state = next_state(previous, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO login_failures (key, failures, level, locked_until, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(state["failures"]), state["level"], state["locked_until"], now))
+            self._operations += 1
+            if self._operations % PRUNE_EVERY == 0:
+                # Условие is_stale одним DELETE
+                conn.execute(
+                    "DELETE FROM login_failures WHERE updated_at < ? OR (level = 0 AND updated_at <= ?)",
+                    (now - LOGIN_LOCKOUT_RESET, now - LOGIN_FAILURE_WINDOW))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return state
+
+    def reset(self, key: str):
+        self._conn().execute("DELETE FROM login_failures WHERE key = ?", (key,))
+
+
+class LoginThrottle:
+    def __init__(self, store):
+        self.store = store
+        self.rejected = 0
+
+    @staticmethod
+    def key(kind: str, email: str) -> str:
+        return f"{kind}:{email.strip().lower()}"
+
+    def retry_after(self, key: str) -> int:
+        """Секунд до конца блокировки (0 — вход разрешён)"""
+        remaining = self.store.locked_until(key) - time.time()
+        if remaining <= 0:
+            return 0
+        self.rejected += 1
+        return int(remaining) + 1
+
+    def ensure_allowed(self, key: str):
+        """429 с Retry-After, если email заблокирован"""
+        retry_after = self.retry_after(key)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail=f'Слишком много неудачных попыток входа. Повторите через {retry_after} с',
+                headers={'Retry-After': str(retry_after)}
+            )
+
+    def record_failure(self, key: str):
+        self.store.record_failure(key, time.time())
+
+    def record_success(self, key: str):
+        self.store.reset(key)
+
+
+def create_store():
+    if LOGIN_THROTTLE_BACKEND == "memory":
+        return MemoryThrottleStore()
+    if LOGIN_THROTTLE_BACKEND == "sqlite":
+        return SQLiteThrottleStore(LOGIN_THROTTLE_PATH)
+    raise ValueError(f"Неизвестный LOGIN_THROTTLE_BACKEND: {LOGIN_THROTTLE_BACKEND}")
+
+
+login_throttle = LoginThrottle(create_store())
+
+
+def expose_metrics(lines: list):
+    """Счётчик отклонённых логинов для /metrics"""
+    lines += [
+        "# HELP login_throttle_rejected_total Логинов, отклонённых блокировкой email",
+        "# TYPE login_throttle_rejected_total counter",
+        f"login_throttle_rejected_total {login_throttle.rejected}",
+    ]
@@ -0,0 +1,166 @@
+"""
+Метрики HTTP-запросов в формате Prometheus
+
+Серии заводятся один раз на пару (метод, шаблон маршрута): /cards/{card_id}/deposit —
+одна серия, а не по серии на каждый id. Бакеты гистограмм выделены заранее,
+на горячем пути только инкременты счётчиков.
+
+Метрики считаются в пределах процесса: при нескольких воркерах uvicorn
+каждый отдаёт свои.
+"""
+import time
+from bisect import bisect_left
+
+from db.instrumentation import QueryStats, current_query_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами (счётчики не кумулятивные)"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последний — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def expose(self, name: str, labels: str, lines: list):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+
+
+class RouteMetrics:
+    """Все серии одного маршрута"""
+
+    __slots__ = ("labels", "statuses", "latency", "db_time", "db_queries", "response_bytes")
+
+    def __init__(self, method: str, route: str):
+        # Строка меток собирается один раз, а не на каждый запрос
+        route = route.replace("\\", "\\\\").replace('"', '\\"')
+        self.labels = f'method="{method}",route="{route}"'
+        self.statuses: dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.db_queries = 0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+        self.in_flight = 0
+        # Дополнительные источники метрик: функции, дописывающие строки в lines
+        self.collectors: list = []
+
+    def route(self, method: str, route: str) -> RouteMetrics:
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics(method, route)
+        return metrics
+
+    def expose(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Запросы в обработке",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Обработанные запросы",
+            "# TYPE http_requests_total counter",
+        ]
+        routes = list(self.routes.values())
+        for metrics in routes:
+            for status, count in metrics.statuses.items():
+                lines.append(f'http_requests_total{{{metrics.labels},status="{status}"}} {count}')
+
+        lines += [
+            "# HELP http_request_duration_seconds Время обработки запроса",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for metrics in routes:
+            metrics.latency.expose("http_request_duration_seconds", metrics.labels, lines)
+
+        lines += [
+            "# HELP http_request_db_seconds Время в БД за запрос",
+            "# TYPE http_request_db_seconds histogram",
+        ]
+        for metrics in routes:
+            metrics.db_time.expose("http_request_db_seconds", metrics.labels, lines)
+
+        lines += [
+            "# HELP http_request_db_queries_total SQL-запросы",
+            "# TYPE http_request_db_queries_total counter",
+        ]
+        for metrics in routes:
+            lines.append(f"http_request_db_queries_total{{{metrics.labels}}} {metrics.db_queries}")
+
+        lines += [
+            "# HELP http_response_size_bytes_total Отдано байт в теле ответа",
+            "# TYPE http_response_size_bytes_total counter",
+        ]
+        for metrics in routes:
+            lines.append(f"http_response_size_bytes_total{{{metrics.labels}}} {metrics.response_bytes}")
+
+        for collector in self.collectors:
+            collector(lines)
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: счётчики, in-flight, задержка, размер ответа и время в БД"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        query_stats = QueryStats(scope=scope)
+        token = current_query_stats.set(query_stats)
+        registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.in_flight -= 1
+            current_query_stats.reset(token)
+
+            # Шаблон маршрута роутер кладёт в scope после сопоставления
+            route = scope.get("route")
+            metrics = registry.route(scope["method"], route.path if route is not None else UNMATCHED_ROUTE)
+            metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+            metrics.latency.observe(elapsed)
+            metrics.db_time.observe(query_stats.duration)
+            metrics.db_queries += query_stats.count
+            metrics.response_bytes += response_bytes
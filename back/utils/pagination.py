@@ -0,0 +1,58 @@
+"""
+Курсорная (keyset) пагинация по (created_at, id)
+
+Курсор — непрозрачная строка base64url с created_at и id последней строки
+страницы. Следующая страница — строки строго «раньше» неё в порядке
+ORDER BY created_at DESC, id DESC. Запрос идёт по индексу и не зависит от
+глубины, одинаковые created_at не дают пропусков и дублей.
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_
+
+# Больше строк лента за один запрос не отдаёт — дальше курсором
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор пагинации")
+
+
+def keyset_after(model, cursor: str, *scope):
+    """Условие «после курсора» для ORDER BY created_at DESC, id DESC
+
+    created_at берётся из самой строки-курсора, если она ещё есть: SQLite
+    хранит даты строками в разных форматах, и сравнение с параметром
+    разошлось бы с ORDER BY. Значение из курсора — запасное (строку удалили
+    или перенесли в архив); на Postgres оно точное, на SQLite строки той же
+    секунды, записанные через CURRENT_TIMESTAMP, могут повториться.
+    """
+    created_at, row_id = decode_cursor(cursor)
+    anchor = (
+        select(model.created_at)
+        .where(model.id == row_id, *scope)
+        .scalar_subquery()
+    )
+    return tuple_(model.created_at, model.id) < tuple_(func.coalesce(anchor, created_at), row_id)
+
+
+def next_cursor(rows: list, limit: int) -> str | None:
+    """Курсор следующей страницы; rows выбраны с limit + 1, лишняя строка отрезается"""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
@@ -0,0 +1,51 @@
+"""
+Хеширование и проверка паролей (bcrypt)
+
+bcrypt намеренно медленный, поэтому в эндпоинтах он выполняется в отдельном
+ограниченном пуле потоков (PASSWORD_HASH_WORKERS), а не в общем threadpool:
+всплеск логинов ждёт своей очереди и не мешает остальным запросам.
+Библиотека bcrypt отпускает GIL, поэтому потоков достаточно.
+
+Стоимость задаётся BCRYPT_ROUNDS. Хеши с другой стоимостью пересчитываются
+при успешном логине (verify_and_update_async).
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-worker")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_pass: str, hashed_pass: str) -> bool:
+    return pwd_context.verify(plain_pass, hashed_pass)
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password_async(plain_pass: str, hashed_pass: str) -> bool:
+    return await _run(pwd_context.verify, plain_pass, hashed_pass)
+
+
+async def verify_and_update_async(plain_pass: str, hashed_pass: str) -> tuple[bool, str | None]:
+    """(пароль верный, новый хеш — если старый нужно пересчитать, иначе None)"""
+    return await _run(pwd_context.verify_and_update, plain_pass, hashed_pass)
@@ -0,0 +1,77 @@
+"""
+Версии прав сотрудников для проверки access-токенов без обращения к БД
+
+В access-токене сотрудника лежат роль, отделение и permission_version (pv).
+Смена роли/отделения/активности увеличивает employees.permission_version,
+и токены со старой pv перестают приниматься — клиент идёт в /admin/auth/refresh.
+
+Таблица сотрудников маленькая, поэтому каждый воркер держит в памяти всю
+карту id → (pv, is_active) и перечитывает её раз в PERMISSION_VERSION_REFRESH
+секунд одним запросом. Внеочередное перечитывание — если встретился токен,
+которого карта ещё не знает (новый сотрудник или pv из соседнего воркера);
+чаще раза в секунду вместо всей карты читается одна строка.
+"""
+import os
+import time
+
+from sqlalchemy import select
+
+from db import models
+
+PERMISSION_VERSION_REFRESH = float(os.getenv("PERMISSION_VERSION_REFRESH", "5"))
+# Не чаще раза в секунду на внеочередные перечитывания
+FORCED_RELOAD_INTERVAL = 1.0
+
+
+class PermissionVersions:
+    def __init__(self, refresh_interval: float = PERMISSION_VERSION_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.versions: dict[int, tuple[int, bool]] = {}
+        self.loads = 0
+        self._loaded_at = float("-inf")
+
+    async def get(self, employee_id: int, token_version: int) -> tuple[int, bool] | None:
+        """(актуальная pv, is_active) сотрудника или None, если его нет"""
+        now = time.monotonic()
+        if now - self._loaded_at >= self.refresh_interval:
+            await self._load(now)
+        else:
+            known = self.versions.get(employee_id)
+            if known is None or known[0] < token_version:
+                if now - self._loaded_at >= FORCED_RELOAD_INTERVAL:
+                    await self._load(now)
+                else:
+                    # Карта только что перечитана — догружаем одного сотрудника по ключу
+                    await self._load_one(employee_id)
+        return self.versions.get(employee_id)
+
+    def invalidate(self):
+        """Перечитать карту при следующей проверке (после изменения прав в этом воркере)"""
+        self._loaded_at = float("-inf")
+
+    async def _load(self, now: float):
+        from db.database import async_engine
+
+        # Отметка до запроса: параллельные проверки не перечитывают карту повторно
+        self._loaded_at = now
+        async with async_engine.connect() as conn:
+            rows = await conn.execute(select(
+                models.Employee.id, models.Employee.permission_version, models.Employee.is_active))
+            self.versions = {row.id: (row.permission_version, bool(row.is_active)) for row in rows}
+        self.loads += 1
+
+    async def _load_one(self, employee_id: int):
+        from db.database import async_engine
+
+        async with async_engine.connect() as conn:
+            row = (await conn.execute(
+                select(models.Employee.permission_version, models.Employee.is_active)
+                .where(models.Employee.id == employee_id)
+            )).first()
+        if row is None:
+            self.versions.pop(employee_id, None)
+        else:
+            self.versions[employee_id] = (row.permission_version, bool(row.is_active))
+
+
+permission_versions = PermissionVersions()
@@ -0,0 +1,143 @@
+"""
+Кеш аутентифицированных пользователей (клиентов и сотрудников)
+
+get_current_user / get_current_employee на каждый запрос проверяли JWT и
+читали пользователя из БД. Кеш хранит по токену снимок колонок пользователя
+(и связей personal_info / role / branch) на PRINCIPAL_CACHE_TTL секунд, но не
+дольше срока жизни токена. При попадании объект собирается из снимка и
+подключается к сессии запроса без SELECT, так что эндпоинты могут менять его
+и коммитить как раньше.
+
+Эндпоинты, меняющие пользователя, вызывают invalidate(id) после commit, а в
+той же транзакции — revocations.announce_change (или revoke_subject): остальные
+воркеры сбрасывают записи пользователя при опросе token_revocations
+(utils.revocation). Принятое ограничение: до REVOCATION_REFRESH секунд (по
+умолчанию 2) другой воркер ещё может отдать старый снимок — прежние имя,
+email или телефон. Права при этом не затронуты: отзыв и permission_version
+проверяются независимо от кеша.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # 0 — выключено
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+def snapshot(obj, *relationships: str) -> tuple:
+    """Колонки объекта и указанных связей (без привязки к сессии)"""
+    columns = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+    related = {}
+    for name in relationships:
+        value = getattr(obj, name)
+        related[name] = snapshot(value) if value is not None else None
+    return type(obj), columns, related
+
+
+def restore(snap: tuple):
+    """Новый detached-объект из снимка: без истории изменений, как после загрузки"""
+    cls, columns, related = snap
+    obj = cls(**columns)
+    make_transient_to_detached(obj)
+    for name, value in related.items():
+        # Без событий backref — иначе role.employees «загрузится» одним сотрудником
+        set_committed_value(obj, name, restore(value) if value is not None else None)
+    return obj
+
+
+class PrincipalCache:
+    """LRU-кеш с TTL: токен → снимок пользователя, плюс индекс id → токены"""
+
+    def __init__(self, name: str, ttl: float = PRINCIPAL_CACHE_TTL, maxsize: int = PRINCIPAL_CACHE_SIZE):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple] = OrderedDict()  # token → (expires_at, subject, snap)
+        self._by_subject: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, token: str):
+        """Снимок пользователя по токену или None"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, subject, snap = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return snap
+
+    def put(self, token: str, subject: int, snap: tuple, token_expires_at: float | None = None):
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (expires_at, subject, snap)
+            self._by_subject.setdefault(subject, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, subject: int):
+        """Сбросить все записи пользователя (после изменения его данных)"""
+        with self._lock:
+            for token in self._by_subject.pop(subject, ()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_subject.clear()
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._by_subject.get(entry[1])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_subject[entry[1]]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+client_cache = PrincipalCache("client")
+employee_cache = PrincipalCache("employee")
+
+
+def expose_metrics(lines: list):
+    """Счётчики кешей для /metrics"""
+    caches = (client_cache, employee_cache)
+    lines += [
+        "# HELP principal_cache_hits_total Попадания в кеш пользователей",
+        "# TYPE principal_cache_hits_total counter",
+    ]
+    lines += [f'principal_cache_hits_total{{cache="{c.name}"}} {c.hits}' for c in caches]
+    lines += [
+        "# HELP principal_cache_misses_total Промахи кеша пользователей",
+        "# TYPE principal_cache_misses_total counter",
+    ]
+    lines += [f'principal_cache_misses_total{{cache="{c.name}"}} {c.misses}' for c in caches]
+    lines += [
+        "# HELP principal_cache_entries Записей в кеше пользователей",
+        "# TYPE principal_cache_entries gauge",
+    ]
+    lines += [f'principal_cache_entries{{cache="{c.name}"}} {len(c._entries)}' for c in caches]
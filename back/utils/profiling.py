@@ -0,0 +1,240 @@
+"""
+Профилирование отдельного запроса по требованию
+
+SuperAdmin отправляет запрос с заголовком `X-Profile: 1` — запрос выполняется
+под сэмплирующим профилировщиком, результат (collapsed stacks для flamegraph
+и top-N функций) сохраняется в PROFILE_DIR, а его id возвращается в заголовке
+X-Profile-Id. Забрать профиль: GET /admin/profiles/{id}.
+
+Без заголовка middleware только проверяет его наличие и передаёт запрос дальше.
+
+Сэмплер снимает стеки потока event loop (только пока в стеке есть этот запрос)
+и потоков threadpool, выполняющих код приложения. Sync-эндпоинты соседних
+запросов под нагрузкой тоже могут попасть в выборку.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from anyio import to_thread
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+# Относительный путь — от папки back, как у журнала медленных запросов
+PROFILE_DIR = Path(__file__).resolve().parent.parent / os.getenv("PROFILE_DIR", "logs/profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))  # сколько последних профилей хранить
+PROFILE_TOP = 30
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+APP_DIR = str(Path(__file__).resolve().parent.parent)
+WORKER_THREAD_NAME = "AnyIO worker thread"
+
+
+def frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        filename = filename[len(APP_DIR) + 1:]
+    else:
+        filename = "/".join(Path(filename).parts[-2:])
+    return f"{filename}:{code.co_name}"
+
+
+class Sampler(threading.Thread):
+    """Раз в interval снимает стеки потоков, относящихся к запросу"""
+
+    def __init__(self, loop_thread: int, request_frame, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop_thread = loop_thread
+        self.request_frame = request_frame
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            workers = {t.ident for t in threading.enumerate() if t.name == WORKER_THREAD_NAME}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.loop_thread and thread_id not in workers:
+                    continue
+                stack = self._collect(thread_id, frame)
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def _collect(self, thread_id: int, frame) -> tuple | None:
+        codes = []
+        ours = False
+        in_app = False
+        while frame is not None:
+            if frame is self.request_frame:
+                ours = True
+            code = frame.f_code
+            if code.co_filename.startswith(APP_DIR):
+                in_app = True
+            codes.append(code)
+            frame = frame.f_back
+
+        # В event loop — только пока выполняется этот запрос,
+        # в threadpool — только потоки, занятые кодом приложения
+        if thread_id == self.loop_thread and not ours:
+            return None
+        if thread_id != self.loop_thread and not in_app:
+            return None
+        return tuple(reversed(codes))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def build_profile(sampler: Sampler, interval_ms: float) -> dict:
+    self_samples: Counter = Counter()
+    total_samples: Counter = Counter()
+    collapsed = []
+    for stack, count in sampler.stacks.most_common():
+        labels = [frame_label(code) for code in stack]
+        collapsed.append(f"{';'.join(labels)} {count}")
+        self_samples[labels[-1]] += count
+        for label in set(labels):
+            total_samples[label] += count
+
+    top = [
+        {
+            "function": label,
+            "self_ms": round(self_samples[label] * interval_ms, 2),
+            "total_ms": round(count * interval_ms, 2),
+            "samples": count,
+        }
+        for label, count in total_samples.most_common()
+    ]
+    top.sort(key=lambda row: (row["self_ms"], row["total_ms"]), reverse=True)
+
+    return {
+        "samples": sampler.samples,
+        "interval_ms": interval_ms,
+        "sampled_ms": round(sum(sampler.stacks.values()) * interval_ms, 2),
+        "top": top[:PROFILE_TOP],
+        "collapsed": "\n".join(collapsed),
+    }
+
+
+# ========================================
+# Хранилище профилей (файлы — доступны из любого воркера)
+# ========================================
+def save_profile(profile: dict):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    (PROFILE_DIR / f"{profile['id']}.json").write_text(
+        json.dumps(profile, ensure_ascii=False), encoding="utf-8")
+
+    files = sorted(PROFILE_DIR.glob("*.json"), key=lambda f: f.stat().st_mtime, reverse=True)
+    for old in files[PROFILE_KEEP:]:
+        old.unlink(missing_ok=True)
+
+
+def load_profile(profile_id: str) -> dict | None:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = PROFILE_DIR / f"{profile_id}.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def list_profiles() -> list[dict]:
+    if not PROFILE_DIR.exists():
+        return []
+    files = sorted(PROFILE_DIR.glob("*.json"), key=lambda f: f.stat().st_mtime, reverse=True)
+    summaries = []
+    for file in files:
+        profile = json.loads(file.read_text(encoding="utf-8"))
+        summaries.append({
+            key: profile[key]
+            for key in ("id", "created_at", "employee_id", "method", "path", "route", "status", "duration_ms")
+        })
+    return summaries
+
+
+async def profiling_employee(token: str) -> int | None:
+    """id сотрудника-SuperAdmin по access-токену или None"""
+    from routers.employee_auth import check_superadmin, get_current_employee
+
+    try:
+        claims = await get_current_employee(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        check_superadmin(claims)
+    except HTTPException:
+        return None
+    return claims.id
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос при `X-Profile: 1` от SuperAdmin"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile_requested = False
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                profile_requested = value == b"1"
+            elif name == b"authorization":
+                authorization = value
+        if not profile_requested or authorization is None:
+            return await self.app(scope, receive, send)
+
+        scheme, _, token = authorization.decode("latin-1").partition(" ")
+        employee_id = None
+        if scheme.lower() == "bearer" and token:
+            employee_id = await profiling_employee(token)
+        if employee_id is None:
+            return await self.app(scope, receive, send)
+
+        await self._profile(scope, receive, send, employee_id)
+
+    async def _profile(self, scope, receive, send, employee_id: int):
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [
+                    *message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        interval_ms = PROFILE_INTERVAL_MS
+        sampler = Sampler(threading.get_ident(), sys._getframe(), interval_ms / 1000)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - started
+            route = scope.get("route")
+            profile = {
+                "id": profile_id,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "employee_id": employee_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route.path if route is not None else None,
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 2),
+                **build_profile(sampler, interval_ms),
+            }
+            await to_thread.run_sync(save_profile, profile)
@@ -0,0 +1,351 @@
+"""
+Хранилища token bucket для rate limiter
+
+У каждого ключа (клиент/IP) есть корзина ёмкостью capacity, которая
+пополняется со скоростью rate токенов в секунду. Запрос забирает cost
+токенов; если их не хватает — отклоняется, и известно, через сколько
+секунд токенов станет достаточно.
+
+Бэкенды (RATE_LIMIT_STORAGE):
+  sqlite  — файл в /dev/shm (или во временной папке) в WAL-режиме: общий
+            счётчик для всех воркеров одного хоста, без отдельного сервиса;
+  memory  — словарь в процессе (один воркер, тесты);
+  redis://host:port/db — Redis (или совместимый сервер) для нескольких
+            хостов. Корзина обновляется атомарно Lua-скриптом.
+
+Если хранилище недоступно, запрос пропускается (fail open) — rate limiter
+не должен класть API вместе с собой. Занятый другим воркером файл SQLite —
+не отказ: ждём RATE_LIMIT_SQLITE_TIMEOUT и повторяем транзакцию.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "sqlite")
+RATE_LIMIT_SQLITE_PATH = os.getenv(
+    "RATE_LIMIT_SQLITE_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+                 "nextbank-ratelimit.sqlite3"))
+RATE_LIMIT_SQLITE_TIMEOUT = float(os.getenv("RATE_LIMIT_SQLITE_TIMEOUT", "2"))
+RATE_LIMIT_SQLITE_RETRIES = int(os.getenv("RATE_LIMIT_SQLITE_RETRIES", "3"))
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.5"))
+RATE_LIMIT_REDIS_POOL_SIZE = int(os.getenv("RATE_LIMIT_REDIS_POOL_SIZE", "8"))
+# Раз в столько операций из локальных хранилищ удаляются полные корзины
+PRUNE_EVERY = 1000
+
+
+@dataclass(frozen=True)
+class BucketResult:
+    allowed: bool
+    remaining: float
+    retry_after: float  # секунд до нужного количества токенов (0 — разрешён)
+
+
+def take(tokens: float | None, updated_at: float | None, now: float,
+         capacity: float, rate: float, cost: float) -> tuple[float, BucketResult]:
+    """Пополнить корзину на прошедшее время и попытаться забрать cost токенов"""
+    if tokens is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+    if tokens >= cost:
+        tokens -= cost
+        return tokens, BucketResult(True, tokens, 0.0)
+    return tokens, BucketResult(False, tokens, (cost - tokens) / rate)
+
+
+# ========================================
+# В памяти процесса
+# ========================================
+class MemoryBucketStorage:
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._operations = 0
+
+    async def consume(self, key: str, capacity: float, rate: float, cost: float) -> BucketResult:
+        now = time.time()
+        tokens, updated_at = self._buckets.get(key, (None, None))
+        tokens, result = take(tokens, updated_at, now, capacity, rate, cost)
+        self._buckets[key] = (tokens, now)
+
+        self._operations += 1
+        if self._operations % PRUNE_EVERY == 0:
+            # Корзина, простоявшая дольше полного пополнения, равна новой
+            idle = capacity / rate
+            self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < idle}
+        return result
+
+    async def close(self):
+        pass
+
+
+# ========================================
+# SQLite: общий файл воркеров одного хоста
+# ========================================
+class SQLiteBucketStorage:
+    """
+    Все операции — в одном выделенном потоке: event loop не ждёт блокировку
+    файла, а соединение sqlite3 живёт в том потоке, который его создал.
+    """
+
+    def __init__(self, path: str, timeout: float = RATE_LIMIT_SQLITE_TIMEOUT,
+                 retries: int = RATE_LIMIT_SQLITE_RETRIES):
+        self.path = path
+        self.timeout = timeout
+        self.retries = retries
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratelimit-sqlite")
+        self._connection: sqlite3.Connection | None = None
+        self._operations = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # timeout — busy timeout: под нагрузкой воркеры ждут друг друга, а не пропускают запрос
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+            self._connection = conn
+        return self._connection
+
+    @staticmethod
+    def _is_busy(error: sqlite3.OperationalError) -> bool:
+        return "locked" in str(error) or "busy" in str(error)
+
+    def _consume(self, key: str, capacity: float, rate: float, cost: float) -> BucketResult:
+        """Транзакция с повтором: SQLITE_BUSY — конкуренция воркеров, а не недоступность"""
+        for attempt in range(self.retries + 1):
+            try:
+                return self._consume_once(key, capacity, rate, cost)
+            except sqlite3.OperationalError as e:
+                # Часть BUSY (смена журнала, восстановление WAL) возвращается без busy timeout
+                if not self._is_busy(e) or attempt == self.retries:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+
+    def _consume_once(self, key: str, capacity: float, rate: float, cost: float) -> BucketResult:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, result = take(row[0] if row else None, row[1] if row else None,
+                                  now, capacity, rate, cost)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now))
+            self._operations += 1
+            if self._operations % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - capacity / rate,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def consume(self, key: str, capacity: float, rate: float, cost: float) -> BucketResult:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._consume, key, capacity, rate, cost)
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+
+
+# ========================================
+# Redis (протокол RESP)
+# ========================================
+class RedisError(Exception):
+    pass
+
+
+class RespConnection:
+    """Минимальный асинхронный клиент RESP2: одна команда за раз на соединение (см. RespPool)"""
+
+    def __init__(self, url: str, timeout: float):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Соединение с Redis закрыто")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise RedisError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Неизвестный ответ Redis: {line!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._call("AUTH", self.password)
+        if self.db:
+            await self._call("SELECT", self.db)
+
+    async def _call(self, *args):
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def execute(self, *args):
+        if self._writer is None:
+            try:
+                await asyncio.wait_for(self._connect(), self.timeout)
+            except BaseException:
+                await self.close()
+                raise
+        try:
+            return await asyncio.wait_for(self._call(*args), self.timeout)
+        except RedisError:
+            raise
+        except BaseException:
+            # Ответ не дочитан — соединение больше не годится
+            await self.close()
+            raise
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+
+class RespPool:
+    """
+    До size соединений: параллельные запросы не ждут друг друга на одном сокете.
+    Свободные соединения переиспользуются; сломанное закрывается и не возвращается.
+    """
+
+    def __init__(self, url: str, timeout: float, size: int):
+        self.url = url
+        self.timeout = timeout
+        self._idle: list[RespConnection] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def execute(self, *args):
+        async with self._slots:
+            reused = bool(self._idle)
+            connection = self._idle.pop() if reused else RespConnection(self.url, self.timeout)
+            while True:
+                try:
+                    result = await connection.execute(*args)
+                except ConnectionError:
+                    if not reused:
+                        raise
+                    # Сервер закрыл простаивавшее соединение — команда до него не дошла
+                    reused = False
+                    connection = RespConnection(self.url, self.timeout)
+                    continue
+                except RedisError:
+                    # Ошибка команды, а не соединения — оно исправно
+                    self._idle.append(connection)
+                    raise
+                self._idle.append(connection)
+                return result
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await connection.close()
+
+
+# KEYS[1] — корзина; ARGV: capacity, rate, cost, now. Возвращает {разрешён, токены}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = capacity
+else
+  tokens = math.min(capacity, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', ARGV[4])
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStorage:
+    def __init__(self, url: str, timeout: float = RATE_LIMIT_REDIS_TIMEOUT,
+                 pool_size: int = RATE_LIMIT_REDIS_POOL_SIZE):
+        self.pool = RespPool(url, timeout, pool_size)
+        self._sha: str | None = None
+
+    async def consume(self, key: str, capacity: float, rate: float, cost: float) -> BucketResult:
+        args = (1, f"ratelimit:{key}", capacity, rate, cost, repr(time.time()))
+        if self._sha is None:
+            self._sha = (await self.pool.execute("SCRIPT", "LOAD", TOKEN_BUCKET_SCRIPT)).decode()
+        try:
+            allowed, tokens = await self.pool.execute("EVALSHA", self._sha, *args)
+        except RedisError as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+            # Скрипт пропал из кэша (перезапуск Redis) — выполняем с текстом
+            allowed, tokens = await self.pool.execute("EVAL", TOKEN_BUCKET_SCRIPT, *args)
+
+        tokens = float(tokens)
+        if allowed:
+            return BucketResult(True, tokens, 0.0)
+        return BucketResult(False, tokens, (cost - tokens) / rate)
+
+    async def close(self):
+        await self.pool.close()
+
+
+def create_storage(backend: str = RATE_LIMIT_STORAGE):
+    if backend == "memory":
+        return MemoryBucketStorage()
+    if backend == "sqlite":
+        return SQLiteBucketStorage(RATE_LIMIT_SQLITE_PATH)
+    if backend.startswith("redis://"):
+        return RedisBucketStorage(backend)
+    raise ValueError(f"Неизвестный RATE_LIMIT_STORAGE: {backend}")
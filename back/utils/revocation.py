@@ -0,0 +1,257 @@
+"""
+Отзыв JWT: по jti (один токен) и по субъекту (все токены, выданные до отметки)
+
+Записи лежат в token_revocations. Каждый воркер раз в REVOCATION_REFRESH
+секунд дочитывает новые строки и держит в памяти:
+  - карту (тип, id) → not_before — токен с iat раньше отметки отозван;
+  - Bloom-фильтр отозванных jti.
+
+Обычный, не отозванный токен проверяется без обращения к БД: jti нет в
+фильтре. Только при срабатывании фильтра (отозван или ложное срабатывание)
+jti сверяется с таблицей. Отзыв в одном воркере виден остальным через
+REVOCATION_REFRESH секунд, в самом воркере — сразу.
+
+Тот же опрос сбрасывает кеш пользователей (utils.principal_cache) в остальных
+воркерах: любая строка на субъекта целиком (not_before) вычищает его записи,
+а строка без jti и not_before (announce_change) ничего не отзывает и нужна
+только для этого — после изменения профиля, email или телефона.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import delete, event, exists, select
+from sqlalchemy.orm import Session
+
+from db import models
+from utils.principal_cache import PRINCIPAL_CACHE_TTL, client_cache, employee_cache
+
+REVOCATION_REFRESH = float(os.getenv("REVOCATION_REFRESH", "2"))
+# Полная перезагрузка: Bloom-фильтр пересобирается без истёкших jti
+REVOCATION_FULL_RELOAD = float(os.getenv("REVOCATION_FULL_RELOAD", "3600"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+# Id на Postgres выдаются до коммита, и строки могут стать видимы не по порядку —
+# перечитываем хвост с запасом (повторное применение безвредно)
+POLL_OVERLAP = 100
+
+PRINCIPAL_CACHES = {"client": client_cache, "employee": employee_cache}
+
+
+class BloomFilter:
+    """Множество без ложноотрицательных ответов: «точно нет» или «возможно да»"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    def __init__(self):
+        self.watermarks: dict[tuple[str, int], float] = {}
+        self.bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self.last_id = 0
+        self.checks = 0
+        self.bloom_positives = 0
+        self.rejected = 0
+        self._full_reload_at = 0.0
+        # id строк, по которым кеш уже сброшен: хвост перечитывается с запасом
+        self._evicted_ids: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    # ---------- проверка ----------
+    def state(self, claims: dict, subject_type: str) -> bool | None:
+        """True — отозван, False — нет, None — Bloom-фильтр сработал, нужна сверка с БД"""
+        self.checks += 1
+        not_before = self.watermarks.get((subject_type, int(claims["sub"])))
+        if not_before is not None and claims.get("iat", 0) < not_before:
+            return True
+        jti = claims.get("jti")
+        if jti is None or jti not in self.bloom:
+            return False
+        self.bloom_positives += 1
+        return None
+
+    @staticmethod
+    def _jti_query(jti: str):
+        return select(exists().where(models.TokenRevocation.jti == jti))
+
+    def ensure_valid(self, db: Session, claims: dict, subject_type: str):
+        """401, если токен отозван (sync-вариант, сверка через сессию запроса)"""
+        revoked = self.state(claims, subject_type)
+        if revoked is None:
+            revoked = db.execute(self._jti_query(claims["jti"])).scalar()
+        self._reject_if(revoked)
+
+    async def ensure_valid_async(self, claims: dict, subject_type: str):
+        revoked = self.state(claims, subject_type)
+        if revoked is None:
+            from db.database import async_engine
+            async with async_engine.connect() as conn:
+                revoked = (await conn.execute(self._jti_query(claims["jti"]))).scalar()
+        self._reject_if(revoked)
+
+    def _reject_if(self, revoked: bool):
+        if revoked:
+            self.rejected += 1
+            raise HTTPException(status_code=401, detail='Токен отозван')
+
+    # ---------- отзыв ----------
+    # В памяти воркера отзыв применяется только после commit вызывающего:
+    # при неудачном commit воркер не должен отклонять токены, которые БД
+    # и остальные воркеры считают действующими
+    def revoke_token(self, db, claims: dict, subject_type: str):
+        """Отозвать один токен (строка коммитится вместе с транзакцией вызывающего)"""
+        if claims.get("jti") is None:
+            return
+        db.add(models.TokenRevocation(
+            subject_type=subject_type, subject_id=int(claims["sub"]),
+            jti=claims["jti"], expires_at=float(claims["exp"]),
+        ))
+        jti = claims["jti"]
+        _after_commit(db, lambda: self.bloom.add(jti))
+
+    def revoke_subject(self, db, subject_type: str, subject_id: int, token_lifetime_minutes: int) -> float:
+        """Отозвать все токены субъекта, выданные до текущего момента; возвращает отметку"""
+        not_before = time.time()
+        db.add(models.TokenRevocation(
+            subject_type=subject_type, subject_id=subject_id,
+            not_before=not_before, expires_at=not_before + token_lifetime_minutes * 60,
+        ))
+        _after_commit(db, lambda: self._apply_watermark(subject_type, subject_id, not_before))
+        return not_before
+
+    def announce_change(self, db, subject_type: str, subject_id: int):
+        """Данные субъекта изменились: остальные воркеры сбросят его записи в кеше пользователей"""
+        if PRINCIPAL_CACHE_TTL <= 0:
+            return
+        now = time.time()
+        # Дольше TTL кеша строка не нужна: старые записи к тому времени истекут сами
+        db.add(models.TokenRevocation(
+            subject_type=subject_type, subject_id=subject_id, expires_at=now + PRINCIPAL_CACHE_TTL,
+        ))
+
+    def _evict_cached(self, row):
+        if row.jti is not None or row.id in self._evicted_ids:
+            return
+        cache = PRINCIPAL_CACHES.get(row.subject_type)
+        if cache is not None:
+            cache.invalidate(row.subject_id)
+        self._evicted_ids.add(row.id)
+
+    def _apply_watermark(self, subject_type: str, subject_id: int, not_before: float):
+        key = (subject_type, subject_id)
+        if not_before > self.watermarks.get(key, 0):
+            self.watermarks[key] = not_before
+
+    # ---------- синхронизация с БД ----------
+    async def refresh(self):
+        from db.database import async_engine
+
+        now = time.time()
+        table = models.TokenRevocation
+        full_reload = now - self._full_reload_at >= REVOCATION_FULL_RELOAD
+
+        async with async_engine.begin() as conn:
+            if full_reload:
+                await conn.execute(delete(table).where(table.expires_at < now))
+                query = select(table)
+            else:
+                query = select(table).where(table.id > self.last_id - POLL_OVERLAP)
+            rows = (await conn.execute(query.where(table.expires_at >= now).order_by(table.id))).all()
+
+        if full_reload:
+            watermarks = {}
+            bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        else:
+            watermarks = self.watermarks
+            bloom = self.bloom
+
+        for row in rows:
+            if row.jti is not None:
+                bloom.add(row.jti)
+            if row.not_before is not None:
+                key = (row.subject_type, row.subject_id)
+                if row.not_before > watermarks.get(key, 0):
+                    watermarks[key] = row.not_before
+            self._evict_cached(row)
+            self.last_id = max(self.last_id, row.id)
+        self._evicted_ids = {i for i in self._evicted_ids if i > self.last_id - POLL_OVERLAP}
+
+        if full_reload:
+            # Локальные отзывы, сделанные во время запроса, не теряем
+            for key, not_before in self.watermarks.items():
+                if not_before > watermarks.get(key, 0):
+                    watermarks[key] = not_before
+            self.watermarks = watermarks
+            self.bloom = bloom
+            self._full_reload_at = now
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Не удалось обновить список отозванных токенов: {e}")
+            await asyncio.sleep(REVOCATION_REFRESH)
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _after_commit(db, apply):
+    """Выполнить apply после успешного commit сессии db (Session или AsyncSession)"""
+    session = getattr(db, "sync_session", db)
+    session.info.setdefault("revocations_pending", []).append(apply)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for apply in session.info.pop("revocations_pending", ()):
+        apply()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("revocations_pending", None)
+
+
+revocations = RevocationList()
+
+
+def expose_metrics(lines: list):
+    """Счётчики проверок отзыва для /metrics"""
+    lines += [
+        "# HELP token_revocation_checks_total Проверок токенов на отзыв",
+        "# TYPE token_revocation_checks_total counter",
+        f"token_revocation_checks_total {revocations.checks}",
+        "# HELP token_revocation_bloom_positives_total Срабатываний Bloom-фильтра (сверка с БД)",
+        "# TYPE token_revocation_bloom_positives_total counter",
+        f"token_revocation_bloom_positives_total {revocations.bloom_positives}",
+        "# HELP token_revocation_rejected_total Отклонённых отозванных токенов",
+        "# TYPE token_revocation_rejected_total counter",
+        f"token_revocation_rejected_total {revocations.rejected}",
+    ]
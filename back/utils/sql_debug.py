@@ -0,0 +1,109 @@
+"""
+Отладка SQL: заголовки X-DB-*, поиск N+1 и бюджет запросов для тестов
+
+DB_DEBUG=true включает заголовки X-DB-Queries / X-DB-Time в ответах и
+предупреждения о повторяющихся формах запросов (вероятный N+1).
+"""
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from db.instrumentation import QueryStats, current_query_stats, statement_shape
+
+DB_DEBUG = os.getenv("DB_DEBUG", "false").lower() == "true"
+# Сколько одинаковых запросов за один HTTP-запрос считать N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+
+logger = logging.getLogger("nextbank.sql")
+
+
+class QueryDebugMiddleware:
+    """Добавляет X-DB-Queries / X-DB-Time и X-DB-N-Plus-One к ответам"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = current_query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats(scope=scope)
+            token = current_query_stats.set(stats)
+        stats.statements = Counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"x-db-time", f"{stats.duration * 1000:.2f}ms".encode()))
+
+                repeated = stats.repeated_shapes(N_PLUS_ONE_THRESHOLD)
+                if repeated:
+                    headers.append((b"x-db-n-plus-one", str(len(repeated)).encode()))
+                    for shape, count in repeated:
+                        logger.warning("Вероятный N+1 в %s %s: %d× %s",
+                                       scope["method"], scope["path"], count, shape)
+
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                current_query_stats.reset(token)
+
+
+# ========================================
+# Бюджет запросов для pytest
+# ========================================
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int, engines=None):
+    """
+    Падает, если внутри блока выполнено больше max_queries SQL-запросов:
+
+        with query_budget(3):
+            client.get('/cards/me', headers=auth)
+
+    Считает все запросы на движках приложения (в том числе из потоков
+    TestClient), поэтому блок не должен пересекаться с другой нагрузкой.
+    """
+    if engines is None:
+        from db.database import engine, async_engine
+        engines = [engine, async_engine.sync_engine]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for target in engines:
+        event.listen(target, "after_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "after_cursor_execute", count)
+
+    if len(statements) > max_queries:
+        shapes = Counter(statement_shape(statement) for statement in statements)
+        details = "\n".join(f"  {n}× {shape}" for shape, n in shapes.most_common())
+        raise QueryBudgetExceeded(
+            f"{len(statements)} SQL-запросов при бюджете {max_queries}:\n{details}")
+
+
+def assert_query_budget(client, method: str, url: str, max_queries: int, **kwargs):
+    """Запрос через TestClient с проверкой бюджета; возвращает ответ"""
+    with query_budget(max_queries):
+        response = client.request(method, url, **kwargs)
+    return response
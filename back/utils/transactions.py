@@ -2,12 +2,13 @@
 Утилиты для безопасной работы с транзакциями
 """
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from db import models
 from fastapi import HTTPException
 
 
 def safe_create_transaction(
-    db: Session,
+    db: Session | AsyncSession,
     client_id: int,
     transaction_type: str,
     amount: float,
@@ -40,8 +41,8 @@ def safe_create_transaction(
         )
 
 
-def safe_transfer(
-    db: Session,
+async def safe_transfer(
+    db: AsyncSession,
     from_card: models.Card,
     to_card: models.Card,
     amount: float,
@@ -49,9 +50,9 @@ def safe_transfer(
 ) -> dict:
     """
     Безопасный перевод между картами с rollback при ошибке
+    (счета карт должны быть загружены заранее)
     """
     try:
-        # Начинаем транзакцию
         from_card.account.balance -= amount
         to_card.account.balance += amount
 
@@ -78,7 +79,7 @@ def safe_transfer(
                 to_card_id=to_card.id
             )
 
-        db.commit()
+        await db.commit()
 
         return {
             "success": True,
@@ -87,7 +88,7 @@ def safe_transfer(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при переводе: {str(e)}"
@@ -31,3 +31,11 @@ def validate_strong_password(password: str) -> tuple[bool, str]:
         return False, "Пароль должен содержать хотя бы один спецсимвол (!@#$%^&*...)"
 
     return True, "Пароль надёжный"
+
+
+def normalize_phone(phone: str | None) -> str | None:
+    """Только цифры номера — по ним проверяется уникальность телефона"""
+    if phone is None:
+        return None
+    digits = ''.join(filter(str.isdigit, phone))
+    return digits or None
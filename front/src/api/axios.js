@@ -15,6 +15,32 @@ const api = axios.create({
 let isClientLogoutInProgress = false;
 let isEmployeeLogoutInProgress = false;
 
+// Access-токен сотрудника короткий: при 401 один раз пробуем обновить его
+// по refresh-токену. Параллельные запросы ждут одно и то же обновление.
+let employeeRefreshPromise = null;
+
+const refreshEmployeeToken = () => {
+  const refreshToken = localStorage.getItem("employee_refresh_token");
+  if (!refreshToken) {
+    return Promise.resolve(null);
+  }
+
+  if (!employeeRefreshPromise) {
+    employeeRefreshPromise = axios
+      .post(`${api.defaults.baseURL}/admin/auth/refresh`, { refresh_token: refreshToken })
+      .then((res) => {
+        localStorage.setItem("employee_token", res.data.access_token);
+        localStorage.setItem("employee_refresh_token", res.data.refresh_token);
+        return res.data.access_token;
+      })
+      .catch(() => null)
+      .finally(() => {
+        employeeRefreshPromise = null;
+      });
+  }
+  return employeeRefreshPromise;
+};
+
 // Interceptor для запросов - добавляет токен
 api.interceptors.request.use(
   (config) => {
@@ -48,7 +74,7 @@ api.interceptors.response.use(
   (response) => {
     return response;
   },
-  (error) => {
+  async (error) => {
     // Проверяем статус ошибки
     if (error.response && error.response.status === 401) {
       const url = error.config?.url || "";
@@ -62,6 +88,14 @@ api.interceptors.response.use(
         url.startsWith("/roles") ||
         url.startsWith("/branches");
 
+      if (isAdminRequest && !error.config._retry && !url.startsWith("/admin/auth/login")) {
+        const token = await refreshEmployeeToken();
+        if (token) {
+          error.config._retry = true;
+          return api(error.config);
+        }
+      }
+
       if (isAdminRequest) {
         // Логаут сотрудника
         if (!isEmployeeLogoutInProgress) {
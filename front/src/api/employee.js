@@ -44,6 +44,11 @@ export const changeEmployeePassword = async (currentPassword, newPassword) => {
             current_password: currentPassword,
             new_password: newPassword
         });
+        // Старые токены отозваны — продолжаем сессию с новыми
+        if (res.data.access_token) {
+            localStorage.setItem('employee_token', res.data.access_token);
+            localStorage.setItem('employee_refresh_token', res.data.refresh_token);
+        }
         return { data: res.data, error: null };
     } catch (err) {
         const detail = err.response?.data?.detail || 'Не удалось изменить пароль';
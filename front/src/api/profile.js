@@ -29,6 +29,10 @@ export const changePassword = async (currentPassword, newPassword) => {
             current_password: currentPassword,
             new_password: newPassword
         });
+        // Старые токены отозваны — продолжаем сессию с новым
+        if (res.data.access_token) {
+            localStorage.setItem('access_token', res.data.access_token);
+        }
         return { data: res.data, error: null };
     } catch (err) {
         const detail = err.response?.data?.detail || 'Не удалось изменить пароль';
@@ -29,6 +29,9 @@ const employeeSlice = createSlice({
             state.branch = action.payload.branch;
             state.isLoggedIn = true;
             localStorage.setItem('employee_token', action.payload.access_token);
+            if (action.payload.refresh_token) {
+                localStorage.setItem('employee_refresh_token', action.payload.refresh_token);
+            }
         },
         logoutEmployee: (state) => {
             state.id = null;
@@ -43,6 +46,7 @@ const employeeSlice = createSlice({
             state.branch = null;
             state.isLoggedIn = false;
             localStorage.removeItem('employee_token');
+            localStorage.removeItem('employee_refresh_token');
         }
     }
 });